@@ -1,46 +1,233 @@
 import streamlit as st
-import json
+import os
+from concurrent.futures import Future, wait, FIRST_COMPLETED
 from datetime import datetime
 import pandas as pd
-from utils.weather import *
-from utils.visualization import *
-
-# Load JSON data
-def load_json(file_path):
-    with open(file_path, 'r') as file:
-        return json.load(file)
-
-location = load_json('config/location.json')
-guesses = load_json('config/guesses.json')
-
-# Constants from location settings
-latitude = location["latitude"]
-longitude = location["longitude"]
+from utils import metrics
+from utils.client import OpenMeteoError
+from utils.leagues import load_leagues
+from utils.ledger import GUESS_FORMAT, GuessError, get_guess_ledger
+from utils.refresh import (
+    read_snapshot,
+    snapshot_age,
+    snapshot_path,
+    stamp_snapshot,
+    shared_section_loads,
+    start_background_refresh,
+    write_snapshot,
+    REFRESH_INTERVAL,
+)
+from utils.visualization import plot_snowfall_data, plot_snowfall_timeline, render_historical_chart
+
+# Refresh the snapshot from a thread in this process unless a separate worker
+# (`python -m utils.refresh`) is doing it
+REFRESH_IN_APP = os.environ.get("FIRSTSNOW_REFRESH_IN_APP", "1") == "1"
 
 def main():
-    # Fetch weather forecasts
-    forecast_data_openmeteo = get_openmeteo_forecast(latitude, longitude)
-
-    # Predict snowfall
-    predicted_snowfall_date_openmeteo = predict_first_snowfall_openmeteo(forecast_data_openmeteo)
-
-    # Get historical snowfall data
-    historical_snowfall = get_historical_snowfall(latitude, longitude, datetime.now().year - 20, datetime.now().year - 1)
-    historical_df = pd.DataFrame(historical_snowfall)
-
-    # Retrieve recent snowfall data
-    snowfall_df = get_recent_snowfall_data(latitude, longitude)
-
-    # Check for snowfall and identify the closest guess
-    result = check_for_recent_snowfall(snowfall_df)
-
     # Streamlit UI
     st.title("❄❄❄ Snowfall - The Game ❄❄❄")
 
+    league = select_league()
+    if league is None:
+        return
+    path = snapshot_path(league["id"])
+
+    # The page only reads the precomputed snapshot; the refresh worker does the fetching
+    snapshot = read_snapshot(path)
+    if snapshot is not None:
+        # Show how old the data is, and flag it once the refresh worker has fallen behind
+        age_minutes = int(snapshot_age(snapshot) // 60)
+        st.caption(f"Data updated {snapshot['generated_at'].replace('T', ' ')} ({age_minutes} min ago)")
+        if age_minutes * 60 > 3 * REFRESH_INTERVAL:
+            st.warning("Weather data is out of date; the latest refresh has not completed.")
+        sources = {"snapshot": _resolved(snapshot)}
+    else:
+        # Nothing written yet (first start): load every dataset at once, sharing the loads with
+        # every other session arriving meanwhile, and fill each section in as its data arrives
+        latitude, longitude = league["latitude"], league["longitude"]
+        now, sources = shared_section_loads(latitude, longitude, league["guesses"], neighborhood=league["neighborhood"])
+
+    sections = render_progressively(sources, league)
+
+    if snapshot is None and sections is not None:
+        write_snapshot(stamp_snapshot(sections, latitude, longitude, now, league, league["neighborhood"]), path)
+
+    render_guess_form(league)
+
+    if REFRESH_IN_APP:
+        start_background_refresh()
+
+    if metrics.enabled():
+        render_debug_panel()
+        metrics.write_dump()
+
+def select_league():
+    """
+    Picks the league to show from the `?league=<id>` query parameter, with a selector in the
+    sidebar when the registry has more than one.
+
+    Returns:
+        dict or None: The league, or None (after showing an error) if it is unknown.
+    """
+    leagues = load_leagues()
+    league_id = st.query_params.get("league")
+    if league_id is not None and league_id not in leagues:
+        st.error(f"Unknown league {league_id!r}.")
+        return None
+
+    if len(leagues) > 1:
+        ids = list(leagues)
+        league_id = st.sidebar.selectbox(
+            "League", ids, index=ids.index(league_id) if league_id else 0,
+            format_func=lambda option: leagues[option]["name"]
+        )
+        # Keep the choice in the URL so the page can be shared
+        st.query_params["league"] = league_id
+        st.subheader(leagues[league_id]["name"])
+    return leagues[league_id or next(iter(leagues))]
+
+def _resolved(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+def render_progressively(sources, league):
+    """
+    Renders every section into its own placeholder, in page order, as soon as its data is ready.
+
+    A load that fails, or a section that raises while rendering, only replaces its own
+    placeholders with an error; the other sections (and the guess form below) still render.
+
+    Parameters:
+        sources (dict): Load name mapped to a Future of the snapshot keys it fills in.
+        league (dict): The league shown; its guesses are what the sections score.
+
+    Returns:
+        dict or None: The merged snapshot keys, or None if any load failed.
+    """
+    placeholders = {}
+    for name in SECTIONS:
+        placeholders[name] = st.empty()
+        placeholders[name].info("Loading…")
+
+    data = {}
+    error = None
+    pending = set(sources.values())
+    waiting = list(SECTIONS)
+    while waiting:
+        done = {future for future in pending if future.done()}
+        pending -= done
+        for future in done:
+            try:
+                data.update(future.result())
+            except Exception as exc:
+                error = exc
+
+        for name in [name for name in waiting if all(key in data for key in SECTIONS[name][0])]:
+            try:
+                with placeholders[name].container(), metrics.span("section", section=name):
+                    SECTIONS[name][1](data, league)
+            except Exception as exc:
+                metrics.increment("section_render_failures_total", section=name)
+                placeholders[name].error(f"Could not show this section: {exc}")
+            waiting.remove(name)
+
+        if not pending:
+            break
+        if waiting:
+            wait(pending, return_when=FIRST_COMPLETED)
+
+    # Whatever is still waiting depended on a load that failed
+    for name in waiting:
+        # Surface upstream failures instead of rendering made-up zero snowfall
+        if isinstance(error, OpenMeteoError):
+            placeholders[name].error(f"Could not load weather data from Open-Meteo: {error}")
+        else:
+            placeholders[name].error(f"Could not load this section: {error}")
+
+    return None if error else data
+
+def render_guess_form(league):
+    """Lets new players submit a guess straight into the league's guess ledger."""
+    if not league["guesses"].endswith(".jsonl"):
+        # Plain guesses JSON files are edited by hand
+        return
+    ledger = get_guess_ledger(league["guesses"])
+    ledger.index()
+
+    st.header("JOIN THE GAME")
+    if ledger.first_snow is not None:
+        st.info(f"Guesses closed when the first snow fell on {ledger.first_snow.strftime(GUESS_FORMAT)}.")
+        return
+    if ledger.deadline is not None and datetime.now() >= ledger.deadline:
+        st.info(f"Guesses closed on {ledger.deadline.strftime(GUESS_FORMAT)}.")
+        return
+
+    with st.form("guess_form", clear_on_submit=True):
+        name = st.text_input("Name")
+        day = st.date_input("First snow date")
+        hour = st.selectbox("Hour", range(24), format_func=lambda h: f"{h:02d}:00")
+        submitted = st.form_submit_button("Submit guess")
+
+    if submitted:
+        try:
+            ledger.submit(name.strip(), f"{day.strftime('%Y-%m-%d')} {hour:02d}:00")
+        except GuessError as exc:
+            st.error(str(exc))
+        else:
+            st.success(f"Guess recorded for {name.strip()}; it shows up in the standings at the next refresh.")
+
+def render_debug_panel():
+    """Shows this process's metrics (FIRSTSNOW_METRICS=1) in a collapsed panel at the bottom of the page."""
+    data = metrics.to_dict()
+    with st.expander("Debug: metrics"):
+        st.subheader("Cache hit ratios")
+        st.dataframe(pd.DataFrame(
+            {"Cache": list(data["cache_hit_ratios"]), "Hit ratio": list(data["cache_hit_ratios"].values())}
+        ), hide_index=True)
+
+        st.subheader("Latencies")
+        st.dataframe(pd.DataFrame([
+            {
+                "Metric": histogram["name"],
+                "Labels": ", ".join(f"{key}={value}" for key, value in histogram["labels"].items()),
+                "Count": histogram["count"],
+                "Mean (ms)": round(histogram["sum"] / histogram["count"] * 1000, 1),
+                "Max (ms)": round(histogram["max"] * 1000, 1)
+            }
+            for histogram in data["histograms"]
+        ]), hide_index=True)
+
+        st.subheader("Counters")
+        st.dataframe(pd.DataFrame([
+            {
+                "Metric": counter["name"],
+                "Labels": ", ".join(f"{key}={value}" for key, value in counter["labels"].items()),
+                "Value": counter["value"]
+            }
+            for counter in data["counters"]
+        ]), hide_index=True)
+
+        st.download_button("Prometheus text", metrics.to_prometheus(), file_name="firstsnow.prom")
+        st.download_button("JSON", metrics.to_json(), file_name="firstsnow-metrics.json")
+
+def snowfall_frame(records):
+    """Rebuilds a daily snowfall DataFrame from its snapshot form."""
+    return pd.DataFrame({
+        "Date": pd.to_datetime(records["dates"]),
+        "Snowfall (inches)": records["inches"]
+    })
+
+def render_results(data, league):
+    predicted_snowfall_date_openmeteo = data["predicted_first_snowfall"]
+    result = data["first_snow"]
+    first_snow_date = datetime.fromisoformat(result["first_snow_date"]) if result["first_snow_date"] else None
+
     st.header("PLAYER GUESSES")
 
     # Display the timeline of guesses and actual snowfall
-    timeline_fig = plot_snowfall_timeline(result["first_snow_date"], result["winner"], predicted_snowfall_date_openmeteo)
+    timeline_fig = plot_snowfall_timeline(first_snow_date, result["winners"], predicted_snowfall_date_openmeteo,
+                                          league["guesses"])
     st.plotly_chart(timeline_fig)
 
     # Insert a horizontal line
@@ -48,71 +235,55 @@ def main():
 
     # Display results based on snowfall occurrence
     if result["snowfall_occurred"]:
-        st.success(f"Snow has fallen on {result['first_snow_date'].strftime('%Y-%m-%d')}! "
+        st.success(f"Snow has fallen on {first_snow_date.strftime('%Y-%m-%d %H:%M')}! "
                    f"The winner is {result['winner']} with the closest guess.")
     else:
         st.info("No snowfall recorded yet. Stay tuned!")
 
+def projection_text(names, guesses):
+    """Describes a projected win; `guesses` holds the names' guesses as the snapshot saw them."""
+    if not names:
+        return "No guesses yet."
+    if len(names) == 1:
+        return f"{names[0]} would win with a guess of {guesses[names[0]]}."
+    return f"Tie between {' & '.join(names)}, each with guesses of {guesses[names[0]]}."
+
+def render_projected_winners(data, league):
+    predicted_snowfall_date_openmeteo = data["predicted_first_snowfall"]
+    projected = data["projected"]
+
     st.header("PROJECTED WINNERS")
-    
-    # Function to find closest guessers to a target date, allowing for ties
-    def find_closest_guessers(guesses, target_date, use_full_datetime=False):
-        """
-        Finds the closest guessers to a target date.
-        
-        Parameters:
-            guesses (dict): Dictionary of guesses with player names as keys and guess dates as values.
-            target_date (datetime): The date to compare guesses against.
-            use_full_datetime (bool): If True, compare full datetime; if False, use only date.
-
-        Returns:
-            list: Names of the closest guessers.
-        """
-        # Convert guesses to datetime for accurate comparison
-        if use_full_datetime:
-            guess_dates = {name: datetime.strptime(date, '%Y-%m-%d %H:%M') for name, date in guesses.items()}
-        else:
-            guess_dates = {name: datetime.strptime(date, '%Y-%m-%d %H:%M').date() for name, date in guesses.items()}
-            target_date = target_date.date()  # Compare only by date if `use_full_datetime` is False
-
-        # Calculate absolute differences for each guess
-        differences = {name: abs((guess_date - target_date).total_seconds()) if use_full_datetime
-                    else abs((guess_date - target_date).days)
-                    for name, guess_date in guess_dates.items()}
-        min_difference = min(differences.values())
-        
-        # Return all names with the minimum difference to allow ties
-        return [name for name, diff in differences.items() if diff == min_difference]
 
+    # The guesses come from the snapshot, so players who withdrew since still show consistently
     st.subheader('If it snowed today?')
-    today = datetime.now()
-    closest_guessers_today = find_closest_guessers(guesses, today)
-
-    # Display result for closest guessers to today
-    if len(closest_guessers_today) == 1:
-        st.write(f"{closest_guessers_today[0]} would win with a guess of {guesses[closest_guessers_today[0]]}.")
-    else:
-        winners_text = " & ".join(closest_guessers_today)
-        st.write(f"Tie between {winners_text}, each with guesses of {guesses[closest_guessers_today[0]]}.")
+    st.write(projection_text(projected["today"], projected["guesses"]))
 
     st.subheader("If Open-Meteo forecast is accurate?")
     if predicted_snowfall_date_openmeteo:
-        # Parse the predicted snowfall date from Open-Meteo, assuming it’s day-based
-        predicted_date = datetime.strptime(predicted_snowfall_date_openmeteo, '%Y-%m-%d')
-        closest_guessers_predicted = find_closest_guessers(guesses, predicted_date, use_full_datetime=False)
-
-        # Display result for closest guessers to predicted snowfall date
-        if len(closest_guessers_predicted) == 1:
-            st.write(f"{closest_guessers_predicted[0]} would win with a guess of {guesses[closest_guessers_predicted[0]]}.")
-        else:
-            winners_text = " & ".join(closest_guessers_predicted)
-            st.write(f"Tie between {winners_text}, each with guesses of {guesses[closest_guessers_predicted[0]]}.")
+        st.write(projection_text(projected["forecast"], projected["guesses"]))
     else:
         st.write("No snowfall is forecasted in the near future.")
 
     # Insert a horizontal line
     st.markdown("<hr>", unsafe_allow_html=True)
 
+def render_win_probabilities(data, league):
+    st.header("WIN PROBABILITIES")
+    st.caption("Simulated from the Open-Meteo forecast and 20 years of first snows.")
+
+    probabilities = pd.DataFrame(data["win_probabilities"], columns=["name", "guess", "probability"])
+    probabilities["probability"] = (probabilities["probability"] * 100).round(1)
+    st.dataframe(
+        probabilities.rename(columns={"name": "Player", "guess": "Guess", "probability": "Chance (%)"}),
+        hide_index=True
+    )
+
+    # Insert a horizontal line
+    st.markdown("<hr>", unsafe_allow_html=True)
+
+def render_forecast(data, league):
+    predicted_snowfall_date_openmeteo = data["predicted_first_snowfall"]
+
     # Combine the forecasts under a single header
     st.header("FORECASTED FIRST SNOWFALL DATE")
 
@@ -124,20 +295,24 @@ def main():
     # # Insert a horizontal line
     st.markdown("<hr>", unsafe_allow_html=True)
 
+def render_recent_snowfall(data, league):
     st.header("Recent Snowfall Data")
-    snowfall_df = get_recent_snowfall_data(latitude, longitude)
+    snowfall_df = snowfall_frame(data["recent_snowfall"])
 
     # Generate the Plotly chart using the visualization function
     fig = plot_snowfall_data(snowfall_df)
 
     # Display the Plotly chart in Streamlit
     st.plotly_chart(fig)
+    if "neighborhood" in data["recent_snowfall"]:
+        st.caption(f"Snowfall around the league's location: {data['recent_snowfall']['neighborhood']}.")
 
     # Insert a horizontal line
     st.markdown("<hr>", unsafe_allow_html=True)
 
+def render_test_snowfall(data, league):
     st.header("Test Snowfall Data for January 2023")
-    snowfall_df = get_test_snowfall_data(latitude, longitude)
+    snowfall_df = snowfall_frame(data["test_snowfall"])
 
     # Generate the Plotly chart using the visualization function
     fig = plot_snowfall_data(snowfall_df)
@@ -148,12 +323,18 @@ def main():
     # Insert a horizontal line
     st.markdown("<hr>", unsafe_allow_html=True)
 
+def render_historical(data, league):
     st.header("HISTORICAL DATA (20 YEARS)")
-    if not historical_df.empty:
-        st.pyplot(plot_historical_snowfall(historical_df))
+    if data["historical"]["years"]:
+        historical_df = pd.DataFrame({
+            "year": data["historical"]["years"],
+            "first_snowfall_date": pd.to_datetime(data["historical"]["first_snowfall_dates"])
+        })
+        # Served as cached PNG bytes; the figure is only built when the history changes
+        st.image(render_historical_chart(historical_df))
 
         # Display statistics
-        earliest_day, latest_day, average_day = calculate_snowfall_statistics(historical_df)
+        earliest_day, latest_day, average_day = data["statistics"]
         st.markdown(f"""
         - **Earliest Day:** {earliest_day}
         - **Latest Day:** {latest_day}
@@ -162,6 +343,16 @@ def main():
     else:
         st.write("No historical snowfall data available.")
 
+# Page sections in display order: the snapshot keys each one needs and how to render it
+SECTIONS = {
+    "results": (("first_snow", "predicted_first_snowfall"), render_results),
+    "projected": (("projected", "predicted_first_snowfall"), render_projected_winners),
+    "win_probabilities": (("win_probabilities",), render_win_probabilities),
+    "forecast": (("predicted_first_snowfall",), render_forecast),
+    "recent_snowfall": (("recent_snowfall",), render_recent_snowfall),
+    "test_snowfall": (("test_snowfall",), render_test_snowfall),
+    "historical": (("historical", "statistics"), render_historical),
+}
+
 if __name__ == "__main__":
     main()
-
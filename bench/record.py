@@ -0,0 +1,121 @@
+"""
+Records an Open-Meteo fixture for the replay server.
+
+    python -m bench.record --out bench/fixtures/default.json
+    python -m bench.record --synthetic --seed 1 --out bench/fixtures/default.json
+
+Recording fetches whole seasons of hourly archive snowfall and the current daily forecast for
+the league location. --synthetic generates a fixture with the same layout offline instead, with
+storms clustered around midwinter.
+"""
+import argparse
+import json
+from datetime import datetime
+
+import numpy as np
+
+from utils.climatology import FEB_29_DAY_OF_SEASON, SEASON_LENGTH_DAYS, day_of_season, has_feb_29
+from utils.client import get_json
+from utils.refresh import load_location
+
+DEFAULT_SEASONS = (2021, 2022, 2023)
+
+# Synthetic weather: daily chance of a storm at midwinter, its spread in days, and storm shapes
+SYNTHETIC_PEAK_DAY_OF_SEASON = 200
+SYNTHETIC_PEAK_STORM_CHANCE = 0.3
+SYNTHETIC_SPREAD_DAYS = 50
+SYNTHETIC_STORM_HOURS = (3, 14)
+SYNTHETIC_MEAN_HOURLY_CM = 0.4
+
+def _season_table(season, hourly_values):
+    """
+    Lays one season of hourly values out on the 366-day season calendar, filling Feb 29 of
+    seasons without one from Feb 28.
+    """
+    table = np.zeros((SEASON_LENGTH_DAYS, 24))
+    table[day_of_season(_season_days(season))] = hourly_values.reshape(-1, 24)
+    if not has_feb_29(season):
+        table[FEB_29_DAY_OF_SEASON] = table[FEB_29_DAY_OF_SEASON - 1]
+    return table.ravel()
+
+def _season_days(season):
+    return np.arange(f"{season}-07-01", f"{season + 1}-07-01", dtype='datetime64[D]')
+
+def record(latitude, longitude, seasons=DEFAULT_SEASONS):
+    """Fetches whole seasons of hourly snowfall and the current daily forecast from Open-Meteo."""
+    tables = []
+    for season in seasons:
+        days = _season_days(season)
+        data = get_json("archive", {
+            "latitude": latitude,
+            "longitude": longitude,
+            "start_date": str(days[0]),
+            "end_date": str(days[-1]),
+            "hourly": "snowfall",
+            "timezone": "auto"
+        })
+        values = np.array(data["hourly"]["snowfall"], dtype=float)
+        tables.append(_season_table(season, np.nan_to_num(values)))
+
+    forecast = get_json("forecast", {
+        "latitude": latitude,
+        "longitude": longitude,
+        "daily": "snowfall_sum",
+        "timezone": "auto",
+        "forecast_days": 16
+    })
+    return _fixture(data["latitude"], data["longitude"], data["timezone"], data["utc_offset_seconds"], seasons,
+                    tables, forecast["daily"]["snowfall_sum"], "open-meteo")
+
+def synthesize(latitude, longitude, seasons=DEFAULT_SEASONS, seed=None):
+    """Generates a fixture offline: storms of a few hours, most likely around midwinter."""
+    rng = np.random.default_rng(seed)
+    tables = []
+    for season in seasons:
+        days = _season_days(season)
+        storm_chance = SYNTHETIC_PEAK_STORM_CHANCE * np.exp(
+            -0.5 * ((day_of_season(days) - SYNTHETIC_PEAK_DAY_OF_SEASON) / SYNTHETIC_SPREAD_DAYS) ** 2
+        )
+
+        hourly = np.zeros((len(days), 24))
+        for day in np.flatnonzero(rng.random(len(days)) < storm_chance):
+            start = rng.integers(24)
+            hours = rng.integers(*SYNTHETIC_STORM_HOURS)
+            hourly[day, start:start + hours] = rng.exponential(SYNTHETIC_MEAN_HOURLY_CM, min(hours, 24 - start))
+        tables.append(_season_table(season, hourly.round(2)))
+
+    # A dry forecast with one snowy day, so the forecast paths have something to find
+    forecast = [0.0] * 16
+    forecast[9] = 1.4
+    return _fixture(latitude, longitude, "America/Denver", -6 * 60 * 60, seasons, tables, forecast, "synthetic")
+
+def _fixture(latitude, longitude, timezone, utc_offset_seconds, seasons, tables, forecast, source):
+    return {
+        "source": source,
+        "recorded_at": datetime.now().isoformat(timespec='seconds'),
+        "latitude": latitude,
+        "longitude": longitude,
+        "timezone": timezone,
+        "utc_offset_seconds": utc_offset_seconds,
+        "seasons": list(seasons),
+        "hourly_snowfall": [np.round(table, 2).tolist() for table in tables],
+        "forecast_daily_snowfall": forecast
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record an Open-Meteo fixture for the replay server.")
+    parser.add_argument("--out", default="bench/fixtures/default.json", help="Fixture file to write.")
+    parser.add_argument("--location", default="config/location.json", help="Location JSON file.")
+    parser.add_argument("--seasons", type=int, nargs="+", default=list(DEFAULT_SEASONS),
+                        help="Consecutive season start years to record.")
+    parser.add_argument("--synthetic", action="store_true", help="Generate the fixture offline instead.")
+    parser.add_argument("--seed", type=int, help="Seed for --synthetic.")
+    args = parser.parse_args()
+
+    latitude, longitude = load_location(args.location)
+    if args.synthetic:
+        fixture = synthesize(latitude, longitude, args.seasons, args.seed)
+    else:
+        fixture = record(latitude, longitude, args.seasons)
+    with open(args.out, "w") as f:
+        json.dump(fixture, f, separators=(",", ":"))
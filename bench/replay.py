@@ -0,0 +1,342 @@
+"""
+Local stand-in for the Open-Meteo archive, forecast and previous runs APIs, replaying a recorded fixture.
+
+    python -m bench.replay --port 8765 --latency 0.05 --failure-rate 0.1
+
+Point the app or the CLI at it through the environment:
+
+    OPENMETEO_ARCHIVE_URL=http://127.0.0.1:8765/v1/archive
+    OPENMETEO_FORECAST_URL=http://127.0.0.1:8765/v1/forecast
+    OPENMETEO_PREVIOUS_RUNS_URL=http://127.0.0.1:8765/v1/previous_runs
+
+A fixture holds a few recorded seasons of hourly snowfall and one daily forecast (see
+bench/record.py). Any requested date is answered from the same day-of-season of one of the
+recorded seasons, so 20-year history requests work from a small fixture. Every location gets
+the same weather; like Open-Meteo, comma-separated coordinates get a list of responses, each
+reporting the grid cell the coordinate falls in. Previous forecast runs are the replayed
+snowfall degraded by a deterministic, lead-dependent error, so backtests are reproducible.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from utils.climatology import day_of_season, season_of
+
+DEFAULT_FIXTURE = "bench/fixtures/default.json"
+
+# How far behind "now" the archive has data, like the real reanalysis lag
+DEFAULT_ARCHIVE_LAG_HOURS = 48
+
+# Size of the model grid cells coordinates are snapped to, in degrees
+GRID_DEGREES = 0.1
+
+# Per day of lead, how much replayed previous runs are off: log spread of the amounts and the
+# chances a snowy day is forecast dry (miss) or a dry day snowy (false alarm)
+PREVIOUS_RUN_SPREAD = 0.2
+PREVIOUS_RUN_MISS = 0.03
+PREVIOUS_RUN_FALSE_ALARM = 0.01
+
+class Fixture:
+    """
+    Recorded snowfall of one location, replayed for any date range.
+
+    Parameters:
+        data (dict): Parsed fixture JSON, with consecutive seasons.
+    """
+
+    def __init__(self, data):
+        self.latitude = data["latitude"]
+        self.longitude = data["longitude"]
+        self.timezone = data["timezone"]
+        self.utc_offset_seconds = data["utc_offset_seconds"]
+        self.first_season = data["seasons"][0]
+        # One row per recorded season, one column per hour of the 366-day season calendar
+        self.hourly_table = np.array(data["hourly_snowfall"], dtype=float).reshape(len(data["seasons"]), -1)
+        self.forecast_daily = data["forecast_daily_snowfall"]
+
+    @classmethod
+    def load(cls, path=DEFAULT_FIXTURE):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def hourly(self, start_day, end_day, utc=False):
+        """
+        Replays hourly snowfall for a range of days, in local time or (with `utc`) in GMT.
+
+        Returns:
+            tuple: (times datetime64[m], values) arrays, 24 per day.
+        """
+        if utc:
+            # The recording is in local time: GMT hours are the local hours shifted by the offset
+            offset = np.timedelta64(self.utc_offset_seconds // 60, 'm')
+            times, values = self.hourly(start_day - np.timedelta64(1, 'D'), end_day + np.timedelta64(1, 'D'))
+            times = times - offset
+            in_range = (times >= start_day) & (times < end_day + np.timedelta64(1, 'D'))
+            return times[in_range], values[in_range]
+        days = np.arange(start_day, end_day + np.timedelta64(1, 'D'), dtype='datetime64[D]')
+        rows = (season_of(days) - self.first_season) % len(self.hourly_table)
+        columns = day_of_season(days)[:, None] * 24 + np.arange(24)
+        times = days.astype('datetime64[m]')[:, None] + np.arange(24).astype('timedelta64[h]')
+        return times.ravel(), self.hourly_table[rows[:, None], columns].ravel()
+
+    def daily(self, start_day, end_day, utc=False):
+        """Replays daily snowfall sums for a range of days as (days, values) arrays."""
+        times, values = self.hourly(start_day, end_day, utc)
+        return times[::24].astype('datetime64[D]'), values.reshape(-1, 24).sum(axis=1).round(2)
+
+def _json_values(values, unavailable=None):
+    """Converts values to a JSON list, with null where `unavailable` is set (like Open-Meteo)."""
+    values = np.round(values, 2).astype(object)
+    if unavailable is not None:
+        values[unavailable] = None
+    return values.tolist()
+
+class ReplayServer:
+    """
+    Threaded HTTP server answering /v1/archive, /v1/forecast and /v1/previous_runs from a fixture.
+
+    Parameters:
+        fixture (Fixture): Data to replay.
+        port (int): Port to listen on (0 picks a free one).
+        latency (float): Seconds added to every response.
+        failure_rate (float): Share of requests answered with a 503 instead.
+        archive_lag_hours (int): Archive hours before `now` that are still null.
+        now (datetime, optional): Time the replay pretends it is; defaults to the real time.
+        seed (int, optional): Seed for the failure injection.
+    """
+
+    def __init__(self, fixture, port=0, latency=0.0, failure_rate=0.0,
+                 archive_lag_hours=DEFAULT_ARCHIVE_LAG_HOURS, now=None, seed=None):
+        self.fixture = fixture
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.archive_lag_hours = archive_lag_hours
+        self.now = now
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), _handler_for(self))
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = None
+
+    def url(self, endpoint):
+        return f"http://127.0.0.1:{self.port}/v1/{endpoint}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="replay-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {"requests": {"archive": 0, "forecast": 0, "previous_runs": 0}, "locations": 0,
+                          "bytes": 0, "failures": 0}
+
+    def _record(self, endpoint, locations, size, failed):
+        with self._lock:
+            self.stats["requests"][endpoint] += 1
+            self.stats["locations"] += locations
+            self.stats["bytes"] += size
+            self.stats["failures"] += failed
+
+    def _should_fail(self):
+        with self._lock:
+            return self._random.random() < self.failure_rate
+
+    def respond(self, endpoint, params):
+        """
+        Builds the response for a request.
+
+        Returns:
+            tuple: (status code, body dict, or a list of them for several coordinates)
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        if self._should_fail():
+            return 503, {"error": True, "reason": "Injected failure"}
+
+        try:
+            latitudes = [float(value) for value in params["latitude"].split(",")]
+            longitudes = [float(value) for value in params["longitude"].split(",")]
+            if len(latitudes) != len(longitudes):
+                raise ValueError("latitude and longitude lists differ in length")
+            if endpoint == "archive":
+                body = self._archive(params)
+            elif endpoint == "previous_runs":
+                body = self._previous_runs(params)
+            else:
+                body = self._forecast(params)
+        except (KeyError, ValueError) as exc:
+            return 400, {"error": True, "reason": f"Cannot replay request: {exc}"}
+
+        bodies = [
+            dict(body, latitude=_snap(latitude), longitude=_snap(longitude))
+            for latitude, longitude in zip(latitudes, longitudes)
+        ]
+        return 200, bodies[0] if len(bodies) == 1 else bodies
+
+    def _now(self):
+        return np.datetime64(self.now or datetime.now(), 'm')
+
+    def _base(self):
+        return {
+            "timezone": self.fixture.timezone,
+            "utc_offset_seconds": self.fixture.utc_offset_seconds
+        }
+
+    def _archive(self, params):
+        start_day = np.datetime64(params["start_date"], 'D')
+        end_day = np.datetime64(params["end_date"], 'D')
+        available_until = self._now() - np.timedelta64(self.archive_lag_hours, 'h')
+        body = self._base()
+        utc = params.get("timezone", "GMT") in ("GMT", "UTC")
+        if utc:
+            body.update(timezone="GMT", utc_offset_seconds=0)
+            available_until -= np.timedelta64(self.fixture.utc_offset_seconds // 60, 'm')
+
+        if "hourly" in params:
+            _check_variable(params["hourly"], "snowfall")
+            times, values = self.fixture.hourly(start_day, end_day, utc)
+            body["hourly_units"] = {"time": "iso8601", "snowfall": "cm"}
+            body["hourly"] = {
+                "time": np.datetime_as_string(times, unit='m').tolist(),
+                "snowfall": _json_values(values, times > available_until)
+            }
+        else:
+            _check_variable(params["daily"], "snowfall_sum")
+            days, values = self.fixture.daily(start_day, end_day, utc)
+            body["daily_units"] = {"time": "iso8601", "snowfall_sum": "cm"}
+            body["daily"] = {
+                "time": np.datetime_as_string(days).tolist(),
+                "snowfall_sum": _json_values(values, days >= available_until.astype('datetime64[D]'))
+            }
+        return body
+
+    def _forecast(self, params):
+        now = self._now()
+        today = now.astype('datetime64[D]')
+        forecast_days = int(params.get("forecast_days", len(self.fixture.forecast_daily)))
+        future = np.resize(np.array(self.fixture.forecast_daily, dtype=float), forecast_days)
+        body = self._base()
+
+        if "hourly" in params:
+            _check_variable(params["hourly"], "snowfall")
+            # Past hours come from the replayed archive, upcoming ones spread the daily forecast
+            past_days = int(params.get("past_days", 0))
+            times, values = self.fixture.hourly(today - np.timedelta64(past_days, 'D'), today + np.timedelta64(forecast_days - 1, 'D'))
+            upcoming = times > now
+            values[upcoming] = np.repeat(future / 24, 24)[-upcoming.sum():] if upcoming.any() else []
+            body["hourly_units"] = {"time": "iso8601", "snowfall": "cm"}
+            body["hourly"] = {"time": np.datetime_as_string(times, unit='m').tolist(), "snowfall": _json_values(values)}
+        else:
+            _check_variable(params["daily"], "snowfall_sum")
+            days = today + np.arange(forecast_days).astype('timedelta64[D]')
+            body["daily_units"] = {"time": "iso8601", "snowfall_sum": "cm"}
+            body["daily"] = {"time": np.datetime_as_string(days).tolist(), "snowfall_sum": _json_values(future)}
+        return body
+
+    def _previous_runs(self, params):
+        times, observed = self.fixture.hourly(np.datetime64(params["start_date"], 'D'), np.datetime64(params["end_date"], 'D'))
+        days = times.astype('datetime64[D]').astype(np.int64)
+        body = self._base()
+        body["hourly_units"] = {"time": "iso8601"}
+        body["hourly"] = {"time": np.datetime_as_string(times, unit='m').tolist()}
+        for variable in params["hourly"].split(","):
+            lead = _previous_run_lead(variable)
+            body["hourly_units"][variable] = "cm"
+            # Runs only exist up to now
+            body["hourly"][variable] = _json_values(_past_run(days, observed, lead), times > self._now())
+        return body
+
+def _previous_run_lead(variable):
+    """Days before the latest run a previous runs variable was issued (snowfall_previous_dayN -> N)."""
+    if variable == "snowfall":
+        return 0
+    prefix = "snowfall_previous_day"
+    if not variable.startswith(prefix) or not variable[len(prefix):].isdigit():
+        raise ValueError(f"only snowfall runs are recorded, not {variable}")
+    return int(variable[len(prefix):])
+
+def _past_run(days, observed, lead):
+    """Hourly snowfall as forecast `lead` days ahead: the observed values with a per-day error."""
+    skill = lead + 1
+    factor = np.exp(PREVIOUS_RUN_SPREAD * skill * (2 * _noise(days, lead, 1) - 1))
+    forecast = np.where(_noise(days, lead, 2) < PREVIOUS_RUN_MISS * skill, 0.0, observed * factor)
+    # False alarms drop 0.5-5 cm over a day that stayed dry
+    daily_dry = np.bincount(days - days[0], weights=observed)[days - days[0]] == 0
+    false_alarm = daily_dry & (_noise(days, lead, 3) < PREVIOUS_RUN_FALSE_ALARM * skill)
+    return np.where(false_alarm, (0.5 + 4.5 * _noise(days, lead, 4)) / 24, forecast)
+
+def _noise(days, lead, stream):
+    """Deterministic uniform [0, 1) noise per day, lead and stream."""
+    return np.modf(np.abs(np.sin(days * 12.9898 + lead * 78.233 + stream * 37.719)) * 43758.5453)[0]
+
+def _snap(coordinate):
+    """Centre of the grid cell a coordinate falls in."""
+    return round((np.floor(coordinate / GRID_DEGREES) + 0.5) * GRID_DEGREES, 4)
+
+def _check_variable(requested, supported):
+    if requested != supported:
+        raise ValueError(f"only {supported} is recorded, not {requested}")
+
+def _handler_for(server):
+    class ReplayHandler(BaseHTTPRequestHandler):
+        # Keep-alive, so the client's connection pool behaves as it does against Open-Meteo
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            endpoint = url.path.rstrip("/").rsplit("/", 1)[-1]
+            if endpoint not in ("archive", "forecast", "previous_runs"):
+                self._send(404, {"error": True, "reason": "Not found"})
+                return
+
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            status, body = server.respond(endpoint, params)
+            size = self._send(status, body)
+            server._record(endpoint, len(body) if isinstance(body, list) else 1, size, status == 503)
+
+        def _send(self, status, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return len(payload)
+
+        def log_message(self, format, *args):
+            # Keep benchmark output clean
+            pass
+
+    return ReplayHandler
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a recorded Open-Meteo fixture locally.")
+    parser.add_argument("--fixture", default=DEFAULT_FIXTURE, help="Fixture JSON file.")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response.")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of requests answered with a 503.")
+    parser.add_argument("--now", help="Pretend it is this time (ISO format, default: now).")
+    args = parser.parse_args()
+
+    replay = ReplayServer(Fixture.load(args.fixture), args.port, args.latency, args.failure_rate,
+                          now=datetime.fromisoformat(args.now) if args.now else None)
+    print(f"Replaying {args.fixture} at {replay.url('archive')} and {replay.url('forecast')}")
+    replay.serve_forever()
@@ -0,0 +1,303 @@
+"""
+Benchmarks a full page load against the local replay server.
+
+    python -m bench.run                                   # every scenario
+    python -m bench.run --scenario cold_start --latency 0.08 --failure-rate 0.05
+    python -m bench.run --json > bench_output.json
+
+Each scenario loads every dataset the page shows (the same loads the app and the refresh
+worker run), scores the guesses and builds every figure, then reports wall time per stage,
+upstream requests and bytes served by the replay server, and peak Python memory.
+"""
+import argparse
+import importlib
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from bench.replay import DEFAULT_FIXTURE, Fixture, ReplayServer
+
+# Time each scenario pretends it is, whether it runs after a warm-up pass, how many synthetic
+# players it uses (None keeps the league's own guesses), how many synthetic leagues it
+# refreshes at once (None loads the one league's page) and how many sessions load the page
+# at the same moment
+SCENARIOS = {
+    "cold_start": {"now": "2024-11-10 12:00", "warm": False, "players": None, "leagues": None, "sessions": 1},
+    "warm_rerun": {"now": "2024-11-10 12:00", "warm": True, "players": None, "leagues": None, "sessions": 1},
+    "mid_winter": {"now": "2025-01-15 12:00", "warm": False, "players": None, "leagues": None, "sessions": 1},
+    "players_100k": {"now": "2024-11-10 12:00", "warm": True, "players": 100_000, "leagues": None, "sessions": 1},
+    "leagues_50": {"now": "2024-11-10 12:00", "warm": True, "players": None, "leagues": 50, "sessions": 1},
+    "crowd_20": {"now": "2024-11-10 12:00", "warm": False, "players": None, "leagues": None, "sessions": 20},
+}
+
+# The league whose guesses the page-load scenarios score (copied, never written to)
+GUESSES_FILE = "config/guesses.jsonl"
+
+# Synthetic leagues are spread over this many towns, a few streets apart within each town
+LEAGUE_TOWNS = 10
+LEAGUE_PLAYERS = 200
+
+def write_players(path, count, now, seed=0):
+    """Writes a guesses file with `count` synthetic players guessing hours around `now`."""
+    rng = random.Random(seed)
+    guesses = {
+        f"Player {number:06d}": (now + timedelta(hours=rng.randint(-45 * 24, 90 * 24))).strftime('%Y-%m-%d %H:00')
+        for number in range(count)
+    }
+    with open(path, "w") as f:
+        json.dump(guesses, f)
+
+def write_leagues(directory, count, latitude, longitude, now):
+    """
+    Writes `count` synthetic leagues, each with its own guesses, spread over LEAGUE_TOWNS towns
+    half a degree apart.
+
+    Returns:
+        dict: The leagues, as utils.leagues.load_leagues returns them.
+    """
+    from utils.leagues import load_leagues
+
+    entries = []
+    for number in range(count):
+        town, street = divmod(number, max(1, count // LEAGUE_TOWNS))
+        guesses_file = os.path.join(directory, f"league-{number:03d}.jsonl")
+        write_players(os.path.splitext(guesses_file)[0] + ".json", LEAGUE_PLAYERS, now, seed=number)
+        entries.append({
+            "id": f"league-{number:03d}",
+            "latitude": round(latitude + 0.5 * town + 0.001 * street, 6),
+            "longitude": round(longitude + 0.001 * street, 6),
+            "guesses": guesses_file
+        })
+    path = os.path.join(directory, "leagues.json")
+    with open(path, "w") as f:
+        json.dump(entries, f)
+    return load_leagues(path)
+
+def copy_ledger(guesses_file, directory):
+    """
+    Copies a guess ledger and the guesses JSON file it seeds from into `directory`, so nothing a
+    scenario does (seeding, or closing the game once the fixture's first snow is found) reaches
+    the real league.
+
+    Returns:
+        str: Path of the copied ledger.
+    """
+    copy = os.path.join(directory, f"guesses-{time.time_ns()}.jsonl")
+    for source, target in ((guesses_file, copy), (os.path.splitext(guesses_file)[0] + ".json",
+                                                  os.path.splitext(copy)[0] + ".json")):
+        if os.path.exists(source):
+            shutil.copyfile(source, target)
+    return copy
+
+def reset_caches(cache_directory):
+    """
+    Forgets everything fetched, parsed and drawn so far: memoized loaders, shared section
+    loads, known grid cells and time zones, guess ledgers and indexes, the on-disk archive
+    store and figures. A backfilled hourly archive is switched off, since it holds real weather
+    rather than the fixture's.
+    """
+    from utils import loaders, visualization
+    from utils.client import clear_grid_cells
+    from utils.hourly_archive import set_hourly_archive
+    from utils.ledger import clear_guess_ledgers
+    from utils.refresh import clear_shared_loads
+    from utils.scoring import clear_guess_indexes
+    from utils.store import ArchiveStore, set_archive_store
+    from utils.timezones import clear_timezones
+
+    for loader in vars(loaders).values():
+        if hasattr(loader, "cache_clear"):
+            loader.cache_clear()
+    clear_shared_loads()
+    clear_grid_cells()
+    clear_timezones()
+    clear_guess_ledgers()
+    clear_guess_indexes()
+    set_hourly_archive(None)
+    visualization.clear_caches()
+    set_archive_store(ArchiveStore(os.path.join(cache_directory, f"archive-{time.time_ns()}.sqlite")))
+
+def page_load(latitude, longitude, guesses_file, now, shared=False):
+    """
+    Runs what one page view does: load every section, then build every figure. With `shared`,
+    the loads are shared with concurrent page views, as the app does before the first snapshot.
+
+    Returns:
+        dict: Wall time in seconds (or the error) of the "data" and "figures" stages.
+    """
+    import pandas as pd
+    from utils.refresh import shared_section_loads, start_section_loads
+    from utils.visualization import plot_snowfall_data, plot_snowfall_timeline, render_historical_chart
+
+    stages = {}
+    data = {}
+
+    started = time.perf_counter()
+    try:
+        if shared:
+            loads = shared_section_loads(latitude, longitude, guesses_file, now)[1]
+        else:
+            loads = start_section_loads(latitude, longitude, guesses_file, now)
+        for future in loads.values():
+            data.update(future.result())
+        stages["data"] = time.perf_counter() - started
+    except Exception as exc:
+        stages["data"] = f"{type(exc).__name__}: {exc}"
+        return stages
+
+    started = time.perf_counter()
+    try:
+        first_snow = data["first_snow"]
+        first_snow_date = datetime.fromisoformat(first_snow["first_snow_date"]) if first_snow["first_snow_date"] else None
+        plot_snowfall_timeline(first_snow_date, first_snow["winners"], data["predicted_first_snowfall"], guesses_file)
+        for records in (data["recent_snowfall"], data["test_snowfall"]):
+            plot_snowfall_data(pd.DataFrame({
+                "Date": pd.to_datetime(records["dates"]),
+                "Snowfall (inches)": records["inches"]
+            }))
+        render_historical_chart(pd.DataFrame({
+            "year": data["historical"]["years"],
+            "first_snowfall_date": pd.to_datetime(data["historical"]["first_snowfall_dates"])
+        }))
+        stages["figures"] = time.perf_counter() - started
+    except Exception as exc:
+        stages["figures"] = f"{type(exc).__name__}: {exc}"
+    return stages
+
+def league_refresh(leagues, now):
+    """
+    Runs what one refresh of every league does: the batched loads plus per-league scoring.
+
+    Returns:
+        dict: Wall time in seconds (or the error) of the "data" stage.
+    """
+    from utils.refresh import build_league_snapshots
+
+    started = time.perf_counter()
+    try:
+        build_league_snapshots(leagues.values(), now)
+    except Exception as exc:
+        return {"data": f"{type(exc).__name__}: {exc}"}
+    return {"data": time.perf_counter() - started}
+
+def crowd(load, sessions):
+    """
+    Runs `load` from `sessions` threads at once, like viewers opening the page together.
+
+    Returns:
+        dict: The stages of the slowest session.
+    """
+    results = [None] * sessions
+
+    def session(number):
+        results[number] = load()
+
+    threads = [threading.Thread(target=session, args=(number,)) for number in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    failed = [stages for stages in results if any(not isinstance(value, float) for value in stages.values())]
+    return failed[0] if failed else max(results, key=lambda stages: sum(stages.values()))
+
+def run_scenario(name, replay, latitude, longitude, work_directory, track_memory=True):
+    """Runs one scenario and returns its measurements."""
+    scenario = SCENARIOS[name]
+    now = datetime.fromisoformat(scenario["now"])
+    replay.now = now
+
+    reset_caches(work_directory)
+    guesses_file = copy_ledger(GUESSES_FILE, work_directory)
+    if scenario["leagues"]:
+        leagues = write_leagues(work_directory, scenario["leagues"], latitude, longitude, now)
+        load = lambda: league_refresh(leagues, now)
+    else:
+        load = lambda: page_load(latitude, longitude, guesses_file, now, shared=scenario["sessions"] > 1)
+    if scenario["warm"]:
+        # Same view a moment earlier, so the measured pass finds warm caches
+        load()
+    if scenario["players"]:
+        # The ledger seeds itself from the guesses JSON file next to it on first read
+        guesses_file = os.path.join(work_directory, f"guesses-{scenario['players']}.jsonl")
+        write_players(os.path.splitext(guesses_file)[0] + ".json", scenario["players"], now)
+
+    replay.reset_stats()
+    if track_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    stages = load() if scenario["sessions"] == 1 else crowd(load, scenario["sessions"])
+    wall = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1] if track_memory else None
+    tracemalloc.stop()
+
+    return {
+        "scenario": name,
+        "wall_seconds": wall,
+        "stages": stages,
+        "requests": dict(replay.stats["requests"]),
+        "locations": replay.stats["locations"],
+        "bytes": replay.stats["bytes"],
+        "injected_failures": replay.stats["failures"],
+        "peak_memory_bytes": peak
+    }
+
+def format_result(result):
+    stages = "  ".join(
+        f"{stage} {value:.3f}s" if isinstance(value, float) else f"{stage} FAILED ({value})"
+        for stage, value in result["stages"].items()
+    )
+    memory = f"{result['peak_memory_bytes'] / 2 ** 20:.1f} MiB" if result["peak_memory_bytes"] is not None else "-"
+    return (
+        f"{result['scenario']:<14} {result['wall_seconds']:7.3f}s  "
+        f"requests {result['requests']['archive']:>3} archive / {result['requests']['forecast']:>3} forecast "
+        f"({result['locations']:>4} locations)  "
+        f"{result['bytes'] / 1024:9.1f} KiB  peak {memory:>10}  "
+        f"failures injected {result['injected_failures']}\n"
+        f"{'':<14} {stages}"
+    )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark page loads against the Open-Meteo replay server.")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="Scenario to run (repeatable; default all).")
+    parser.add_argument("--fixture", default=DEFAULT_FIXTURE, help="Fixture JSON file to replay.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every upstream response.")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of upstream requests answered with a 503.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the failure injection.")
+    parser.add_argument("--no-memory", action="store_true", help="Skip tracemalloc (it slows everything down).")
+    parser.add_argument("--json", action="store_true", help="Print JSON instead of text.")
+    args = parser.parse_args(argv)
+
+    fixture = Fixture.load(args.fixture)
+    replay = ReplayServer(fixture, latency=args.latency, failure_rate=args.failure_rate, seed=args.seed).start()
+
+    # The client reads its endpoints on import, so point it at the replay server first
+    os.environ["OPENMETEO_ARCHIVE_URL"] = replay.url("archive")
+    os.environ["OPENMETEO_FORECAST_URL"] = replay.url("forecast")
+
+    # Import the engine and the plotting libraries up front, so no scenario pays for them
+    for module in ("utils.refresh", "utils.visualization"):
+        importlib.import_module(module)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="firstsnow-bench-") as work_directory:
+        for name in args.scenario or SCENARIOS:
+            result = run_scenario(name, replay, fixture.latitude, fixture.longitude, work_directory, not args.no_memory)
+            results.append(result)
+            if not args.json:
+                print(format_result(result), flush=True)
+    replay.stop()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    failed = any(not isinstance(value, float) for result in results for value in result["stages"].values())
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
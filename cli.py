@@ -0,0 +1,327 @@
+"""
+Headless entry point for the game engine: fetches data, scores guesses and prints or writes JSON.
+
+Only the data and scoring modules are imported (lazily, per command), never Streamlit,
+matplotlib or Plotly, so cron jobs and scripts start quickly.
+
+    python cli.py status [--json]
+    python cli.py leaderboard --at "2024-10-30 08:00" [--top 10]
+    python cli.py snapshot [--out snapshot.json]
+    python cli.py snapshot --all-leagues [--out .cache/snapshot.json]
+    python cli.py --league ogden status
+    python cli.py guess submit "Jane Doe" "2024-11-02 18:00"
+    python cli.py guess edit|withdraw|deadline|close ...
+    python cli.py backfill [--start 1940-01-01] [--all-leagues]
+    python cli.py backtest --start 2023-07-01 [--save .cache/backtest] [--all-leagues]
+    python cli.py backtest --history .cache/backtest/*.npz [--thresholds 0:5:0.1] [--json]
+    python cli.py startup-check
+"""
+import argparse
+import json
+import subprocess
+import sys
+from datetime import datetime
+
+# Cold-start budget for importing the engine, in seconds
+STARTUP_BUDGET_SECONDS = 1.0
+
+# Libraries the headless path must never pull in
+UI_MODULES = ("streamlit", "matplotlib", "plotly")
+
+ENGINE_MODULES = ("utils.refresh", "utils.detection", "utils.scoring")
+
+def _location(args):
+    """The --league's coordinates, or the --location file's."""
+    from utils.leagues import load_location
+
+    if args.league_info:
+        return args.league_info["latitude"], args.league_info["longitude"]
+    return load_location(args.location)
+
+def _neighborhood(args):
+    """The --league's neighborhood grid, or the --location file's (None for a single point)."""
+    from utils.leagues import load_neighborhood
+
+    if args.league_info:
+        return args.league_info["neighborhood"]
+    return load_neighborhood(args.location)
+
+def _sites(args):
+    """(latitude, longitude) and neighborhood of every league (--all-leagues) or of the selected one."""
+    from utils.leagues import group_by_site, load_leagues
+
+    if args.all_leagues:
+        return list(group_by_site(load_leagues(args.leagues).values()))
+    return [(_location(args), _neighborhood(args))]
+
+def command_status(args):
+    from utils.detection import check_for_first_snow
+    from utils.scoring import load_guess_index
+    from utils.weather import get_openmeteo_forecast, predict_first_snowfall_openmeteo
+
+    latitude, longitude = _location(args)
+    guess_index = load_guess_index(args.guesses)
+    now = datetime.now()
+
+    result = check_for_first_snow(latitude, longitude, args.guesses, now=now, neighborhood=_neighborhood(args))
+    predicted_date = predict_first_snowfall_openmeteo(get_openmeteo_forecast(latitude, longitude))
+    status = {
+        "snowfall_occurred": result["snowfall_occurred"],
+        "first_snow_date": result["first_snow_date"].isoformat() if result["first_snow_date"] else None,
+        "winners": result["winners"],
+        "predicted_first_snowfall": predicted_date,
+        "projected_today": guess_index.closest(now, use_full_datetime=False),
+        "projected_forecast": guess_index.closest(predicted_date, use_full_datetime=False) if predicted_date else None
+    }
+
+    if args.json:
+        print(json.dumps(status, indent=2))
+        return 0
+    if status["snowfall_occurred"]:
+        print(f"First snow: {status['first_snow_date']} - winner: {' & '.join(status['winners'])}")
+    else:
+        print("No snowfall recorded yet.")
+    print(f"If it snowed today: {' & '.join(status['projected_today'])}")
+    if predicted_date:
+        print(f"Open-Meteo predicts {predicted_date}: {' & '.join(status['projected_forecast'])}")
+    return 0
+
+def command_leaderboard(args):
+    from utils.scoring import load_guess_index
+
+    target = datetime.fromisoformat(args.at) if args.at else datetime.now()
+    board = load_guess_index(args.guesses).leaderboard(target, use_full_datetime=not args.by_day, top=args.top)
+    if args.json:
+        print(json.dumps(board, indent=2))
+        return 0
+    unit = "days" if args.by_day else "hours"
+    for entry in board:
+        distance = entry["distance"] if args.by_day else entry["distance"] / 3600
+        print(f"{entry['rank']:>4}  {entry['name']:<30} {entry['guess']}  ({distance:g} {unit} off)")
+    return 0
+
+def command_snapshot(args):
+    from utils.refresh import SNAPSHOT_PATH, build_snapshot, refresh_snapshots, write_snapshot
+
+    if args.all_leagues:
+        # One batched load for every league, each written next to the default league's file
+        snapshots = refresh_snapshots(args.out or SNAPSHOT_PATH, args.leagues)
+        print(f"Wrote {len(snapshots)} league snapshots")
+        return 0
+
+    latitude, longitude = _location(args)
+    snapshot = build_snapshot(latitude, longitude, args.guesses, args.league_info, _neighborhood(args))
+    if args.out:
+        write_snapshot(snapshot, args.out)
+    else:
+        print(json.dumps(snapshot, indent=2))
+    return 0
+
+def command_guess(args):
+    from utils.ledger import GUESS_FORMAT, get_guess_ledger
+
+    ledger = get_guess_ledger(args.guesses)
+    try:
+        if args.action == "submit":
+            entry = ledger.submit(args.name, args.guess)
+        elif args.action == "edit":
+            entry = ledger.edit(args.name, args.guess)
+        elif args.action == "withdraw":
+            entry = ledger.withdraw(args.name)
+        elif args.action == "close":
+            entry = ledger.close(datetime.strptime(args.first_snow, GUESS_FORMAT))
+        else:
+            entry = ledger.set_deadline(args.deadline)
+    except ValueError as exc:
+        # GuessError, or a first snow time that doesn't parse
+        print(f"Rejected: {exc}", file=sys.stderr)
+        return 1
+    if entry is None:
+        print(f"The game was already closed at {ledger.first_snow.strftime(GUESS_FORMAT)}")
+        return 0
+    print(json.dumps(entry))
+    return 0
+
+def command_backfill(args):
+    from utils.hourly_archive import HourlyArchive, get_hourly_archive
+    from utils.neighborhood import site_cells
+
+    # Every cell of a neighborhood grid is stored, so detection can scan the grid from disk too
+    sites = _sites(args)
+    cells = site_cells([coordinate for coordinate, _ in sites], [neighborhood for _, neighborhood in sites])
+    coordinates = list(dict.fromkeys(cell for site in cells for cell in site))
+    archive = HourlyArchive(args.path) if args.path else get_hourly_archive()
+    if archive is None:
+        print("The hourly archive is disabled (FIRSTSNOW_HOURLY_ARCHIVE_PATH is empty)", file=sys.stderr)
+        return 1
+
+    written = archive.backfill(
+        coordinates,
+        datetime.fromisoformat(args.start),
+        datetime.fromisoformat(args.end) if args.end else None,
+        args.variable,
+        progress=None if args.quiet else print
+    )
+    print(f"Wrote {written} hours of {args.variable} for {len(coordinates)} locations to {archive.root}")
+    return 0
+
+def _thresholds(text):
+    """Parses '0:5:0.1' (start:stop:step, inclusive) or '0,0.5,1' into threshold values."""
+    import numpy as np
+
+    if ":" in text:
+        start, stop, step = (float(part) for part in text.split(":"))
+        return np.round(np.arange(start, stop + step / 2, step), 6)
+    return np.array([float(part) for part in text.split(",")])
+
+def command_backtest(args):
+    import os
+
+    from utils.backtest import (DEFAULT_OBSERVED_THRESHOLD, ForecastHistory, backtest, best_thresholds,
+                                fetch_forecast_histories)
+    from utils.leagues import group_by_location, load_leagues
+
+    if args.history:
+        histories = [ForecastHistory.load(path) for path in args.history]
+    elif args.start:
+        if args.all_leagues:
+            coordinates = list(group_by_location(load_leagues(args.leagues).values()))
+        else:
+            coordinates = [_location(args)]
+        end = datetime.fromisoformat(args.end) if args.end else datetime.now()
+        histories = fetch_forecast_histories(coordinates, datetime.fromisoformat(args.start), end, args.max_lead)
+        if args.save:
+            os.makedirs(args.save, exist_ok=True)
+            for history in histories:
+                history.save(os.path.join(args.save, f"{history.latitude},{history.longitude}.npz"))
+    else:
+        print("Give --history files or a --start day to record from", file=sys.stderr)
+        return 1
+
+    observed_threshold = DEFAULT_OBSERVED_THRESHOLD if args.observed_threshold is None else args.observed_threshold
+    results = backtest(histories, _thresholds(args.thresholds), observed_threshold)
+    best = best_thresholds(results, args.metric)
+    if args.json:
+        print(json.dumps({
+            "best": best,
+            **{key: values.tolist() for key, values in results.items()}
+        }, indent=2))
+        return 0
+
+    print(f"{len(histories)} locations, best threshold per lead by {args.metric}:")
+    if results["skipped_seasons"]:
+        print(f"{results['skipped_seasons']} seasons skipped for missing observations before the first snow")
+    print("lead  seasons  threshold   hit  ±1 day  detected  early  mean error")
+    for entry in best:
+        print(f"{entry['lead']:>4}  {entry['seasons']:>7}  {entry['threshold']:>7.2f}cm"
+              f"  {entry['hit_rate']:>4.0%}  {entry['within_one_day']:>6.0%}  {entry['detection_rate']:>8.0%}"
+              f"  {entry['false_alarm_rate']:>5.0%}  {entry['mean_error_days']:>+9.2f}d")
+    return 0
+
+def command_startup_check(args):
+    """Imports the engine in a fresh interpreter, then checks the time taken and the modules loaded."""
+    probe = (
+        "import sys, time\n"
+        "started = time.perf_counter()\n"
+        f"for name in {ENGINE_MODULES!r}: __import__(name)\n"
+        "elapsed = time.perf_counter() - started\n"
+        f"loaded = sorted({{m.split('.')[0] for m in sys.modules}} & set({UI_MODULES!r}))\n"
+        "print(elapsed, ','.join(loaded))\n"
+    )
+    output = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True).stdout.split()
+    elapsed = float(output[0])
+    loaded = output[1].split(",") if len(output) > 1 else []
+
+    print(f"Engine import: {elapsed:.3f}s (budget {args.budget:.3f}s)")
+    if loaded:
+        print(f"UI libraries imported by the engine: {', '.join(loaded)}")
+    return 0 if elapsed <= args.budget and not loaded else 1
+
+def build_parser():
+    from utils.leagues import LEAGUES_PATH
+
+    parser = argparse.ArgumentParser(description="Run the FirstSnow game engine without the Streamlit UI.")
+    parser.add_argument("--location", default="config/location.json", help="Location JSON file.")
+    parser.add_argument("--guesses", default="config/guesses.jsonl", help="Guess ledger (.jsonl) or guesses JSON file.")
+    parser.add_argument("--league", help="League id from the registry (overrides --location and --guesses).")
+    parser.add_argument("--leagues", default=LEAGUES_PATH,
+                        help="League registry JSON file (default: FIRSTSNOW_LEAGUES_PATH or config/leagues.json).")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    status = commands.add_parser("status", help="Show first-snow status and projected winners.")
+    status.add_argument("--json", action="store_true", help="Print JSON instead of text.")
+    status.set_defaults(handler=command_status)
+
+    leaderboard = commands.add_parser("leaderboard", help="Rank every guess against a time.")
+    leaderboard.add_argument("--at", help="Time to score against (ISO format, default: now).")
+    leaderboard.add_argument("--top", type=int, help="Only show the first N places.")
+    leaderboard.add_argument("--by-day", action="store_true", help="Score by whole days instead of to the second.")
+    leaderboard.add_argument("--json", action="store_true", help="Print JSON instead of text.")
+    leaderboard.set_defaults(handler=command_leaderboard)
+
+    snapshot = commands.add_parser("snapshot", help="Build the full game-state snapshot.")
+    snapshot.add_argument("--out", help="Write the snapshot here (atomically) instead of printing it.")
+    snapshot.add_argument("--all-leagues", action="store_true",
+                          help="Write every league's snapshot (the default league's to --out, the others next to it).")
+    snapshot.set_defaults(handler=command_snapshot)
+
+    guess = commands.add_parser("guess", help="Record a guess in the ledger (--guesses must be a .jsonl ledger).")
+    actions = guess.add_subparsers(dest="action", required=True)
+    submit = actions.add_parser("submit", help="Add a new player's guess.")
+    submit.add_argument("name")
+    submit.add_argument("guess", help="'YYYY-MM-DD HH:MM'")
+    edit = actions.add_parser("edit", help="Change a player's guess.")
+    edit.add_argument("name")
+    edit.add_argument("guess", help="'YYYY-MM-DD HH:MM'")
+    withdraw = actions.add_parser("withdraw", help="Remove a player.")
+    withdraw.add_argument("name")
+    deadline = actions.add_parser("deadline", help="Freeze guesses from this time.")
+    deadline.add_argument("deadline", nargs="?", help="'YYYY-MM-DD HH:MM' (omit to lift the deadline)")
+    close = actions.add_parser("close", help="End the game at the first snow (the refresh worker does this on its own).")
+    close.add_argument("first_snow", help="'YYYY-MM-DD HH:MM'")
+    guess.set_defaults(handler=command_guess)
+
+    backfill = commands.add_parser("backfill", help="Fill the memory-mapped hourly archive for bulk history scans.")
+    backfill.add_argument("--start", default="1940-01-01", help="First day to store (ISO format).")
+    backfill.add_argument("--end", help="Last day to store (default: the last day the archive no longer revises).")
+    backfill.add_argument("--variable", default="snowfall", help="Hourly Open-Meteo variable.")
+    backfill.add_argument("--all-leagues", action="store_true", help="Backfill every league's location.")
+    backfill.add_argument("--path", help="Archive directory (default: FIRSTSNOW_HOURLY_ARCHIVE_PATH or .cache/hourly).")
+    backfill.add_argument("--quiet", action="store_true", help="Don't print progress.")
+    backfill.set_defaults(handler=command_backfill)
+
+    backtest = commands.add_parser("backtest", help="Score past forecasts' first-snow calls by lead time and threshold.")
+    backtest.add_argument("--history", nargs="+", help="Recorded forecast histories (.npz) to replay.")
+    backtest.add_argument("--start", help="Record forecasts from this day on instead (ISO format).")
+    backtest.add_argument("--end", help="Last day to record (default: today).")
+    backtest.add_argument("--max-lead", type=int, default=7, help="Days of lead to record (at most 7).")
+    backtest.add_argument("--save", help="Directory to keep the recorded histories in, for later --history runs.")
+    backtest.add_argument("--all-leagues", action="store_true", help="Record every league's location.")
+    backtest.add_argument("--thresholds", default="0:5:0.1", help="Forecast snowfall thresholds in cm, 'start:stop:step' or a list.")
+    backtest.add_argument("--observed-threshold", type=float,
+                          help="Observed daily snowfall (cm) counting as first snow (default: the detection threshold).")
+    backtest.add_argument("--metric", default="hit_rate", choices=("hit_rate", "within_one_day"), help="Score picking the best threshold.")
+    backtest.add_argument("--json", action="store_true", help="Print every score as JSON instead of text.")
+    backtest.set_defaults(handler=command_backtest)
+
+    startup = commands.add_parser("startup-check", help="Check the engine's cold-start time against the budget.")
+    startup.add_argument("--budget", type=float, default=STARTUP_BUDGET_SECONDS, help="Budget in seconds.")
+    startup.set_defaults(handler=command_startup_check)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.league_info = None
+    if args.league:
+        from utils.leagues import LeagueError, get_league
+
+        try:
+            args.league_info = get_league(args.league, args.leagues)
+        except LeagueError as exc:
+            print(exc, file=sys.stderr)
+            return 1
+        args.guesses = args.league_info["guesses"]
+    return args.handler(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+from bench.replay import Fixture, ReplayServer
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), os.pardir, "bench", "fixtures", "default.json")
+
+@pytest.fixture
+def replay(monkeypatch, tmp_path):
+    """
+    Points every Open-Meteo endpoint at a local replay server, with an empty archive store and
+    no hourly archive.
+    """
+    from utils import client, hourly_archive, store, timezones
+
+    server = ReplayServer(Fixture.load(FIXTURE_PATH)).start()
+    for endpoint in client.ENDPOINTS:
+        monkeypatch.setitem(client.ENDPOINTS[endpoint], "url", server.url(endpoint))
+    monkeypatch.setattr(store, "_default_store", store.ArchiveStore(str(tmp_path / "archive.sqlite")))
+    monkeypatch.setattr(store, "_store_disabled", False)
+    monkeypatch.setattr(hourly_archive, "_archive_disabled", True)
+    client.clear_grid_cells()
+    timezones.clear_timezones()
+    yield server
+    server.stop()
+    client.clear_grid_cells()
+    timezones.clear_timezones()
+
+@pytest.fixture
+def fresh_loaders():
+    """Empties every memoized loader (utils.loaders) before and after the test."""
+    from utils import loaders
+
+    def clear():
+        for loader in vars(loaders).values():
+            if hasattr(loader, "cache_clear"):
+                loader.cache_clear()
+
+    clear()
+    yield loaders
+    clear()
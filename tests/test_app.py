@@ -0,0 +1,95 @@
+from datetime import datetime
+
+import app
+from utils.refresh import project_winners
+from utils.scoring import GuessIndex
+
+NOW = datetime(2024, 10, 20, 12)
+
+def test_projection_without_guesses():
+    projected = project_winners(GuessIndex({}), "2024-10-25", NOW)
+    assert projected == {"today": [], "forecast": [], "guesses": {}}
+    assert app.projection_text(projected["today"], projected["guesses"]) == "No guesses yet."
+
+def test_projection_keeps_the_winners_guesses():
+    guesses = {"Ann": "2024-10-20 06:00", "Bob": "2024-10-20 18:00", "Cat": "2024-10-26 00:00"}
+    projected = project_winners(GuessIndex(guesses), "2024-10-25", NOW)
+    assert projected["today"] == ["Ann", "Bob"]
+    assert projected["forecast"] == ["Cat"]
+    assert projected["guesses"] == guesses
+
+    # Rendering only reads the snapshot, so a withdrawal since the refresh changes nothing
+    assert app.projection_text(projected["forecast"], projected["guesses"]) == "Cat would win with a guess of 2024-10-26 00:00."
+    assert app.projection_text(projected["today"], projected["guesses"]) == (
+        "Tie between Ann & Bob, each with guesses of 2024-10-20 06:00."
+    )
+    assert project_winners(GuessIndex(guesses), None, NOW)["forecast"] is None
+
+def _page_with_failures(guesses_file):
+    """Script run by AppTest: one section raises, one load fails, one section renders."""
+    from concurrent.futures import Future
+
+    import app
+
+    def broken(data, league):
+        raise IndexError("list index out of range")
+
+    def working(data, league):
+        app.st.write(f"Forecast: {data['predicted_first_snowfall']}")
+
+    app.SECTIONS = {
+        "broken": (("projected",), broken),
+        "missing": (("historical",), working),
+        "working": (("predicted_first_snowfall",), working),
+    }
+    loaded, failed = Future(), Future()
+    loaded.set_result({"projected": {}, "predicted_first_snowfall": "2024-10-25"})
+    failed.set_exception(RuntimeError("history unavailable"))
+    league = {"id": "test", "guesses": guesses_file}
+    app.render_progressively({"loaded": loaded, "failed": failed}, league)
+    app.render_guess_form(league)
+
+def test_failing_sections_leave_the_rest_of_the_page(tmp_path):
+    from streamlit.testing.v1 import AppTest
+
+    page = AppTest.from_function(_page_with_failures, args=(str(tmp_path / "guesses.jsonl"),)).run()
+    assert not page.exception
+    assert [error.value for error in page.error] == [
+        "Could not show this section: list index out of range",
+        "Could not load this section: history unavailable",
+    ]
+    assert [markdown.value for markdown in page.markdown] == ["Forecast: 2024-10-25"]
+    assert [header.value for header in page.header] == ["JOIN THE GAME"]
+    assert len(page.text_input) == 1
+
+def _page_with_a_slow_load():
+    """Script run by AppTest: the first section waits on a slow load, the second on a ready one."""
+    import threading
+    from concurrent.futures import Future
+
+    import app
+
+    app.rendered = []
+
+    def section(data, league):
+        app.rendered.append(sorted(data))
+        app.st.write(", ".join(sorted(data)))
+
+    app.SECTIONS = {
+        "late": (("historical", "forecast"), section),
+        "early": (("forecast",), section),
+    }
+    ready, slow = Future(), Future()
+    ready.set_result({"forecast": []})
+    threading.Timer(0.2, slow.set_result, args=({"historical": {}},)).start()
+    app.rendered.append(app.render_progressively({"ready": ready, "slow": slow}, {"id": "test", "guesses": "x.json"}))
+
+def test_sections_render_as_their_data_arrives():
+    from streamlit.testing.v1 import AppTest
+
+    page = AppTest.from_function(_page_with_a_slow_load).run()
+    assert not page.exception
+    # The ready section didn't wait for the slow load, and everything was merged in the end
+    assert app.rendered == [["forecast"], ["forecast", "historical"], {"forecast": [], "historical": {}}]
+    # Placeholders keep page order whatever order the data arrived in
+    assert [markdown.value for markdown in page.markdown] == ["forecast, historical", "forecast"]
@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+
+from utils.backtest import DEFAULT_OBSERVED_THRESHOLD, ForecastHistory, backtest, best_thresholds
+
+THRESHOLDS = np.round(np.arange(0.0, 2.01, 0.25), 2)
+
+def _history(seed, start, end, max_lead=3):
+    """Synthetic seasons: a few snowy days a winter, forecasts that are noisy and sometimes missing."""
+    rng = np.random.default_rng(seed)
+    days = np.arange(np.datetime64(start), np.datetime64(end) + 1)
+    month = days.astype('datetime64[M]').astype(int) % 12 + 1
+    winter = np.isin(month, [10, 11, 12, 1, 2, 3, 4])
+    observed = np.where(winter & (rng.random(len(days)) < 0.15), rng.uniform(0.1, 3.0, len(days)), 0.0)
+    observed[rng.random(len(days)) < 0.01] = np.nan
+    forecast = np.clip(observed[None] + rng.normal(0, 0.6, (max_lead + 1, len(days))), 0, None)
+    forecast[rng.random(forecast.shape) < 0.02] = np.nan
+    return ForecastHistory(40.0 + seed, -105.0, days, forecast, observed)
+
+def _brute_force(histories, thresholds, observed_threshold=DEFAULT_OBSERVED_THRESHOLD):
+    """The rule replayed season by season, lead by lead and threshold by threshold."""
+    max_lead = histories[0].max_lead
+    outcomes = [[[] for _ in range(max_lead + 1)] for _ in thresholds]
+    for history in histories:
+        first_days = {}
+        unobserved = set()
+        for day, value in zip(history.days, history.observed):
+            month = day.astype('datetime64[M]').astype(int) % 12 + 1
+            season = day.astype('datetime64[Y]').astype(int) + 1970 - (month < 7)
+            if np.isnan(value) and season not in first_days:
+                unobserved.add(season)
+            if value > observed_threshold and season not in first_days:
+                first_days[season] = day
+        for season, first_day in first_days.items():
+            if np.datetime64(f"{season}-07-01") < history.days[0] or season in unobserved:
+                continue
+            first = int((first_day - history.days[0]).astype(int))
+            for lead in range(max_lead + 1):
+                issued = first - lead
+                targets = [issued + ahead for ahead in range(max_lead + 1)]
+                if min(targets) < 0 or max(targets) >= len(history.days):
+                    continue
+                seen = [history.forecast[ahead, target] for ahead, target in enumerate(targets)]
+                if any(np.isnan(value) for value in seen):
+                    continue
+                for row, threshold in enumerate(thresholds):
+                    above = [ahead for ahead, value in enumerate(seen) if value > np.float32(threshold)]
+                    outcomes[row][lead].append(above[0] - lead if above else None)
+    return outcomes
+
+def _expected_scores(outcomes):
+    scores = {key: np.full((len(outcomes), len(outcomes[0])), np.nan) for key in
+              ("hit_rate", "within_one_day", "detection_rate", "false_alarm_rate", "mean_error_days", "mean_abs_error_days")}
+    for row, per_lead in enumerate(outcomes):
+        for lead, errors in enumerate(per_lead):
+            if not errors:
+                continue
+            predicted = [error for error in errors if error is not None]
+            scores["hit_rate"][row, lead] = sum(error == 0 for error in predicted) / len(errors)
+            scores["within_one_day"][row, lead] = sum(abs(error) <= 1 for error in predicted) / len(errors)
+            scores["detection_rate"][row, lead] = len(predicted) / len(errors)
+            scores["false_alarm_rate"][row, lead] = sum(error < 0 for error in predicted) / len(errors)
+            if predicted:
+                scores["mean_error_days"][row, lead] = np.mean(predicted)
+                scores["mean_abs_error_days"][row, lead] = np.mean(np.abs(predicted))
+    return scores
+
+@pytest.mark.parametrize("observed_threshold", [0.0, DEFAULT_OBSERVED_THRESHOLD, 1.0])
+def test_backtest_matches_a_per_season_loop(observed_threshold):
+    # The second history starts mid-season, so its first season can't be scored
+    histories = [_history(0, "2016-07-01", "2021-06-30"), _history(1, "2017-09-15", "2021-03-31")]
+    results = backtest(histories, THRESHOLDS, observed_threshold)
+    outcomes = _brute_force(histories, THRESHOLDS, observed_threshold)
+
+    assert results["leads"].tolist() == [0, 1, 2, 3]
+    assert results["seasons"].tolist() == [len(errors) for errors in outcomes[0]]
+    assert results["seasons"].min() > 0
+    for key, expected in _expected_scores(outcomes).items():
+        np.testing.assert_allclose(results[key], expected, equal_nan=True, err_msg=key)
+
+def test_seasons_with_missing_observations_are_skipped():
+    history = _history(4, "2016-07-01", "2021-06-30")
+    history.observed[np.isnan(history.observed)] = 0.0
+    complete = backtest([history], THRESHOLDS)
+    assert complete["skipped_seasons"] == 0
+
+    # A gap in early October of 2018 could hide that season's first snow
+    gap = np.flatnonzero(history.days == np.datetime64("2018-10-01"))[0]
+    history.observed[gap] = np.nan
+    results = backtest([history], THRESHOLDS)
+    assert results["skipped_seasons"] == 1
+    assert (results["seasons"] == complete["seasons"] - 1).all()
+
+def test_best_thresholds_picks_the_lowest_on_ties():
+    results = backtest([_history(2, "2016-07-01", "2021-06-30")], THRESHOLDS)
+    for lead, best in enumerate(best_thresholds(results)):
+        scores = np.nan_to_num(results["hit_rate"][:, lead], nan=-np.inf)
+        assert best["lead"] == lead
+        assert best["threshold"] == pytest.approx(THRESHOLDS[np.flatnonzero(scores == scores.max())[0]])
+        assert best["hit_rate"] == pytest.approx(scores.max())
+
+def test_forecast_history_round_trip(tmp_path):
+    history = _history(3, "2019-07-01", "2020-06-30", max_lead=7)
+    path = tmp_path / "history.npz"
+    history.save(path)
+    loaded = ForecastHistory.load(path)
+
+    assert (loaded.latitude, loaded.longitude) == (history.latitude, history.longitude)
+    assert loaded.max_lead == 7
+    np.testing.assert_array_equal(loaded.days, history.days)
+    np.testing.assert_array_equal(loaded.forecast, history.forecast)
+    np.testing.assert_array_equal(loaded.observed, history.observed)
+
+def test_forecast_history_rejects_gaps():
+    days = np.array(["2020-10-01", "2020-10-03"], dtype='datetime64[D]')
+    with pytest.raises(ValueError, match="consecutive"):
+        ForecastHistory(40.0, -105.0, days, np.zeros((2, 2)), np.zeros(2))
+    with pytest.raises(ValueError, match="one column per day"):
+        ForecastHistory(40.0, -105.0, days[:1], np.zeros((2, 2)), np.zeros(1))
@@ -0,0 +1,63 @@
+from datetime import datetime
+
+import numpy as np
+import requests
+
+from bench.replay import ReplayServer
+from bench.run import SCENARIOS, format_result, reset_caches, run_scenario
+from utils import client, ledger, refresh, scoring, timezones
+
+def test_cold_scenarios_start_from_empty_caches(replay, fresh_loaders, tmp_path, monkeypatch):
+    monkeypatch.setitem(SCENARIOS, "crowd_2", dict(SCENARIOS["crowd_20"], sessions=2))
+    latitude, longitude = replay.fixture.latitude, replay.fixture.longitude
+    result = run_scenario("crowd_2", replay, latitude, longitude, str(tmp_path), track_memory=False)
+    assert all(isinstance(value, float) for value in result["stages"].values()), result["stages"]
+    # The crowd shares one set of loads
+    assert result["requests"]["forecast"] == 1
+    assert timezones._zones and client._grid_cells and ledger._ledgers and refresh._shared_loads
+
+    reset_caches(str(tmp_path))
+    assert not (timezones._zones or client._grid_cells or ledger._ledgers or scoring._index_cache
+                or refresh._shared_loads)
+    assert all(loader.cache_info()["size"] == 0 for loader in vars(fresh_loaders).values()
+               if hasattr(loader, "cache_info"))
+
+def test_replay_answers_every_coordinate_with_its_grid_cell(replay):
+    status, bodies = replay.respond("archive", {"latitude": "41.161083,41.21", "longitude": "-112.01631,-112.01",
+                                                "start_date": "2023-01-01", "end_date": "2023-01-02",
+                                                "hourly": "snowfall", "timezone": "GMT"})
+    assert status == 200
+    assert [(body["latitude"], body["longitude"]) for body in bodies] == [(41.15, -112.05), (41.25, -112.05)]
+    # Every location gets the same weather
+    assert bodies[0]["hourly"] == bodies[1]["hourly"]
+    assert len(bodies[0]["hourly"]["time"]) == 48
+
+def test_replay_archive_lags_behind_now(replay):
+    replay.now = datetime(2024, 1, 10, 12)
+    _, body = replay.respond("archive", {"latitude": "41.16", "longitude": "-112.02", "start_date": "2024-01-07",
+                                         "end_date": "2024-01-10", "hourly": "snowfall", "timezone": "GMT"})
+    times = np.array(body["hourly"]["time"], dtype='datetime64[m]')
+    missing = np.array([value is None for value in body["hourly"]["snowfall"]])
+    # 48 hours before the replay's local noon, in GMT
+    first_missing = np.datetime64('2024-01-08T12:00') - np.timedelta64(replay.fixture.utc_offset_seconds // 60, 'm')
+    assert not missing[times <= first_missing].any()
+    assert missing[times > first_missing].all()
+
+def test_replay_injects_failures(replay):
+    failing = ReplayServer(replay.fixture, failure_rate=1.0, seed=0).start()
+    try:
+        response = requests.get(failing.url("forecast"), params={"latitude": "41.16", "longitude": "-112.02",
+                                                                 "daily": "snowfall_sum"}, timeout=5)
+        assert response.status_code == 503
+        assert failing.stats["failures"] == 1
+    finally:
+        failing.stop()
+
+def test_results_are_reported_per_scenario(replay, fresh_loaders, tmp_path):
+    result = run_scenario("warm_rerun", replay, replay.fixture.latitude, replay.fixture.longitude, str(tmp_path),
+                          track_memory=True)
+    # The warm-up pass leaves nothing for the measured one to fetch
+    assert result["requests"]["forecast"] == 0
+    assert result["peak_memory_bytes"] > 0
+    report = format_result(result)
+    assert report.startswith("warm_rerun") and "FAILED" not in report
@@ -0,0 +1,67 @@
+import json
+
+import cli
+from utils import leagues
+
+def test_leagues_default_follows_the_app_setting(monkeypatch):
+    monkeypatch.setattr(leagues, "LEAGUES_PATH", "/srv/firstsnow/leagues.json")
+    assert cli.build_parser().parse_args(["status"]).leagues == "/srv/firstsnow/leagues.json"
+    assert cli.build_parser().parse_args(["--leagues", "other.json", "status"]).leagues == "other.json"
+
+GUESSES = {"Ann": "2024-10-20 06:00", "Bob": "2024-11-20 18:00", "Cat": "2024-10-20 06:00"}
+
+def _league_files(tmp_path, replay=None):
+    location = tmp_path / "location.json"
+    latitude, longitude = (replay.fixture.latitude, replay.fixture.longitude) if replay else (40.0, -105.0)
+    location.write_text(json.dumps({"latitude": latitude, "longitude": longitude}))
+    guesses = tmp_path / "guesses.json"
+    guesses.write_text(json.dumps(GUESSES))
+    return ["--location", str(location), "--guesses", str(guesses)]
+
+def test_leaderboard(tmp_path, capsys):
+    assert cli.main(_league_files(tmp_path) + ["leaderboard", "--at", "2024-10-21 06:00", "--json"]) == 0
+    board = json.loads(capsys.readouterr().out)
+    assert [(row["rank"], row["name"], row["distance"]) for row in board] == [
+        (1, "Ann", 24 * 3600), (1, "Cat", 24 * 3600), (3, "Bob", (30 * 24 + 12) * 3600)
+    ]
+
+    assert cli.main(_league_files(tmp_path) + ["leaderboard", "--at", "2024-10-21 06:00", "--by-day", "--top", "1"]) == 0
+    assert capsys.readouterr().out.splitlines() == [
+        "   1  Ann                            2024-10-20 06:00  (1 days off)",
+        "   1  Cat                            2024-10-20 06:00  (1 days off)",
+    ]
+
+def test_status_and_snapshot(replay, fresh_loaders, tmp_path, capsys):
+    arguments = _league_files(tmp_path, replay)
+    assert cli.main(arguments + ["status", "--json"]) == 0
+    status = json.loads(capsys.readouterr().out)
+    assert status["snowfall_occurred"] and status["winners"]
+    assert set(status["winners"]) <= set(GUESSES)
+    assert status["projected_today"] == ["Bob"]
+
+    out = tmp_path / "snapshot.json"
+    assert cli.main(arguments + ["snapshot", "--out", str(out)]) == 0
+    snapshot = json.loads(out.read_text())
+    assert snapshot["first_snow"]["winners"] == status["winners"]
+    assert snapshot["location"] == {"latitude": replay.fixture.latitude, "longitude": replay.fixture.longitude}
+
+def test_guess_submissions_go_through_the_ledger(tmp_path, capsys):
+    path = str(tmp_path / "guesses.jsonl")
+    assert cli.main(["--guesses", path, "guess", "submit", "Ann", "2024-11-02 18:00"]) == 0
+    assert json.loads(capsys.readouterr().out)["name"] == "Ann"
+    assert cli.main(["--guesses", path, "guess", "submit", "Ann", "2024-11-03 18:00"]) == 1
+    assert "Rejected" in capsys.readouterr().err
+    assert cli.main(["--guesses", path, "guess", "withdraw", "Ann"]) == 0
+    assert json.loads(capsys.readouterr().out)["action"] == "withdraw"
+    assert cli.main(["--guesses", path, "leaderboard", "--json"]) == 0
+    assert json.loads(capsys.readouterr().out) == []
+
+def test_unknown_league(tmp_path, capsys):
+    registry = tmp_path / "leagues.json"
+    registry.write_text(json.dumps([{"id": "ogden", "latitude": 41.2, "longitude": -112.0}]))
+    assert cli.main(["--leagues", str(registry), "--league", "provo", "status"]) == 1
+    assert "Unknown league 'provo'" in capsys.readouterr().err
+
+def test_engine_starts_without_ui_libraries(capsys):
+    assert cli.main(["startup-check", "--budget", "30"]) == 0
+    assert "UI libraries" not in capsys.readouterr().out
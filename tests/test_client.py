@@ -0,0 +1,44 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import client
+
+class _CountingSession:
+    """Stands in for requests.Session, recording how many GETs overlap."""
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def get(self, url, params, timeout):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.02)
+        with self.lock:
+            self.active -= 1
+        return _Response()
+
+class _Response:
+    status_code = 200
+    content = b"{}"
+
+    def json(self):
+        return {}
+
+def test_requests_share_a_process_wide_cap(monkeypatch):
+    session = _CountingSession()
+    monkeypatch.setattr(client, "get_session", lambda: session)
+    monkeypatch.setattr(client, "_request_slots", threading.BoundedSemaphore(2))
+    monkeypatch.setattr(client, "_bucket", client.TokenBucket(1000, 1000))
+
+    # Nested pools, like archive chunks fetched from inside dataset loads
+    def load(outer):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(lambda inner: client.get_json("archive", {"chunk": f"{outer}-{inner}"}), range(4)))
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(load, range(4)))
+    assert session.peak == 2
@@ -0,0 +1,40 @@
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pytest
+
+from utils import hourly_archive
+from utils.detection import DEFAULT_THRESHOLD, detect_first_snow
+from utils.hourly_archive import HourlyArchive
+
+LOCATION = (41.161083, -112.01631)
+ZONE = ZoneInfo("America/Denver")
+
+def _expected_first_snow(fixture, start):
+    """First snowy hour after local `start`, found hour by hour in GMT and converted with zoneinfo."""
+    times, values = fixture.hourly(np.datetime64('2023-08-01'), np.datetime64('2024-03-01'), utc=True)
+    start_gmt = np.datetime64(start.replace(tzinfo=ZONE).astimezone(timezone.utc).replace(tzinfo=None), 'm')
+    first = times[(times >= start_gmt) & (np.round(values, 2) > DEFAULT_THRESHOLD)][0]
+    gmt = first.astype('datetime64[s]').item().replace(tzinfo=timezone.utc)
+    return gmt.astimezone(ZONE).replace(tzinfo=None), gmt
+
+@pytest.mark.parametrize("start", [datetime(2023, 9, 1), datetime(2023, 11, 6)], ids=["daylight", "standard"])
+def test_archive_and_api_agree_across_daylight_saving_time(replay, tmp_path, monkeypatch, start):
+    now = datetime(2024, 2, 1)
+    expected, gmt = _expected_first_snow(replay.fixture, start)
+
+    streamed = detect_first_snow(*LOCATION, start_date=start, now=now)
+    assert streamed == expected
+
+    archive = HourlyArchive(str(tmp_path / "hourly"))
+    archive.backfill([LOCATION], datetime(2023, 8, 1), datetime(2024, 2, 1))
+    monkeypatch.setattr(hourly_archive, "_default_archive", archive)
+    monkeypatch.setattr(hourly_archive, "_archive_disabled", False)
+    replay.reset_stats()
+    assert detect_first_snow(*LOCATION, start_date=start, now=now) == expected
+    assert replay.stats["requests"]["archive"] == 0
+
+    # The window starts in daylight time either way; the standard time case snows after the clocks went back
+    offset = (expected - gmt.replace(tzinfo=None)).total_seconds() / 3600
+    assert offset == (-6 if start.month == 9 else -7)
@@ -0,0 +1,118 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pytest
+
+from utils import hourly_archive
+from utils.hourly_archive import EPOCH, HourlyArchive, _hour_index
+
+LOCATION = (41.161083, -112.01631)
+ZONE = "America/Denver"
+
+def _hour(text):
+    return _hour_index(np.datetime64(text, 'm'))
+
+def test_write_then_read_is_a_view_of_the_hours(tmp_path):
+    archive = HourlyArchive(str(tmp_path))
+    first = _hour('2023-01-01T00:00')
+    values = np.arange(48, dtype=np.float32)
+    archive.write(*LOCATION, first, values, ZONE)
+
+    first_hour, stored = archive.read(*LOCATION, np.datetime64('2023-01-01T05:00'), np.datetime64('2023-01-01T10:00'))
+    assert first_hour == np.datetime64('2023-01-01T05:00')
+    np.testing.assert_array_equal(stored, values[5:11])
+    assert isinstance(stored, np.memmap)
+    assert archive.coverage(*LOCATION)["timezone"] == ZONE
+
+    # Ranges are clipped to what is stored
+    first_hour, stored = archive.read(*LOCATION, np.datetime64('2022-12-31T00:00'), np.datetime64('2023-01-05T00:00'))
+    assert first_hour == EPOCH + first * np.timedelta64(60, 'm')
+    assert len(stored) == 48
+    assert archive.read(*LOCATION, np.datetime64('2023-02-01T00:00'), np.datetime64('2023-02-02T00:00')) is None
+
+def test_writes_extend_the_series_but_never_leave_a_gap(tmp_path):
+    archive = HourlyArchive(str(tmp_path))
+    archive.write(*LOCATION, _hour('2023-01-02T00:00'), np.ones(24, dtype=np.float32), ZONE)
+    archive.write(*LOCATION, _hour('2023-01-01T00:00'), np.zeros(24, dtype=np.float32), ZONE)
+
+    coverage = archive.coverage(*LOCATION)
+    assert (coverage["first_hour"], coverage["end_hour"]) == (_hour('2023-01-01T00:00'), _hour('2023-01-03T00:00'))
+    _, stored = archive.read(*LOCATION, np.datetime64('2023-01-01T00:00'), np.datetime64('2023-01-02T23:00'))
+    np.testing.assert_array_equal(stored, np.repeat([0, 1], 24))
+
+    with pytest.raises(ValueError):
+        archive.write(*LOCATION, _hour('2023-01-05T00:00'), np.ones(24, dtype=np.float32), ZONE)
+
+def test_daily_sums_follow_local_days_across_daylight_saving_time(tmp_path):
+    archive = HourlyArchive(str(tmp_path))
+    first = _hour('2023-11-01T00:00')
+    values = np.arange(24 * 10, dtype=np.float32)
+    archive.write(*LOCATION, first, values, ZONE)
+
+    days, sums = archive.daily_sums(*LOCATION, datetime(2023, 10, 31), datetime(2023, 11, 12))
+
+    # The stored hours run from Oct 31 18:00 to Nov 10 16:00 local time, so only Nov 1-9 are whole
+    assert days[0] == np.datetime64('2023-11-01') and days[-1] == np.datetime64('2023-11-09')
+    times = EPOCH + (first + np.arange(len(values))) * np.timedelta64(60, 'm')
+    local_days = np.array([
+        np.datetime64(time.astype('datetime64[s]').item().replace(tzinfo=ZoneInfo("UTC")).astimezone(ZoneInfo(ZONE)).date())
+        for time in times
+    ])
+    for day, total in zip(days, sums):
+        assert total == values[local_days == day].sum()
+    # The clocks go back on Nov 5, which has 25 hours
+    assert np.count_nonzero(local_days == np.datetime64('2023-11-05')) == 25
+
+def test_daily_sums_are_nan_for_days_with_missing_hours(tmp_path):
+    archive = HourlyArchive(str(tmp_path))
+    values = np.zeros(24 * 3, dtype=np.float32)
+    values[30] = np.nan
+    archive.write(*LOCATION, _hour('2023-07-01T06:00'), values, ZONE)
+
+    days, sums = archive.daily_sums(*LOCATION, datetime(2023, 7, 1), datetime(2023, 7, 3))
+    assert days.tolist() == [datetime(2023, 7, 1).date(), datetime(2023, 7, 2).date(), datetime(2023, 7, 3).date()]
+    assert sums[0] == 0 and np.isnan(sums[1]) and sums[2] == 0
+
+def _archive_between(monkeypatch, first, end):
+    """Makes the backfill's archive responses hold only the hours from `first` up to `end`."""
+    fetch_chunk = hourly_archive._fetch_chunk
+
+    def clipped(coordinates, chunk, variable):
+        responses = []
+        for response in fetch_chunk(coordinates, chunk, variable):
+            times = np.array(response["hourly"]["time"], dtype='datetime64[m]')
+            keep = (times >= np.datetime64(first, 'm')) & (times < np.datetime64(end, 'm'))
+            hourly = {key: np.array(values)[keep].tolist() for key, values in response["hourly"].items()}
+            responses.append(dict(response, hourly=hourly))
+        return responses
+
+    monkeypatch.setattr(hourly_archive, "_fetch_chunk", clipped)
+
+def test_backfill_stops_where_the_archive_begins(replay, tmp_path, monkeypatch):
+    archive = HourlyArchive(str(tmp_path))
+    archive.backfill([LOCATION], datetime(2023, 1, 1), datetime(2023, 3, 1))
+
+    # Older chunks come back short, then empty, once they reach before the archive's first hour
+    _archive_between(monkeypatch, '2021-06-01T00:00', '2100-01-01T00:00')
+    archive.backfill([LOCATION], datetime(2020, 1, 1), datetime(2023, 3, 1))
+    coverage = archive.coverage(*LOCATION)
+    assert (coverage["first_hour"], coverage["end_hour"]) == (_hour('2021-06-01T00:00'), _hour('2023-03-02T00:00'))
+
+def test_backfill_keeps_what_touches_the_stored_hours(replay, tmp_path, monkeypatch):
+    archive = HourlyArchive(str(tmp_path))
+    archive.backfill([LOCATION], datetime(2023, 1, 1), datetime(2023, 3, 1))
+    stored = archive.coverage(*LOCATION)
+
+    # The chunk next to the stored hours comes back short at that end: storing it would leave a gap
+    _archive_between(monkeypatch, '1940-01-01T00:00', '2022-12-01T00:00')
+    assert archive.backfill([LOCATION], datetime(2021, 1, 1), datetime(2023, 3, 1)) == 0
+    assert archive.coverage(*LOCATION) == stored
+
+def test_backfill_ends_at_a_short_chunk(replay, tmp_path, monkeypatch):
+    archive = HourlyArchive(str(tmp_path))
+    _archive_between(monkeypatch, '1940-01-01T00:00', '2022-08-01T00:00')
+    archive.backfill([LOCATION], datetime(2022, 1, 1), datetime(2023, 6, 1))
+
+    coverage = archive.coverage(*LOCATION)
+    assert (coverage["first_hour"], coverage["end_hour"]) == (_hour('2022-01-01T00:00'), _hour('2022-08-01T00:00'))
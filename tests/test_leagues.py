@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+from utils.leagues import LeagueError, get_league, group_by_location, group_by_site, load_leagues
+from utils.neighborhood import Neighborhood
+
+def _registry(tmp_path, entries):
+    path = tmp_path / "leagues.json"
+    path.write_text(json.dumps(entries))
+    return str(path)
+
+def test_leagues_read_their_location_and_neighborhood(tmp_path):
+    location = tmp_path / "location.json"
+    location.write_text(json.dumps({"latitude": 40.5, "longitude": -105.1,
+                                    "neighborhood": {"rows": 2, "columns": 2, "aggregate": "mean"}}))
+    leagues = load_leagues(_registry(tmp_path, [
+        {"id": "grid", "name": "Grid", "location": str(location), "guesses": "grid.jsonl"},
+        {"id": "point", "location": str(location), "neighborhood": None},
+        {"id": "inline", "latitude": 40.5, "longitude": -105.1},
+    ]))
+
+    assert list(leagues) == ["grid", "point", "inline"]
+    assert leagues["grid"]["neighborhood"] == Neighborhood(2, 2, aggregate="mean")
+    assert leagues["grid"]["guesses"] == "grid.jsonl"
+    assert leagues["point"]["name"] == "point"
+    assert leagues["point"]["neighborhood"] is None
+    assert leagues["inline"]["guesses"] == "config/guesses.jsonl"
+    assert get_league(path=_registry(tmp_path, [{"id": "inline", "latitude": 1, "longitude": 2}]))["id"] == "inline"
+
+    # One load per location, but a grid and a point there are detected apart
+    assert list(group_by_location(leagues.values())) == [(40.5, -105.1)]
+    assert [[league["id"] for league in group] for group in group_by_site(leagues.values()).values()] == [
+        ["grid"], ["point", "inline"]
+    ]
+
+def test_malformed_registries_are_rejected(tmp_path):
+    with pytest.raises(LeagueError, match="unique"):
+        load_leagues(_registry(tmp_path, [{"id": "a", "latitude": 1, "longitude": 2}] * 2))
+    with pytest.raises(LeagueError, match="Invalid neighborhood"):
+        load_leagues(_registry(tmp_path, [{"id": "a", "latitude": 1, "longitude": 2,
+                                           "neighborhood": {"rows": 0}}]))
+    with pytest.raises(LeagueError, match="Unknown league"):
+        get_league("b", _registry(tmp_path, [{"id": "a", "latitude": 1, "longitude": 2}]))
@@ -0,0 +1,165 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+import pytest
+
+import cli
+from utils.detection import first_snow_result
+from utils.ledger import GuessError, GuessLedger
+from utils.refresh import close_finished_games
+
+NOW = datetime(2025, 9, 1, 12)
+
+def _caught_up(path):
+    ledger = GuessLedger(path)
+    ledger.index()
+    return ledger
+
+def _lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+def test_replay_rebuilds_the_same_state(tmp_path):
+    path = str(tmp_path / "guesses.jsonl")
+    ledger = GuessLedger(path)
+    ledger.submit("Ann", "2025-10-20 06:00", now=NOW)
+    ledger.submit("Bob", "2025-11-02 18:00", now=NOW)
+    ledger.submit("Cat", "2025-10-05 00:00", now=NOW)
+    ledger.edit("Ann", "2025-10-25 09:00", now=NOW)
+    ledger.withdraw("Cat", now=NOW)
+    ledger.set_deadline("2025-10-01 00:00", now=NOW)
+
+    replayed = GuessLedger(path)
+    assert replayed.guesses() == {"Bob": "2025-11-02 18:00", "Ann": "2025-10-25 09:00"}
+    assert replayed.deadline == datetime(2025, 10, 1)
+    assert list(replayed.index().names) == list(ledger.index().names)
+    assert replayed.index().guess_for("Ann") == "2025-10-25 09:00"
+
+def test_empty_log_is_seeded_once(tmp_path):
+    seed = tmp_path / "guesses.json"
+    seed.write_text(json.dumps({"Ann": "2025-10-20 06:00", "Bob": "2025-11-02 18:00"}))
+    path = str(tmp_path / "guesses.jsonl")
+
+    assert GuessLedger(path, seed_file=str(seed)).guesses() == {"Ann": "2025-10-20 06:00", "Bob": "2025-11-02 18:00"}
+    assert GuessLedger(path, seed_file=str(seed)).guesses() == {"Ann": "2025-10-20 06:00", "Bob": "2025-11-02 18:00"}
+    assert len(_lines(path)) == 2
+
+def test_concurrent_appends_are_all_kept(tmp_path):
+    path = str(tmp_path / "guesses.jsonl")
+    # Separate ledgers on one file stand in for separate processes
+    ledgers = [GuessLedger(path) for _ in range(4)]
+    barrier = threading.Barrier(len(ledgers))
+
+    def submit_many(worker, ledger):
+        barrier.wait()
+        for i in range(25):
+            ledger.submit(f"player-{worker}-{i}", f"2025-10-{i + 1:02d} {worker:02d}:00", now=NOW)
+
+    threads = [threading.Thread(target=submit_many, args=(worker, ledger)) for worker, ledger in enumerate(ledgers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(_lines(path)) == 100
+    for ledger in ledgers:
+        assert len(ledger.guesses()) == 100
+        assert len(ledger.index()) == 100
+
+def test_concurrent_duplicate_submits_keep_one(tmp_path):
+    path = str(tmp_path / "guesses.jsonl")
+    ledgers = [GuessLedger(path) for _ in range(4)]
+    barrier = threading.Barrier(len(ledgers))
+    errors = []
+
+    def submit(ledger):
+        barrier.wait()
+        try:
+            ledger.submit("Ann", "2025-10-20 06:00", now=NOW)
+        except GuessError as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=submit, args=(ledger,)) for ledger in ledgers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(_lines(path)) == 1
+    assert len(errors) == 3
+
+def test_deadline_freezes_guesses(tmp_path):
+    ledger = GuessLedger(str(tmp_path / "guesses.jsonl"))
+    ledger.submit("Ann", "2025-10-20 06:00", now=NOW)
+    ledger.set_deadline("2025-09-15 00:00", now=NOW)
+
+    with pytest.raises(GuessError, match="closed at"):
+        ledger.submit("Bob", "2025-11-02 18:00", now=datetime(2025, 9, 20))
+    ledger.submit("Bob", "2025-11-02 18:00", now=datetime(2025, 9, 10))
+
+def test_close_ends_the_game_for_good(tmp_path):
+    path = str(tmp_path / "guesses.jsonl")
+    ledger = GuessLedger(path)
+    ledger.submit("Ann", "2025-10-20 06:00", now=NOW)
+    ledger.submit("Bob", "2025-11-02 18:00", now=NOW)
+
+    assert ledger.close(datetime(2025, 10, 21, 4), now=NOW) is not None
+    assert ledger.first_snow == datetime(2025, 10, 21, 4)
+    with pytest.raises(GuessError, match="game is over"):
+        ledger.submit("Cat", "2025-10-21 04:00", now=NOW)
+    with pytest.raises(GuessError, match="game is over"):
+        ledger.edit("Bob", "2025-10-21 04:00", now=NOW)
+    with pytest.raises(GuessError, match="game is over"):
+        ledger.withdraw("Ann", now=NOW)
+
+    # Lifting a deadline doesn't reopen a closed game, and closing again writes nothing
+    ledger.set_deadline(None, now=NOW)
+    assert ledger.close(datetime(2025, 10, 22), now=NOW) is None
+    with pytest.raises(GuessError, match="game is over"):
+        GuessLedger(path).submit("Cat", "2025-10-21 04:00", now=NOW)
+    assert [entry["action"] for entry in _lines(path)] == ["submit", "submit", "close", "deadline"]
+    assert _caught_up(path).first_snow == datetime(2025, 10, 21, 4)
+
+def test_scoring_the_first_snow_leaves_the_ledger_open(tmp_path):
+    path = str(tmp_path / "guesses.jsonl")
+    GuessLedger(path).submit("Ann", "2025-10-20 06:00", now=NOW)
+    size = os.path.getsize(path)
+
+    assert first_snow_result(datetime(2025, 10, 20, 8), path)["winners"] == ["Ann"]
+    assert os.path.getsize(path) == size
+    assert _caught_up(path).first_snow is None
+
+def test_refresh_closes_finished_games(tmp_path):
+    leagues = [
+        {"id": "done", "guesses": str(tmp_path / "done.jsonl")},
+        {"id": "open", "guesses": str(tmp_path / "open.jsonl")},
+        {"id": "plain", "guesses": str(tmp_path / "plain.json")},
+    ]
+    for league in leagues[:2]:
+        GuessLedger(league["guesses"]).submit("Ann", "2025-10-20 06:00", now=NOW)
+    snowed = {"snowfall_occurred": True, "first_snow_date": "2025-10-20T08:00:00"}
+    snapshots = {
+        "done": {"first_snow": snowed},
+        "open": {"first_snow": {"snowfall_occurred": False, "first_snow_date": None}},
+        "plain": {"first_snow": snowed},
+    }
+
+    assert close_finished_games(leagues, snapshots) == ["done"]
+    assert _caught_up(leagues[0]["guesses"]).first_snow == datetime(2025, 10, 20, 8)
+    assert _caught_up(leagues[1]["guesses"]).first_snow is None
+    assert not os.path.exists(leagues[2]["guesses"])
+    # The next refresh finds the game already closed
+    assert close_finished_games(leagues, snapshots) == []
+
+def test_cli_closes_the_game(tmp_path, capsys):
+    path = str(tmp_path / "guesses.jsonl")
+    GuessLedger(path).submit("Ann", "2025-10-20 06:00", now=NOW)
+
+    assert cli.main(["--guesses", path, "guess", "close", "2025-10-20 08:00"]) == 0
+    assert json.loads(capsys.readouterr().out)["first_snow"] == "2025-10-20 08:00"
+    assert cli.main(["--guesses", path, "guess", "close", "2025-10-21 08:00"]) == 0
+    assert "already closed at 2025-10-20 08:00" in capsys.readouterr().out
+    assert cli.main(["--guesses", path, "guess", "submit", "Bob", "2025-11-02 18:00"]) == 1
+    assert "game is over" in capsys.readouterr().err
@@ -0,0 +1,24 @@
+LOCATION = (41.161083, -112.01631)
+
+def test_reruns_are_served_without_upstream_requests(replay, fresh_loaders):
+    loaders = fresh_loaders
+    climatology = loaders.load_climatology(*LOCATION, 2024)
+    forecast = loaders.load_forecast(*LOCATION)
+    test_snowfall = loaders.load_test_snowfall(*LOCATION)
+    assert climatology is not None and forecast[0] and not test_snowfall.empty
+
+    replay.reset_stats()
+    assert loaders.load_climatology(*LOCATION, 2024) is climatology
+    assert loaders.load_forecast(*LOCATION) is forecast
+    assert loaders.load_test_snowfall(*LOCATION) is test_snowfall
+    assert sum(replay.stats["requests"].values()) == 0
+
+def test_climatology_reuses_the_loaded_history(replay, fresh_loaders):
+    loaders = fresh_loaders
+    historical = loaders.load_historical_snowfall(*LOCATION, 2024)
+    assert len(historical) == loaders.HISTORY_YEARS
+
+    replay.reset_stats()
+    climatology = loaders.load_climatology(*LOCATION, 2024)
+    assert replay.stats["requests"]["archive"] == 0
+    assert len(climatology.seasons) == loaders.HISTORY_YEARS
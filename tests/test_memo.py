@@ -0,0 +1,142 @@
+import threading
+import time
+
+import pytest
+
+from utils import memo
+from utils.memo import ttl_cache
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+def test_entries_expire_after_ttl():
+    calls = []
+
+    @ttl_cache(0.05)
+    def load(value, scale=1):
+        calls.append(value)
+        return value * scale
+
+    assert load(2) == load(2) == 2
+    assert load(2, scale=3) == 6
+    assert len(calls) == 2
+    time.sleep(0.1)
+    assert load(2) == 2
+    assert len(calls) == 3
+    assert load.cache_info()["hits"] == 1 and load.cache_info()["misses"] == 3
+
+def test_least_recently_used_entry_is_dropped():
+    @ttl_cache(None, maxsize=2)
+    def load(value):
+        return [value]
+
+    first = load(1)
+    load(2)
+    assert load(1) is first
+    load(3)
+    # 2 was used least recently
+    assert load(1) is first
+    assert load.cache_info()["size"] == 2
+    misses = load.cache_info()["misses"]
+    load(2)
+    assert load.cache_info()["misses"] == misses + 1
+
+def test_concurrent_misses_share_one_call():
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    @ttl_cache(60)
+    def load():
+        calls.append(1)
+        started.set()
+        release.wait(2)
+        return object()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(load())) for _ in range(5)]
+    threads[0].start()
+    started.wait(2)
+    for thread in threads[1:]:
+        thread.start()
+    _wait_for(lambda: load.cache_info()["coalesced"] == 4)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+
+def test_stale_value_is_served_while_one_refresh_runs():
+    release = threading.Event()
+    calls = []
+
+    @ttl_cache(0.05, stale_ttl=60)
+    def load():
+        calls.append(1)
+        if len(calls) > 1:
+            release.wait(2)
+        return len(calls)
+
+    assert load() == 1
+    time.sleep(0.1)
+    # Every caller gets the stale value at once; only one refresh starts
+    assert [load() for _ in range(5)] == [1] * 5
+    release.set()
+    _wait_for(lambda: load() == 2)
+    assert len(calls) == 2
+
+def test_failed_revalidation_backs_off(monkeypatch):
+    monkeypatch.setattr(memo, "REVALIDATE_BACKOFF", 60)
+    calls = []
+
+    @ttl_cache(0.05, stale_ttl=60)
+    def load(value):
+        calls.append(value)
+        if len(calls) > 1:
+            raise RuntimeError("upstream down")
+        return value
+
+    assert load(1) == 1
+    time.sleep(0.1)
+
+    # The first stale hit starts a refresh, which fails; the stale value keeps being served
+    assert load(1) == 1
+    _wait_for(lambda: len(calls) == 2)
+    time.sleep(0.05)
+    for _ in range(5):
+        assert load(1) == 1
+    time.sleep(0.05)
+    assert len(calls) == 2
+
+def test_revalidation_retries_after_backoff(monkeypatch):
+    monkeypatch.setattr(memo, "REVALIDATE_BACKOFF", 0.05)
+    calls = []
+
+    @ttl_cache(0.05, stale_ttl=60)
+    def load(value):
+        calls.append(value)
+        if len(calls) == 2:
+            raise RuntimeError("upstream down")
+        return value * len(calls)
+
+    assert load(2) == 2
+    time.sleep(0.1)
+    assert load(2) == 2
+    _wait_for(lambda: len(calls) == 2)
+    time.sleep(0.1)
+
+    assert load(2) == 2
+    _wait_for(lambda: load.cache_info()["size"] == 1 and load(2) == 6)
+    assert len(calls) == 3
+
+def test_miss_raises_without_caching():
+    @ttl_cache(60)
+    def load():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        load()
+    assert load.cache_info()["size"] == 0
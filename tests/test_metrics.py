@@ -0,0 +1,73 @@
+import json
+import time
+
+import pytest
+
+from utils import metrics
+
+@pytest.fixture
+def recording():
+    """Turns metrics on for the test, starting from nothing recorded."""
+    was_enabled = metrics.enabled()
+    metrics.set_enabled(True)
+    metrics.reset()
+    yield metrics
+    metrics.reset()
+    metrics.set_enabled(was_enabled)
+
+def test_nothing_is_recorded_while_disabled():
+    was_enabled = metrics.enabled()
+    metrics.set_enabled(False)
+    metrics.reset()
+    try:
+        metrics.increment("upstream_requests_total", endpoint="archive")
+        with metrics.span("section", section="historical"):
+            pass
+        assert metrics.to_dict() == {"counters": [], "histograms": [], "cache_hit_ratios": {}}
+    finally:
+        metrics.set_enabled(was_enabled)
+
+def test_counters_and_cache_hit_ratios(recording):
+    recording.increment("cache_requests_total", 3, cache="load_forecast", result="hit")
+    recording.increment("cache_requests_total", cache="load_forecast", result="stale")
+    recording.increment("cache_requests_total", cache="load_forecast", result="miss")
+    recording.increment("upstream_requests_total", endpoint="archive")
+    recording.increment("upstream_requests_total", endpoint="archive")
+
+    data = recording.to_dict()
+    assert {"name": "upstream_requests_total", "labels": {"endpoint": "archive"}, "value": 2} in data["counters"]
+    # Stale answers count as hits
+    assert data["cache_hit_ratios"] == {"load_forecast": 0.8}
+
+def test_spans_and_timed_functions_fill_histograms(recording):
+    @recording.timed("fetch")
+    def fetch():
+        time.sleep(0.02)
+        return "data"
+
+    assert fetch() == "data"
+    with recording.span("section", section="historical"):
+        pass
+
+    histograms = {(h["name"], tuple(h["labels"].items())): h for h in recording.to_dict()["histograms"]}
+    fetched = histograms[("fetch_seconds", (("function", "fetch"),))]
+    assert fetched["count"] == 1 and fetched["max"] >= 0.02
+    assert fetched["buckets"]["0.025"] + fetched["buckets"]["0.05"] + fetched["buckets"]["0.1"] == 1
+    assert histograms[("section_seconds", (("section", "historical"),))]["count"] == 1
+
+def test_prometheus_dump(recording, tmp_path):
+    recording.increment("upstream_requests_total", endpoint="forecast")
+    recording.observe("fetch_seconds", 0.3, function="load")
+    recording.observe("fetch_seconds", 7.0, function="load")
+    path = tmp_path / "metrics.prom"
+    recording.write_dump(str(path))
+
+    lines = path.read_text().splitlines()
+    assert "# TYPE firstsnow_upstream_requests_total counter" in lines
+    assert 'firstsnow_upstream_requests_total{endpoint="forecast"} 1' in lines
+    # Buckets are cumulative, ending with +Inf
+    assert 'firstsnow_fetch_seconds_bucket{function="load",le="0.25"} 0' in lines
+    assert 'firstsnow_fetch_seconds_bucket{function="load",le="0.5"} 1' in lines
+    assert 'firstsnow_fetch_seconds_bucket{function="load",le="+Inf"} 2' in lines
+    assert 'firstsnow_fetch_seconds_count{function="load"} 2' in lines
+    assert json.loads((tmp_path / "metrics.json").read_text()) == json.loads(recording.to_json())
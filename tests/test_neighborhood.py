@@ -0,0 +1,91 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from utils import client, store, timezones
+from utils.detection import detect_first_snow
+from utils.neighborhood import Neighborhood, site_cells
+from utils.weather import get_snowfall_data_df_many
+
+LOCATION = (41.161083, -112.01631)
+
+START = datetime(2023, 9, 1)
+NOW = datetime(2024, 2, 1)
+
+def _model_cell(replay, point):
+    response = replay.respond("archive", {"latitude": str(point[0]), "longitude": str(point[1]),
+                                          "start_date": "2000-01-01", "end_date": "2000-01-01",
+                                          "daily": "snowfall_sum"})[1]
+    return response["latitude"], response["longitude"]
+
+def _cold(replay, monkeypatch, tmp_path, name):
+    """Forgets every grid cell, time zone and stored archive day, as in a fresh process."""
+    client.clear_grid_cells()
+    timezones.clear_timezones()
+    monkeypatch.setattr(store, "_default_store", store.ArchiveStore(str(tmp_path / f"{name}.sqlite")))
+    replay.reset_stats()
+
+def _counting_combines(monkeypatch, neighborhood):
+    """Records how many cells every combine of `neighborhood` is handed."""
+    counts = []
+    combine = neighborhood.combine
+
+    def counting(values):
+        counts.append(len(values))
+        return combine(values)
+
+    monkeypatch.setattr(neighborhood, "combine", counting)
+    return counts
+
+def test_points_in_the_same_model_cell_are_kept_once(replay, monkeypatch):
+    fine = Neighborhood(rows=5, columns=5, spacing_km=3)
+    model_cells = {_model_cell(replay, point) for point in fine.cells(*LOCATION)}
+    assert len(model_cells) < 25
+    counts = _counting_combines(monkeypatch, fine)
+
+    detect_first_snow(*LOCATION, start_date=START, now=NOW, neighborhood=fine)
+    assert counts and set(counts) == {len(model_cells)}
+
+    # Once the responses showed the model cells, only one point per cell is fetched
+    cells = site_cells([LOCATION], [fine])[0]
+    assert len(cells) == len(model_cells)
+    assert {_model_cell(replay, point) for point in cells} == model_cells
+
+def test_daily_snowfall_counts_every_model_cell_once(replay, monkeypatch):
+    fine = Neighborhood(rows=5, columns=5, spacing_km=3, aggregate="mean")
+    model_cells = {_model_cell(replay, point) for point in fine.cells(*LOCATION)}
+    counts = _counting_combines(monkeypatch, fine)
+
+    get_snowfall_data_df_many([LOCATION], START, NOW, [fine])
+    assert counts == [len(model_cells)]
+
+def test_default_spacing_covers_distinct_model_cells(replay):
+    detect_first_snow(*LOCATION, start_date=START, now=NOW, neighborhood=Neighborhood())
+    assert len(site_cells([LOCATION], [Neighborhood()])[0]) == 9
+
+def test_site_cells_make_no_requests(replay):
+    assert site_cells([LOCATION, (45.0, -100.0)]) == [[LOCATION], [(45.0, -100.0)]]
+    assert site_cells([LOCATION], [Neighborhood(rows=5, columns=5, spacing_km=3)])[0] == \
+        Neighborhood(rows=5, columns=5, spacing_km=3).cells(*LOCATION)
+    assert replay.stats["requests"]["archive"] == 0
+
+def test_a_cold_neighborhood_costs_no_more_round_trips_than_a_point(replay, monkeypatch, tmp_path):
+    _cold(replay, monkeypatch, tmp_path, "point")
+    point = detect_first_snow(*LOCATION, start_date=START, now=NOW)
+    point_requests = dict(replay.stats["requests"])
+
+    _cold(replay, monkeypatch, tmp_path, "neighborhood")
+    assert detect_first_snow(*LOCATION, start_date=START, now=NOW, neighborhood=Neighborhood()) == point
+    assert replay.stats["requests"] == point_requests
+
+@pytest.mark.parametrize("aggregate, expected", [
+    ("max", [2.0, 0.0, 3.0, np.nan]),
+    ("mean", [1.0, 0.0, 1.5, np.nan]),
+    ("fraction", [1.0, 0.0, 0.0, np.nan]),
+])
+def test_combine_skips_cells_without_data(aggregate, expected):
+    values = [[0.0, 0.0, 3.0, np.nan],
+              [2.0, 0.0, 0.0, np.nan],
+              [1.0, np.nan, np.nan, np.nan]]
+    np.testing.assert_array_equal(Neighborhood(aggregate=aggregate, min_fraction=0.6).combine(values), expected)
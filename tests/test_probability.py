@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from utils.climatology import Climatology, day_of_season
+from utils.probability import (FORECAST_HIT_PROBABILITY, first_snow_distribution, sample_first_snow_times,
+                               score_samples, simulate_win_probabilities)
+from utils.scoring import GuessIndex
+
+NOW = datetime(2024, 10, 20, 15)
+GUESSES = {"Ann": "2024-10-22 06:00", "Bob": "2024-11-05 18:00", "Cat": "2024-10-22 06:00", "Dan": "2024-12-01 00:00"}
+CLIMATOLOGY = Climatology([2015 + i for i in range(8)],
+                          [f"{2015 + i}-{month}" for i, month in enumerate(["10-28", "11-05", "11-12", "10-30",
+                                                                            "11-20", "11-02", "12-01", "11-08"])])
+
+def _forecast(snowy_day=None):
+    days = [NOW + timedelta(days=lead) for lead in range(7)]
+    return [{"date": day.strftime('%Y-%m-%d'), "snow": 1.0 if lead == snowy_day else 0.0} for lead, day in enumerate(days)]
+
+def _brute_force(guess_index, sample_times):
+    """Each sample goes to the closest distinct guesses (split on ties), then to the players who made it."""
+    guesses, sizes = np.unique(guess_index.seconds, return_counts=True)
+    wins = np.zeros(len(guesses))
+    for sample in sample_times:
+        distances = np.abs(guesses - sample)
+        closest = distances == distances.min()
+        wins[closest] += 1 / closest.sum()
+    per_guess = dict(zip(guesses.tolist(), (wins / len(sample_times) / sizes).tolist()))
+    return np.array([per_guess[seconds] for seconds in guess_index.seconds.tolist()])
+
+def test_distribution_covers_only_the_rest_of_the_season():
+    season, pmf = first_snow_distribution(CLIMATOLOGY, _forecast(), NOW)
+    today = int(day_of_season(np.datetime64(NOW, 'D')))
+    assert season == 2024
+    assert pmf.sum() == pytest.approx(1.0)
+    assert not pmf[:today].any()
+    # Mass follows the climatology once the dry forecast window is over
+    assert pmf[today + 7:].sum() > 0.8
+
+def test_a_snowy_forecast_day_takes_most_of_the_mass():
+    _, pmf = first_snow_distribution(CLIMATOLOGY, _forecast(snowy_day=0), NOW)
+    today = int(day_of_season(np.datetime64(NOW, 'D')))
+    assert pmf[today] == pytest.approx(FORECAST_HIT_PROBABILITY)
+
+def test_samples_land_after_now():
+    season, pmf = first_snow_distribution(None, _forecast(snowy_day=0), NOW)
+    times = sample_first_snow_times(season, pmf, NOW, 10_000, np.random.default_rng(1))
+    assert times.min() >= np.datetime64(NOW, 's').astype(np.int64)
+    assert len(times) == 10_000
+
+def test_scoring_matches_a_per_sample_loop():
+    rng = np.random.default_rng(3)
+    index = GuessIndex(GUESSES)
+    start = np.datetime64('2024-10-20T00:00:00').astype(np.int64)
+    samples = start + rng.integers(0, 60 * 24 * 3600, 2000)
+    # Samples on the midpoint between two guesses are split between them
+    samples[:5] = (index.seconds.min() + np.unique(index.seconds)[1]) // 2
+    np.testing.assert_allclose(score_samples(index, samples), _brute_force(index, samples))
+
+def test_simulation_is_reproducible_and_sums_to_one():
+    index = GuessIndex(GUESSES)
+    first = simulate_win_probabilities(index, CLIMATOLOGY, _forecast(), NOW, samples=20_000, seed=7)
+    again = simulate_win_probabilities(index, CLIMATOLOGY, _forecast(), NOW, samples=20_000, seed=7)
+    assert first == again
+    assert sum(entry["probability"] for entry in first) == pytest.approx(1.0)
+    probabilities = [entry["probability"] for entry in first]
+    assert probabilities == sorted(probabilities, reverse=True)
+    # Ann and Cat share a guess, and so its chances
+    by_name = {entry["name"]: entry["probability"] for entry in first}
+    assert by_name["Ann"] == by_name["Cat"]
+
+def test_after_the_first_snow_the_winners_split_the_prize():
+    results = simulate_win_probabilities(GuessIndex(GUESSES), CLIMATOLOGY, _forecast(), NOW,
+                                         first_snow=datetime(2024, 10, 22, 9))
+    assert {entry["name"]: entry["probability"] for entry in results} == {"Ann": 0.5, "Cat": 0.5, "Bob": 0.0, "Dan": 0.0}
+    assert simulate_win_probabilities(GuessIndex({}), CLIMATOLOGY, _forecast(), NOW) == []
@@ -0,0 +1,214 @@
+import json
+import os
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from utils import refresh
+from utils.refresh import (build_league_snapshots, read_snapshot, refresh_snapshots, run_forever, snapshot_age,
+                           snapshot_path, write_snapshot)
+
+NOW = datetime(2024, 11, 10, 12)
+
+def _leagues(tmp_path, fixture, count=1):
+    leagues = []
+    for number in range(count):
+        guesses = tmp_path / f"league-{number}.json"
+        guesses.write_text(json.dumps({"Ann": "2024-10-20 06:00", "Bob": "2024-11-20 18:00"}))
+        leagues.append({
+            "id": f"league-{number}",
+            "name": f"League {number}",
+            "latitude": round(fixture.latitude + 0.5 * number, 6),
+            "longitude": fixture.longitude,
+            "neighborhood": None,
+            "guesses": str(guesses)
+        })
+    return leagues
+
+def test_refresh_serves_weather_from_the_memoized_loaders(replay, fresh_loaders, tmp_path):
+    replay.now = NOW
+    leagues = _leagues(tmp_path, replay.fixture)
+    first = build_league_snapshots(leagues, NOW)
+
+    replay.reset_stats()
+    second = build_league_snapshots(leagues, NOW)
+    for loader in (fresh_loaders.load_forecast_many, fresh_loaders.load_recent_snowfall_many,
+                   fresh_loaders.load_historical_snowfall_many, fresh_loaders.load_test_snowfall_many):
+        assert loader.cache_info()["misses"] == 1, loader.__name__
+    # Only first-snow detection goes upstream again
+    assert replay.stats["requests"]["archive"] + replay.stats["requests"]["forecast"] <= 2
+    assert second["league-0"]["forecast"] == first["league-0"]["forecast"]
+    assert second["league-0"]["recent_snowfall"] == first["league-0"]["recent_snowfall"]
+
+class _Stop(Exception):
+    """Ends run_forever from a patched sleep."""
+
+def _registry(tmp_path, leagues):
+    path = tmp_path / "leagues.json"
+    path.write_text(json.dumps([{key: league[key] for key in ("id", "name", "latitude", "longitude", "guesses")}
+                                for league in leagues]))
+    return str(path)
+
+def test_snapshots_are_replaced_atomically(tmp_path):
+    path = str(tmp_path / "cache" / "snapshot.json")
+    assert read_snapshot(path) is None
+
+    write_snapshot({"generated_at": "2024-11-10T12:00:00", "round": 1}, path)
+    write_snapshot({"generated_at": "2024-11-10T12:15:00", "round": 2}, path)
+    assert read_snapshot(path) == {"generated_at": "2024-11-10T12:15:00", "round": 2}
+    assert os.listdir(tmp_path / "cache") == ["snapshot.json"]
+    assert snapshot_age(read_snapshot(path), datetime(2024, 11, 10, 12, 20)) == 300
+
+def test_every_league_but_the_default_gets_its_own_file():
+    assert snapshot_path("default", ".cache/snapshot.json") == ".cache/snapshot.json"
+    assert snapshot_path("ridge", ".cache/snapshot.json") == ".cache/snapshot-ridge.json"
+
+def test_refresh_writes_every_leagues_snapshot(replay, fresh_loaders, tmp_path):
+    leagues = _leagues(tmp_path, replay.fixture, count=2)
+    leagues[0]["id"] = "default"
+    path = str(tmp_path / "snapshot.json")
+    snapshots = refresh_snapshots(path, _registry(tmp_path, leagues))
+
+    assert list(snapshots) == ["default", "league-1"]
+    for league_id, league in zip(snapshots, leagues):
+        stored = read_snapshot(snapshot_path(league_id, path))
+        assert stored == json.loads(json.dumps(snapshots[league_id]))
+        assert stored["league"] == {"id": league_id, "name": league["name"], "guesses": league["guesses"]}
+        assert stored["location"] == {"latitude": league["latitude"], "longitude": league["longitude"]}
+        assert {"forecast", "first_snow", "projected", "historical", "win_probabilities"} <= set(stored)
+        assert snapshot_age(stored) < 60
+
+def test_worker_waits_until_the_snapshots_are_due(tmp_path, monkeypatch):
+    leagues = _registry(tmp_path, [{"id": "default", "name": "FirstSnow", "latitude": 40.0, "longitude": -105.0,
+                                    "guesses": "guesses.jsonl"}])
+    path = str(tmp_path / "snapshot.json")
+    write_snapshot({"generated_at": (datetime.now() - timedelta(seconds=100)).isoformat(timespec='seconds')}, path)
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        raise _Stop
+
+    def refresh_now(*args):
+        raise AssertionError("a fresh snapshot was refreshed")
+
+    monkeypatch.setattr(refresh, "time", SimpleNamespace(sleep=sleep))
+    monkeypatch.setattr(refresh, "refresh_snapshots", refresh_now)
+    with pytest.raises(_Stop):
+        run_forever(600, path, leagues)
+    assert 495 <= sleeps[0] <= 500
+
+def test_failed_refresh_keeps_the_previous_snapshot(tmp_path, monkeypatch):
+    leagues = _registry(tmp_path, [{"id": "default", "name": "FirstSnow", "latitude": 40.0, "longitude": -105.0,
+                                    "guesses": "guesses.jsonl"}])
+    path = str(tmp_path / "snapshot.json")
+    stale = {"generated_at": (datetime.now() - timedelta(hours=1)).isoformat(timespec='seconds')}
+    write_snapshot(stale, path)
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        raise _Stop
+
+    def refresh_now(*args):
+        raise RuntimeError("upstream down")
+
+    monkeypatch.setattr(refresh, "time", SimpleNamespace(sleep=sleep))
+    monkeypatch.setattr(refresh, "refresh_snapshots", refresh_now)
+    with pytest.raises(_Stop):
+        run_forever(600, path, leagues)
+    # The stale snapshot stays in place and the refresh is retried on the next tick
+    assert sleeps == [600]
+    assert read_snapshot(path) == stale
+
+def test_crowds_share_the_loads_in_flight(monkeypatch):
+    started = []
+
+    def start(*args):
+        started.append(args)
+        return {"forecast": Future()}
+
+    monkeypatch.setattr(refresh, "start_section_loads", start)
+    refresh.clear_shared_loads()
+    try:
+        first = refresh.shared_section_loads(40.0, -105.0, "guesses.jsonl", NOW)
+        assert refresh.shared_section_loads(40.0, -105.0, "guesses.jsonl", NOW) is first
+        assert refresh.shared_section_loads(41.0, -105.0, "guesses.jsonl", NOW) is not first
+
+        # Once a load has finished, the next page view starts a fresh one
+        first[1]["forecast"].set_result({})
+        assert refresh.shared_section_loads(40.0, -105.0, "guesses.jsonl", NOW) is not first
+        assert len(started) == 3
+    finally:
+        refresh.clear_shared_loads()
+
+def test_dependent_sections_wait_for_every_load():
+    loads = [Future(), Future()]
+    merged = refresh._after(loads, lambda data: sorted(data))
+    loads[0].set_result({"forecast": []})
+    assert not merged.done()
+    loads[1].set_result({"first_snow": {}})
+    assert merged.result(timeout=2) == ["first_snow", "forecast"]
+
+    loads = [Future(), Future()]
+    failed = refresh._after(loads, lambda data: data)
+    loads[0].set_exception(RuntimeError("upstream down"))
+    loads[1].set_result({})
+    with pytest.raises(RuntimeError, match="upstream down"):
+        failed.result(timeout=2)
+
+def test_section_loads_add_up_to_a_snapshot(replay, fresh_loaders, tmp_path):
+    replay.now = NOW
+    league = _leagues(tmp_path, replay.fixture)[0]
+    sections = refresh.start_section_loads(league["latitude"], league["longitude"], league["guesses"], NOW)
+    data = {}
+    for name, future in sections.items():
+        keys = future.result(timeout=30)
+        assert name in keys or name == "forecast"
+        data.update(keys)
+
+    batched = build_league_snapshots([league], NOW)[league["id"]]
+    assert {key: batched[key] for key in data} == json.loads(json.dumps(data))
+
+def _cold_requests(replay, fresh_loaders, monkeypatch, tmp_path, leagues):
+    """Upstream requests for one refresh of `leagues`, starting with nothing cached or stored."""
+    from utils import client, store, timezones
+
+    for loader in vars(fresh_loaders).values():
+        if hasattr(loader, "cache_clear"):
+            loader.cache_clear()
+    monkeypatch.setattr(store, "_default_store", store.ArchiveStore(str(tmp_path / f"archive-{len(leagues)}.sqlite")))
+    client.clear_grid_cells()
+    timezones.clear_timezones()
+    replay.reset_stats()
+    build_league_snapshots(leagues, NOW)
+    return sum(replay.stats["requests"].values()), replay.stats["locations"]
+
+def test_many_leagues_cost_about_as_many_requests_as_one(replay, fresh_loaders, monkeypatch, tmp_path):
+    replay.now = NOW
+    one, one_locations = _cold_requests(replay, fresh_loaders, monkeypatch, tmp_path,
+                                        _leagues(tmp_path, replay.fixture))
+    many, many_locations = _cold_requests(replay, fresh_loaders, monkeypatch, tmp_path,
+                                          _leagues(tmp_path, replay.fixture, count=4))
+
+    # Every location rides along in the same requests; sections racing over the archive store
+    # can still cost one extra request
+    assert many_locations >= 3 * one_locations
+    assert many <= one + 1
+
+def test_leagues_at_one_location_share_the_weather_but_not_the_scoring(replay, fresh_loaders, tmp_path):
+    replay.now = NOW
+    leagues = _leagues(tmp_path, replay.fixture, count=2)
+    leagues[1]["latitude"] = leagues[0]["latitude"]
+    (tmp_path / "league-1.json").write_text(json.dumps({"Cat": "2024-12-20 06:00"}))
+    snapshots = build_league_snapshots(leagues, NOW)
+    first, second = snapshots["league-0"], snapshots["league-1"]
+
+    for key in ("location", "forecast", "recent_snowfall", "test_snowfall", "historical", "predicted_first_snowfall"):
+        assert first[key] == second[key], key
+    assert first["first_snow"]["first_snow_date"] == second["first_snow"]["first_snow_date"]
+    assert (first["first_snow"]["winners"], second["first_snow"]["winners"]) == (["Ann"], ["Cat"])
+    assert [row["name"] for row in second["win_probabilities"]] == ["Cat"]
+    assert second["league"]["id"] == "league-1"
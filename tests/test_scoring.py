@@ -0,0 +1,82 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils.scoring import GuessIndex
+
+GUESSES = {
+    "Ann": "2025-10-20 06:00",
+    "Bob": "2025-10-20 18:00",
+    "Cat": "2025-10-21 06:00",
+    "Dan": "2025-10-20 06:00",
+    "Eve": "2025-10-22 12:00",
+}
+
+def _brute_force(guesses, target, use_full_datetime=True):
+    """The closest guessers by a plain scan, in guess order (ties by submission order)."""
+    def distance(guess):
+        guess = datetime.strptime(guess, '%Y-%m-%d %H:%M')
+        if use_full_datetime:
+            return abs((guess - target).total_seconds())
+        return abs((guess.date() - target.date()).days)
+
+    best = min(distance(guess) for guess in guesses.values())
+    tied = [(datetime.strptime(guess, '%Y-%m-%d %H:%M'), i, name)
+            for i, (name, guess) in enumerate(guesses.items()) if distance(guess) == best]
+    return [name for _, _, name in sorted(tied)]
+
+def test_same_guess_ties_keep_submission_order():
+    index = GuessIndex(GUESSES)
+    assert index.closest(datetime(2025, 10, 20, 5)) == ["Ann", "Dan"]
+    assert index.winners_at(datetime(2025, 10, 20, 6)) == ["Ann", "Dan"]
+
+def test_ties_either_side_of_the_target():
+    index = GuessIndex(GUESSES)
+    # Bob is 6 hours early, Cat 6 hours late
+    assert index.closest(datetime(2025, 10, 21, 0)) == ["Bob", "Cat"]
+    # By whole days Ann, Dan and Bob all guessed the 20th
+    assert index.closest(datetime(2025, 10, 20, 23), use_full_datetime=False) == ["Ann", "Dan", "Bob"]
+    assert index.closest(datetime(2025, 10, 21, 12), use_full_datetime=False) == ["Cat"]
+
+def test_closest_outside_the_guess_range():
+    index = GuessIndex(GUESSES)
+    assert index.closest(datetime(2025, 9, 1)) == ["Ann", "Dan"]
+    assert index.closest(datetime(2025, 12, 1)) == ["Eve"]
+    assert GuessIndex({}).closest(datetime(2025, 10, 20)) == []
+
+@pytest.mark.parametrize("use_full_datetime", [True, False])
+def test_closest_matches_a_brute_force_scan(use_full_datetime):
+    rng = random.Random(7)
+    start = datetime(2025, 10, 1)
+    guesses = {
+        f"player-{i}": (start + timedelta(hours=6 * rng.randrange(40))).strftime('%Y-%m-%d %H:%M')
+        for i in range(60)
+    }
+    index = GuessIndex(guesses)
+    for _ in range(200):
+        target = start + timedelta(hours=rng.randrange(-48, 300))
+        assert index.closest(target, use_full_datetime) == _brute_force(guesses, target, use_full_datetime)
+
+def test_leaderboard_shares_ranks_between_ties():
+    board = GuessIndex(GUESSES).leaderboard(datetime(2025, 10, 21, 0))
+    assert [(row["rank"], row["name"]) for row in board] == [
+        (1, "Bob"), (1, "Cat"), (3, "Ann"), (3, "Dan"), (5, "Eve")
+    ]
+    assert board[0]["distance"] == 6 * 60 * 60
+
+def test_leaderboard_top_keeps_everyone_tied_at_the_cut():
+    board = GuessIndex(GUESSES).leaderboard(datetime(2025, 10, 21, 0), top=3)
+    assert [row["name"] for row in board] == ["Bob", "Cat", "Ann", "Dan"]
+
+def test_with_changes_matches_a_fresh_index():
+    index = GuessIndex(GUESSES).with_changes({"Fay": "2025-10-20 06:00", "Bob": "2025-10-21 06:00"}, ["Dan"])
+    expected = {"Ann": "2025-10-20 06:00", "Cat": "2025-10-21 06:00", "Eve": "2025-10-22 12:00",
+                "Fay": "2025-10-20 06:00", "Bob": "2025-10-21 06:00"}
+    fresh = GuessIndex(expected)
+
+    # Changed and new guesses rank after existing equal guesses, as if submitted last
+    assert index.names.tolist() == fresh.names.tolist() == ["Ann", "Fay", "Cat", "Bob", "Eve"]
+    assert index.seconds.tolist() == fresh.seconds.tolist()
+    assert index.closest(datetime(2025, 10, 21, 6)) == ["Cat", "Bob"]
+    assert "Dan" not in index and "Fay" in index
@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from utils.store import ArchiveStore, missing_runs
+from utils.weather import fetch_archive_days
+
+LOCATION = (41.161083, -112.01631)
+TODAY = datetime(2024, 1, 20)
+
+def test_only_days_past_the_mutability_horizon_are_kept(tmp_path):
+    store = ArchiveStore(str(tmp_path / "archive.sqlite"), mutable_days=7)
+    days = {(TODAY - timedelta(days=offset)).strftime('%Y-%m-%d'): [float(offset)] * 24 for offset in range(10)}
+    store.put_days(*LOCATION, "hourly:snowfall", "GMT", days, today=TODAY)
+
+    cached = store.get_days(*LOCATION, "hourly:snowfall", "GMT", "2024-01-01", "2024-01-31")
+    assert sorted(cached) == ["2024-01-11", "2024-01-12"]
+    assert cached["2024-01-11"] == [9.0] * 24
+    # Nearby coordinates and other series are separate entries
+    assert store.get_days(41.16109, -112.01631, "hourly:snowfall", "GMT", "2024-01-01", "2024-01-31") == {}
+    assert store.get_days(*LOCATION, "hourly:snowfall", "auto", "2024-01-01", "2024-01-31") == {}
+
+def test_least_recently_read_rows_are_evicted(tmp_path):
+    store = ArchiveStore(str(tmp_path / "archive.sqlite"), mutable_days=0, max_rows=10)
+    for day in range(1, 11):
+        store.put_days(*LOCATION, "hourly:snowfall", "GMT", {f"2023-01-{day:02d}": [0.0]}, today=TODAY)
+    # Reading the first day makes it the most recently used one
+    store.get_days(*LOCATION, "hourly:snowfall", "GMT", "2023-01-01", "2023-01-01")
+    store.put_days(*LOCATION, "hourly:snowfall", "GMT", {"2023-01-11": [0.0]}, today=TODAY)
+
+    cached = store.get_days(*LOCATION, "hourly:snowfall", "GMT", "2023-01-01", "2023-01-31")
+    assert len(cached) == 9
+    assert "2023-01-01" in cached and "2023-01-11" in cached
+    assert "2023-01-02" not in cached and "2023-01-03" not in cached
+
+def test_complete_years_round_trip(tmp_path):
+    store = ArchiveStore(str(tmp_path / "archive.sqlite"))
+    days = np.arange(np.datetime64('2019-07-01'), np.datetime64('2021-03-01'))
+    values = np.arange(len(days), dtype=float)
+    store.put_years(*LOCATION, "daily:snowfall_sum", "auto", days, values, today=TODAY)
+
+    # Only 2020 is a whole year inside the range
+    years = store.get_years(*LOCATION, "daily:snowfall_sum", "auto", 2000, 2030)
+    assert list(years) == [2020]
+    start = int((np.datetime64('2020-01-01') - days[0]).astype(int))
+    np.testing.assert_array_equal(years[2020], values[start:start + 366])
+
+def test_missing_runs():
+    days = [f"2024-01-{day:02d}" for day in range(1, 8)]
+    assert missing_runs(days, set()) == [("2024-01-01", "2024-01-07")]
+    assert missing_runs(days, {"2024-01-03", "2024-01-04", "2024-01-07"}) == [
+        ("2024-01-01", "2024-01-02"), ("2024-01-05", "2024-01-06")
+    ]
+    assert missing_runs(days, set(days)) == []
+
+def test_fetches_only_the_days_not_stored(replay):
+    fetch_archive_days(*LOCATION, datetime(2023, 1, 1), datetime(2023, 1, 31))
+    replay.reset_stats()
+
+    days = fetch_archive_days(*LOCATION, datetime(2023, 1, 10), datetime(2023, 2, 10))
+    assert list(days) == [f"2023-01-{day:02d}" for day in range(10, 32)] + [f"2023-02-{day:02d}" for day in range(1, 11)]
+    # February is requested on its own, January comes from the store
+    assert replay.stats["requests"]["archive"] == 1
+    assert replay.stats["locations"] == 1
+    times, values = replay.fixture.hourly(np.datetime64('2023-02-01'), np.datetime64('2023-02-10'), utc=True)
+    np.testing.assert_allclose(days["2023-02-05"], np.round(values[(times >= np.datetime64('2023-02-05')) &
+                                                                   (times < np.datetime64('2023-02-06'))], 2))
@@ -0,0 +1,95 @@
+import json
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from utils import visualization
+from utils.ledger import get_guess_ledger
+from utils.visualization import plot_snowfall_timeline
+
+NOW = datetime(2024, 9, 1, 12)
+
+def _write(path, guesses):
+    path.write_text(json.dumps(guesses))
+    return str(path)
+
+def test_timeline_without_guesses(tmp_path):
+    visualization.clear_caches()
+    empty_ledger = str(tmp_path / "empty.jsonl")
+    empty_file = _write(tmp_path / "empty.json", {})
+
+    for guesses_file in (empty_ledger, empty_file):
+        fig = plot_snowfall_timeline(guesses_file=guesses_file)
+        assert [trace.name for trace in fig.data] == []
+
+        fig = plot_snowfall_timeline(datetime(2024, 10, 2, 5), ["Ann"], "2024-10-05", guesses_file)
+        assert [trace.name for trace in fig.data] == ["First Snowfall", "Winner"]
+        assert len(fig.data[1].x) == 0
+
+def test_timeline_groups_players_who_guessed_the_same_time(tmp_path):
+    visualization.clear_caches()
+    guesses_file = _write(tmp_path / "guesses.json", {
+        "Ann Lee": "2024-10-20 06:00",
+        "Bob": "2024-10-21 18:00",
+        "Dan Ray": "2024-10-20 06:00",
+    })
+    fig = plot_snowfall_timeline(guesses_file=guesses_file)
+
+    (guesses,) = fig.data
+    assert len(guesses.x) == 2
+    assert list(guesses.text) == ["AL, DR", "B"]
+    assert guesses.hovertext[0].startswith("Ann Lee, Dan Ray<br>10/20 06:00")
+
+def test_large_timeline_switches_to_webgl_with_a_density_strip(tmp_path):
+    visualization.clear_caches()
+    start = datetime(2024, 10, 1)
+    guesses = {f"Player {i}": (start + timedelta(hours=i)).strftime('%Y-%m-%d %H:%M')
+               for i in range(visualization.TIMELINE_WEBGL_THRESHOLD + 50)}
+    # A few popular times, so the labels have something to pick
+    for i in range(30):
+        guesses[f"Fan {i}"] = (start + timedelta(hours=100 + i % 3)).strftime('%Y-%m-%d %H:%M')
+    guesses_file = _write(tmp_path / "guesses.json", guesses)
+    fig = plot_snowfall_timeline(guesses_file=guesses_file)
+
+    points, labels, per_day = fig.data
+    assert (points.type, labels.type, per_day.type) == ("scattergl", "scatter", "bar")
+    assert len(points.x) == visualization.TIMELINE_WEBGL_THRESHOLD + 50
+    assert len(labels.x) == visualization.TIMELINE_LABEL_COUNT
+    assert sorted(labels.text, key=int)[-3:] == ["11", "11", "11"]
+    assert sum(per_day.y) == len(guesses)
+
+def test_timeline_is_rebuilt_when_the_guesses_change(tmp_path):
+    visualization.clear_caches()
+    path = str(tmp_path / "guesses.jsonl")
+    ledger = get_guess_ledger(path)
+    ledger.submit("Ann", "2024-10-20 06:00", now=NOW)
+
+    first = plot_snowfall_timeline(guesses_file=path)
+    assert json.loads(plot_snowfall_timeline(guesses_file=path).to_json()) == json.loads(first.to_json())
+
+    ledger.submit("Bob", "2024-10-22 06:00", now=NOW)
+    assert list(plot_snowfall_timeline(guesses_file=path).data[0].text) == ["A", "B"]
+
+def _history(first_snows):
+    dates = pd.to_datetime(first_snows)
+    return pd.DataFrame({"year": dates.year - (dates.month < 7), "first_snowfall_date": dates})
+
+def test_historical_chart_is_rendered_once_per_history(monkeypatch):
+    visualization.clear_caches()
+    built = []
+    plot = visualization.plot_historical_snowfall
+    monkeypatch.setattr(visualization, "plot_historical_snowfall", lambda df: built.append(df) or plot(df))
+    history = _history(["2019-10-10", "2020-11-02", "2021-10-10"])
+
+    image = visualization.render_historical_chart(history)
+    assert image.startswith(b"\x89PNG")
+    assert visualization.render_historical_chart(history.copy()) is image
+    assert len(built) == 1
+
+    assert visualization.render_historical_chart(history, "svg").lstrip().startswith(b"<?xml")
+    assert visualization.render_historical_chart(_history(["2019-10-11"])) != image
+    assert len(built) == 3
+
+    visualization.clear_caches()
+    assert visualization.render_historical_chart(history) == image
+    assert len(built) == 4
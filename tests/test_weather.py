@@ -0,0 +1,59 @@
+from datetime import datetime
+
+import numpy as np
+
+from utils.store import get_archive_store
+from utils.weather import (fetch_archive_days, fetch_daily_archive_arrays, fetch_daily_archive_arrays_many,
+                           fetch_snowfall_range_openmeteo, get_historical_snowfall)
+
+LOCATION = (41.161083, -112.01631)
+
+def test_daily_arrays_match_the_archive(replay):
+    days, values = fetch_daily_archive_arrays(*LOCATION, datetime(2000, 7, 1), datetime(2003, 6, 30), "snowfall_sum")
+
+    expected_days, expected = replay.fixture.daily(np.datetime64('2000-07-01'), np.datetime64('2003-06-30'))
+    np.testing.assert_array_equal(days, expected_days)
+    np.testing.assert_allclose(values, np.round(expected, 2))
+
+def test_daily_totals_sum_each_days_hours(replay):
+    start, end = datetime(2023, 10, 1), datetime(2023, 12, 31)
+    totals = fetch_snowfall_range_openmeteo(*LOCATION, start, end)
+
+    hourly = fetch_archive_days(*LOCATION, start, end)
+    assert list(totals) == list(hourly)
+    for day, values in hourly.items():
+        assert totals[day] == round(sum(value for value in values if value is not None) / 25.4, 2)
+    assert any(total > 0 for total in totals.values())
+
+def test_complete_years_are_served_from_the_store(replay):
+    fetch_daily_archive_arrays(*LOCATION, datetime(2000, 7, 1), datetime(2003, 6, 30), "snowfall_sum")
+    # Whole years are requested and stored, so a range inside them needs no request
+    assert sorted(get_archive_store().get_years(*LOCATION, "daily:snowfall_sum", "auto", 1990, 2010)) == [2000, 2001, 2002, 2003]
+
+    replay.reset_stats()
+    days, values = fetch_daily_archive_arrays(*LOCATION, datetime(2001, 3, 1), datetime(2002, 2, 28), "snowfall_sum")
+    assert replay.stats["requests"]["archive"] == 0
+    assert days[0] == np.datetime64('2001-03-01') and days[-1] == np.datetime64('2002-02-28')
+    assert len(values) == len(days) == 365
+
+def test_missing_years_are_fetched_around_stored_ones(replay):
+    fetch_daily_archive_arrays(*LOCATION, datetime(2001, 1, 1), datetime(2001, 12, 31), "snowfall_sum")
+    replay.reset_stats()
+
+    coordinates = [LOCATION, (45.0, -100.0)]
+    arrays = fetch_daily_archive_arrays_many(coordinates, datetime(2000, 7, 1), datetime(2002, 6, 30), "snowfall_sum")
+    expected_days, expected = replay.fixture.daily(np.datetime64('2000-07-01'), np.datetime64('2002-06-30'))
+    for days, values in arrays:
+        np.testing.assert_array_equal(days, expected_days)
+        np.testing.assert_allclose(values, np.round(expected, 2))
+    # The stored location needs 2000 and 2002, the other one 2000 to 2002
+    assert replay.stats["requests"]["archive"] == 3
+
+def test_historical_first_snow_per_season(replay):
+    history = get_historical_snowfall(*LOCATION, 2000, 2002)
+
+    days, values = replay.fixture.daily(np.datetime64('2000-07-01'), np.datetime64('2003-06-30'))
+    for season, first_snow in zip(history["year"], history["first_snowfall_date"]):
+        in_season = (days >= np.datetime64(f'{season}-07-01')) & (days <= np.datetime64(f'{season + 1}-06-30'))
+        assert np.datetime64(first_snow, 'D') == days[in_season & (np.round(values, 2) > 0)][0]
+    assert history["year"].tolist() == [2000, 2001, 2002]
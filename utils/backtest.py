@@ -0,0 +1,229 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import numpy as np
+
+from utils import metrics
+from utils.client import get_json_many
+from utils.climatology import SEASON_START_MONTH, first_snow_by_season
+from utils.detection import DEFAULT_THRESHOLD
+from utils.weather import ARCHIVE_CHUNK_DAYS, ARCHIVE_MAX_CONCURRENCY, fetch_daily_archive_arrays_many
+
+# Forecast leads the Previous Runs API keeps: the latest run (lead 0) and up to 7 days earlier
+MAX_LEAD_DAYS = 7
+
+# Default rule thresholds swept by the backtest, in cm of daily snowfall
+DEFAULT_THRESHOLDS = np.round(np.arange(0.0, 5.01, 0.1), 2)
+
+# Observed daily snowfall (cm) that counts as the first snow: the same amount live detection
+# needs (utils.detection), so trace days don't end a season early
+DEFAULT_OBSERVED_THRESHOLD = DEFAULT_THRESHOLD
+
+class ForecastHistory:
+    """
+    Archived daily snowfall forecasts of one location next to what was observed.
+
+    forecast[k, i] is the snowfall forecast for days[i] issued k days before it, so row 0 holds
+    same-day forecasts; observed[i] is the archive's snowfall for days[i]. Missing values are NaN.
+
+    Parameters:
+        latitude, longitude (float): Location.
+        days (array-like): Consecutive datetime64[D] days.
+        forecast (array-like): (leads, days) array, leads being 0, 1, ... days ahead.
+        observed (array-like): Observed snowfall per day.
+    """
+
+    def __init__(self, latitude, longitude, days, forecast, observed):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.days = np.asarray(days, dtype='datetime64[D]')
+        self.forecast = np.asarray(forecast, dtype=np.float32)
+        self.observed = np.asarray(observed, dtype=np.float32)
+        if self.forecast.shape[1:] != self.days.shape or self.observed.shape != self.days.shape:
+            raise ValueError("forecast and observed must have one column per day")
+        if len(self.days) > 1 and np.any(np.diff(self.days) != np.timedelta64(1, 'D')):
+            raise ValueError("days must be consecutive")
+
+    @property
+    def max_lead(self):
+        return self.forecast.shape[0] - 1
+
+    def save(self, path):
+        """Writes the history to a compressed .npz file (the local store of recorded forecasts)."""
+        np.savez_compressed(path, latitude=self.latitude, longitude=self.longitude,
+                            days=self.days.astype(np.int64), forecast=self.forecast, observed=self.observed)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(float(data["latitude"]), float(data["longitude"]), data["days"].astype('datetime64[D]'),
+                       data["forecast"], data["observed"])
+
+@metrics.timed("fetch")
+def fetch_forecast_histories(coordinates, start_date, end_date, max_lead=MAX_LEAD_DAYS):
+    """
+    Records ForecastHistory objects from Open-Meteo: past runs of the hourly snowfall forecast
+    from the Previous Runs API (summed per local day) and the observed daily snowfall from the
+    archive (or the backfilled hourly archive).
+
+    Every request covers all locations at once and at most ARCHIVE_CHUNK_DAYS days.
+
+    Parameters:
+        coordinates (list): (latitude, longitude) tuples.
+        start_date, end_date (datetime): Days to record (inclusive).
+        max_lead (int): Days ahead of the latest run to record (at most MAX_LEAD_DAYS).
+
+    Returns:
+        list: One ForecastHistory per coordinate.
+    """
+    variables = ["snowfall"] + [f"snowfall_previous_day{lead}" for lead in range(1, max_lead + 1)]
+    chunks = []
+    chunk_start = start_date
+    while chunk_start <= end_date:
+        chunk_end = min(chunk_start + timedelta(days=ARCHIVE_CHUNK_DAYS - 1), end_date)
+        chunks.append((chunk_start, chunk_end))
+        chunk_start = chunk_end + timedelta(days=1)
+
+    def request_chunk(chunk):
+        responses = get_json_many("previous_runs", coordinates, {
+            "start_date": chunk[0].strftime('%Y-%m-%d'),
+            "end_date": chunk[1].strftime('%Y-%m-%d'),
+            "hourly": ",".join(variables),
+            "timezone": "auto"
+        })
+        return [_daily_sums(response.get("hourly", {}), variables) for response in responses]
+
+    with ThreadPoolExecutor(max_workers=min(ARCHIVE_MAX_CONCURRENCY, len(chunks))) as executor:
+        chunk_results = list(executor.map(request_chunk, chunks))
+
+    days = np.arange(np.datetime64(start_date.strftime('%Y-%m-%d'), 'D'),
+                     np.datetime64(end_date.strftime('%Y-%m-%d'), 'D') + 1)
+    observed = fetch_daily_archive_arrays_many(coordinates, start_date, end_date, "snowfall_sum")
+
+    histories = []
+    for i, (latitude, longitude) in enumerate(coordinates):
+        forecast = np.full((max_lead + 1, len(days)), np.nan, dtype=np.float32)
+        for chunk in chunk_results:
+            chunk_days, sums = chunk[i]
+            forecast[:, (chunk_days - days[0]).astype(int)] = sums
+        observed_days, observed_values = observed[i]
+        location_observed = np.full(len(days), np.nan, dtype=np.float32)
+        location_observed[(observed_days - days[0]).astype(int)] = observed_values
+        histories.append(ForecastHistory(latitude, longitude, days, forecast, location_observed))
+    return histories
+
+def _daily_sums(hourly, variables):
+    """Sums hourly values per local day; a day with a missing hour is NaN."""
+    times = np.array(hourly.get("time", []), dtype='datetime64[m]')
+    if not times.size:
+        return np.array([], dtype='datetime64[D]'), np.zeros((len(variables), 0), dtype=np.float32)
+    day_of_hour = times.astype('datetime64[D]')
+    days, starts = np.unique(day_of_hour, return_index=True)
+    values = np.array([hourly.get(variable, [None] * len(times)) for variable in variables], dtype=float)
+    return days, np.add.reduceat(values, starts, axis=1)
+
+def backtest(histories, thresholds=DEFAULT_THRESHOLDS, observed_threshold=DEFAULT_OBSERVED_THRESHOLD):
+    """
+    Scores the "first forecast day above a threshold" rule of predict_first_snowfall_openmeteo
+    against the observed first snow of every season, for every lead time and threshold at once.
+
+    For a season whose first snow fell on day F and a lead L, the rule is run as it would have
+    been on day F - L: with the forecasts issued that day for the next max_lead days, the
+    predicted first snow is the first of those days forecast above the threshold. Seasons are
+    only scored when their start (July 1st) and every needed forecast were recorded, and when
+    no observation is missing before the first snow (it could hide an earlier one).
+
+    All seasons, leads, forecast days and thresholds are evaluated as one broadcast NumPy
+    comparison, so sweeping many thresholds over decades of seasons takes well under a second.
+
+    Parameters:
+        histories (list): ForecastHistory objects, all with the same max_lead.
+        thresholds (array-like): Daily forecast snowfall (cm) the rule has to exceed.
+        observed_threshold (float): Daily observed snowfall (cm) that counts as the first snow.
+
+    Returns:
+        dict: "thresholds" and "leads", "seasons" scored per lead, and (threshold, lead) arrays:
+        "hit_rate" (predicted the right day), "within_one_day", "detection_rate" (predicted any
+        day), "false_alarm_rate" (predicted too early), "mean_error_days" (predicted minus
+        observed, over predictions) and "mean_abs_error_days"; "skipped_seasons" counts the seasons
+        left out for missing observations.
+    """
+    thresholds = np.asarray(thresholds, dtype=np.float32)
+    max_lead = histories[0].max_lead
+    leads = np.arange(max_lead + 1)
+    offsets = np.arange(max_lead + 1)
+
+    # (seasons, leads, offsets) forecasts each issue day saw, gathered from every history
+    samples = []
+    valid = []
+    skipped = 0
+    for history in histories:
+        if history.max_lead != max_lead:
+            raise ValueError("every history needs the same leads")
+        seasons, first_days = first_snow_by_season(history.days, history.observed, observed_threshold)
+        # Seasons that started before the recording began may have had an earlier first snow
+        season_starts = np.array([f"{season}-{SEASON_START_MONTH:02d}-01" for season in seasons], dtype='datetime64[D]')
+        recorded = season_starts >= history.days[0]
+        start_index = (season_starts[recorded] - history.days[0]).astype(int)
+        first_index = (first_days[recorded] - history.days[0]).astype(int)
+        # So may seasons with a missing observation before their first snow
+        missing = np.concatenate([[0], np.cumsum(np.isnan(history.observed))])
+        observed_through = missing[first_index] == missing[start_index]
+        skipped += int((~observed_through).sum())
+        first_index = first_index[observed_through]
+
+        # Issued L days before the first snow, the forecast for k days ahead has lead k
+        targets = first_index[:, None, None] - leads[None, :, None] + offsets[None, None, :]
+        in_range = (targets >= 0) & (targets < len(history.days))
+        gathered = history.forecast[offsets[None, None, :], np.clip(targets, 0, len(history.days) - 1)]
+        gathered = np.where(in_range, gathered, np.nan)
+        samples.append(gathered)
+        valid.append(~np.isnan(gathered).any(axis=2))
+
+    forecasts = np.concatenate(samples)
+    valid = np.concatenate(valid)
+    # (thresholds, seasons, leads, offsets): NaN never exceeds a threshold
+    above = forecasts[None] > thresholds[:, None, None, None]
+    predicted = above.any(axis=3)
+    error = np.where(predicted, above.argmax(axis=3) - leads[None, None, :], 0)
+
+    counts = valid.sum(axis=0)
+    scored = valid[None] & predicted
+
+    def rate(mask):
+        return np.divide((mask & valid[None]).sum(axis=1), counts, out=np.full(mask.shape[::2], np.nan),
+                         where=counts > 0)
+
+    predictions = scored.sum(axis=1)
+
+    def mean_over_predictions(values):
+        return np.divide(np.where(scored, values, 0).sum(axis=1), predictions,
+                         out=np.full(predictions.shape, np.nan), where=predictions > 0)
+
+    return {
+        "thresholds": thresholds,
+        "leads": leads,
+        "seasons": counts,
+        "hit_rate": rate(predicted & (error == 0)),
+        "within_one_day": rate(predicted & (np.abs(error) <= 1)),
+        "detection_rate": rate(predicted),
+        "false_alarm_rate": rate(predicted & (error < 0)),
+        "mean_error_days": mean_over_predictions(error),
+        "mean_abs_error_days": mean_over_predictions(np.abs(error)),
+        "skipped_seasons": np.int64(skipped)
+    }
+
+def best_thresholds(results, metric="hit_rate"):
+    """
+    Picks the threshold maximizing `metric` at every lead (the lowest one on ties).
+
+    Returns:
+        list: One dict per lead with "lead", "threshold", "seasons" and every score at that threshold.
+    """
+    best = np.nan_to_num(results[metric], nan=-np.inf).argmax(axis=0)
+    scores = [key for key, values in results.items() if np.ndim(values) == 2]
+    return [
+        dict({"lead": int(lead), "threshold": float(results["thresholds"][row]), "seasons": int(results["seasons"][column])},
+             **{key: float(results[key][row, column]) for key in scores})
+        for column, (lead, row) in enumerate(zip(results["leads"], best))
+    ]
@@ -0,0 +1,282 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils import metrics
+
+# Open-Meteo endpoints with their (connect, read) timeouts in seconds. The URLs can be pointed
+# elsewhere (e.g. a local replay server) through the environment.
+ENDPOINTS = {
+    "archive": {
+        "url": os.environ.get("OPENMETEO_ARCHIVE_URL", "https://archive-api.open-meteo.com/v1/archive"),
+        "timeout": (3.05, 30)
+    },
+    "forecast": {
+        "url": os.environ.get("OPENMETEO_FORECAST_URL", "https://api.open-meteo.com/v1/forecast"),
+        "timeout": (3.05, 10)
+    },
+    # Earlier runs of the forecast, for backtesting
+    "previous_runs": {
+        "url": os.environ.get("OPENMETEO_PREVIOUS_RUNS_URL", "https://previous-runs-api.open-meteo.com/v1/forecast"),
+        "timeout": (3.05, 30)
+    }
+}
+
+# Retry policy: attempts per request and the exponential backoff bounds in seconds
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+
+# Client-side rate limit shared by every request from this process
+RATE_LIMIT_PER_SECOND = float(os.environ.get("OPENMETEO_RATE_LIMIT", "8"))
+RATE_LIMIT_BURST = 16
+
+# Process-wide cap on upstream requests in flight at once, however many loads, chunks and
+# backfill workers are issuing them
+MAX_CONCURRENT_REQUESTS = int(os.environ.get("OPENMETEO_MAX_CONCURRENCY", "4"))
+
+POOL_SIZE = 16
+
+# Most coordinates sent in one multi-location request (keeps the URL well under server limits)
+MAX_COORDINATES_PER_REQUEST = 100
+
+class OpenMeteoError(Exception):
+    """Raised when Open-Meteo data could not be retrieved."""
+
+class OpenMeteoTimeout(OpenMeteoError):
+    """Raised when Open-Meteo kept timing out or refusing connections."""
+
+class OpenMeteoRateLimited(OpenMeteoError):
+    """Raised when Open-Meteo kept answering 429 Too Many Requests."""
+
+class OpenMeteoHTTPError(OpenMeteoError):
+    """Raised for an error response from Open-Meteo, keeping the status code and reason."""
+
+    def __init__(self, status_code, reason):
+        super().__init__(f"Open-Meteo returned {status_code}: {reason}")
+        self.status_code = status_code
+        self.reason = reason
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, holding at most `capacity`.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available and takes it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+_session = None
+_session_lock = threading.Lock()
+_bucket = TokenBucket(RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST)
+_request_slots = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+
+# (endpoint, query) -> Future of the identical request currently in flight
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+# (endpoint, latitude, longitude) -> the model grid cell Open-Meteo answered that coordinate with
+_grid_cells = {}
+_grid_cells_lock = threading.Lock()
+
+def get_session():
+    """Returns the process-wide pooled requests session used for every Open-Meteo call."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=len(ENDPOINTS), pool_maxsize=POOL_SIZE)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+def get_json(endpoint, params):
+    """
+    Performs a GET against an Open-Meteo endpoint and returns the decoded JSON body.
+
+    Identical requests (same endpoint and parameters) made while one is already in flight, from
+    any thread or session in the process, wait for that request and share its outcome instead
+    of going upstream again.
+
+    At most MAX_CONCURRENT_REQUESTS requests are on the wire at once across the process; a slot
+    is only held for a single attempt, never while backing off or waiting on another request.
+
+    Timeouts, connection errors, 429 and 5xx responses are retried with jittered exponential
+    backoff (honouring Retry-After when given); other error responses fail straight away.
+
+    Parameters:
+        endpoint (str): Key into ENDPOINTS, e.g. "archive" or "forecast".
+        params (dict): Query parameters.
+
+    Returns:
+        dict: The parsed response. It may be shared with other callers, so it must not be mutated.
+
+    Raises:
+        OpenMeteoTimeout, OpenMeteoRateLimited, OpenMeteoHTTPError: When no usable response came back.
+    """
+    key = (endpoint, tuple(sorted(params.items())))
+    with _in_flight_lock:
+        future = _in_flight.get(key)
+        leader = future is None
+        if leader:
+            future = _in_flight[key] = Future()
+    if not leader:
+        metrics.increment("upstream_coalesced_total", endpoint=endpoint)
+        return future.result()
+
+    try:
+        data = _request_json(endpoint, params)
+    except BaseException as exc:
+        future.set_exception(exc)
+        raise
+    else:
+        future.set_result(data)
+        return data
+    finally:
+        with _in_flight_lock:
+            del _in_flight[key]
+
+def _request_json(endpoint, params):
+    """get_json without the coalescing: one request, with retries."""
+    config = ENDPOINTS[endpoint]
+    session = get_session()
+    error = None
+
+    for attempt in range(MAX_ATTEMPTS):
+        if attempt:
+            metrics.increment("upstream_retries_total", endpoint=endpoint, reason=type(error).__name__)
+            time.sleep(_backoff_delay(attempt, error))
+        _bucket.acquire()
+
+        try:
+            with _request_slots, metrics.span("upstream_request", endpoint=endpoint):
+                response = session.get(config["url"], params=params, timeout=config["timeout"])
+        except (requests.Timeout, requests.ConnectionError) as exc:
+            metrics.increment("upstream_requests_total", endpoint=endpoint, status="error")
+            error = OpenMeteoTimeout(f"Open-Meteo {endpoint} request failed: {exc}")
+            continue
+
+        metrics.increment("upstream_requests_total", endpoint=endpoint, status=str(response.status_code))
+        metrics.increment("upstream_bytes_total", len(response.content), endpoint=endpoint)
+
+        if response.status_code == 200:
+            return response.json()
+        if response.status_code == 429:
+            error = OpenMeteoRateLimited(f"Open-Meteo {endpoint} rate limit exceeded")
+            error.retry_after = _retry_after(response)
+            continue
+        if response.status_code >= 500:
+            error = OpenMeteoHTTPError(response.status_code, _reason(response))
+            continue
+        raise OpenMeteoHTTPError(response.status_code, _reason(response))
+
+    raise error
+
+def get_json_many(endpoint, coordinates, params):
+    """
+    Performs one GET for many locations using Open-Meteo's comma-separated coordinate lists and
+    returns one decoded response per coordinate.
+
+    Every response reports the grid cell it was computed for. Coordinates already known to fall
+    in the same cell are only requested once and share that response, so leagues a few streets
+    apart cost a single location in the request.
+
+    Parameters:
+        endpoint (str): Key into ENDPOINTS, e.g. "archive" or "forecast".
+        coordinates (list): (latitude, longitude) tuples.
+        params (dict): Query parameters other than latitude and longitude.
+
+    Returns:
+        list: The parsed responses, in the order of `coordinates`. Shared responses are the
+        same object, so callers must not mutate them.
+    """
+    with _grid_cells_lock:
+        keys = [_grid_cells.get((endpoint,) + tuple(coordinate), tuple(coordinate)) for coordinate in coordinates]
+    # One representative coordinate per cell (or per coordinate whose cell is still unknown)
+    representatives = {}
+    for key, coordinate in zip(keys, coordinates):
+        representatives.setdefault(key, tuple(coordinate))
+    metrics.increment("upstream_coordinates_total", len(representatives), endpoint=endpoint, result="requested")
+    metrics.increment("upstream_coordinates_total", len(coordinates) - len(representatives), endpoint=endpoint, result="shared")
+
+    responses = {}
+    batch = list(representatives.items())
+    for start in range(0, len(batch), MAX_COORDINATES_PER_REQUEST):
+        chunk = batch[start:start + MAX_COORDINATES_PER_REQUEST]
+        data = get_json(endpoint, dict(
+            params,
+            latitude=",".join(str(coordinate[0]) for _, coordinate in chunk),
+            longitude=",".join(str(coordinate[1]) for _, coordinate in chunk)
+        ))
+        # A single location comes back as an object, several as a list in request order
+        if isinstance(data, dict):
+            data = [data]
+        if len(data) != len(chunk):
+            raise OpenMeteoError(f"Open-Meteo {endpoint} answered {len(data)} locations for {len(chunk)} coordinates")
+
+        with _grid_cells_lock:
+            for (key, coordinate), response in zip(chunk, data):
+                responses[key] = response
+                if "latitude" in response and "longitude" in response:
+                    _grid_cells[(endpoint,) + coordinate] = (response["latitude"], response["longitude"])
+
+    return [responses[key] for key in keys]
+
+def known_grid_cells(endpoint, coordinates):
+    """
+    Returns the model grid cell Open-Meteo answered each coordinate with, as far as this process
+    has seen it.
+
+    Returns:
+        list: (latitude, longitude) of the cell, or None where it isn't known yet, per coordinate.
+    """
+    with _grid_cells_lock:
+        return [_grid_cells.get((endpoint,) + tuple(coordinate)) for coordinate in coordinates]
+
+def clear_grid_cells():
+    """Forgets which grid cell every coordinate falls in."""
+    with _grid_cells_lock:
+        _grid_cells.clear()
+
+def _backoff_delay(attempt, error):
+    """Full-jitter exponential backoff, or the server's Retry-After if it asked for longer."""
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, BACKOFF_MAX))
+    return delay
+
+def _retry_after(response):
+    """Reads a numeric Retry-After header, if present."""
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+def _reason(response):
+    """Extracts Open-Meteo's error reason from a failed response."""
+    try:
+        return response.json().get("reason", response.text)
+    except ValueError:
+        return response.text
@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+
+# Snow seasons run from July 1 through June 30; a season is named after the year it starts in
+SEASON_START_MONTH = 7
+SEASON_LENGTH_DAYS = 366
+
+# Day-of-season of Feb 29 (July through January add up to 215 days, plus 28 of February)
+FEB_29_DAY_OF_SEASON = 243
+
+# Season used to turn day-of-season numbers back into calendar days; it spans Feb 29,
+# so every possible day-of-season maps to a real date
+REFERENCE_SEASON_START = np.datetime64('2023-07-01')
+
+def season_of(dates):
+    """Returns the season (start year) of each date in a datetime64 array."""
+    months = dates.astype('datetime64[M]').astype(int)
+    # Months since July 1970, floored to whole seasons
+    return (months - (SEASON_START_MONTH - 1)) // 12 + 1970
+
+def day_of_season(dates):
+    """
+    Returns the number of days since July 1 of its season for each date in a datetime64 array.
+
+    Numbers follow a 366-day season calendar (Feb 29 is skipped in non-leap seasons), so a
+    calendar day always gets the same number whatever the season.
+    """
+    days = dates.astype('datetime64[D]')
+    seasons = season_of(days)
+    season_starts = ((seasons - 1970) * 12 + (SEASON_START_MONTH - 1)).astype('datetime64[M]')
+    day_numbers = (days - season_starts.astype('datetime64[D]')).astype(int)
+
+    # Shift March onwards by a day in seasons without a Feb 29
+    return day_numbers + (~has_feb_29(seasons) & (day_numbers >= FEB_29_DAY_OF_SEASON))
+
+def has_feb_29(seasons):
+    """Returns whether each season (start year) contains a Feb 29."""
+    spring_year = np.asarray(seasons) + 1
+    return (spring_year % 4 == 0) & ((spring_year % 100 != 0) | (spring_year % 400 == 0))
+
+def day_of_season_to_date(days):
+    """Turns day-of-season numbers back into calendar dates in the reference season."""
+    return REFERENCE_SEASON_START + np.asarray(days).astype('timedelta64[D]')
+
+def season_dates(season, days):
+    """
+    Turns day-of-season numbers into the calendar dates of a given season. In seasons without
+    a Feb 29 that day number has no date and must not be passed in.
+    """
+    days = np.asarray(days)
+    start = np.datetime64(f'{season}-{SEASON_START_MONTH:02d}-01')
+    if not has_feb_29(season):
+        days = days - (days > FEB_29_DAY_OF_SEASON)
+    return start + days.astype('timedelta64[D]')
+
+def first_snow_by_season(days, snowfall, threshold=0.0):
+    """
+    Finds the first day above `threshold` in each season of a daily series.
+
+    Parameters:
+        days (np.ndarray): Ordered datetime64[D] days.
+        snowfall (np.ndarray): Snowfall for each day (NaN where missing).
+        threshold (float): Snowfall that has to be exceeded to count.
+
+    Returns:
+        tuple: (seasons, first_days) arrays, first_days being datetime64[D].
+    """
+    snowy_days = days[snowfall > threshold]
+    seasons, first_index = np.unique(season_of(snowy_days), return_index=True)
+    return seasons, snowy_days[first_index]
+
+class Climatology:
+    """
+    First-snow climatology of one location, held as day-of-season integers.
+
+    Parameters:
+        seasons (array-like): Season start year of each event.
+        first_days (array-like): First snow date of each season (anything numpy can read as dates).
+    """
+
+    def __init__(self, seasons, first_days):
+        first_days = np.asarray(first_days, dtype='datetime64[D]')
+        self.seasons = np.asarray(seasons, dtype=int)
+        self.days = day_of_season(first_days)
+
+    @classmethod
+    def from_dataframe(cls, historical_df):
+        """Builds a climatology from a get_historical_snowfall DataFrame, without modifying it."""
+        return cls(historical_df['year'].to_numpy(), historical_df['first_snowfall_date'].to_numpy())
+
+    def __len__(self):
+        return len(self.days)
+
+    def earliest(self):
+        return int(self.days.min())
+
+    def latest(self):
+        return int(self.days.max())
+
+    def median(self):
+        return int(np.median(self.days))
+
+    def quantiles(self, q):
+        """Returns the day-of-season at each quantile in `q`."""
+        return np.quantile(self.days, q, method='lower').astype(int)
+
+    def histogram(self, bin_days=1):
+        """
+        Counts first snows per bin of `bin_days` days across the season.
+
+        Returns:
+            tuple: (counts, bin_starts) arrays, bin_starts in day-of-season.
+        """
+        counts = np.bincount(self.days // bin_days, minlength=-(-SEASON_LENGTH_DAYS // bin_days))
+        return counts, np.arange(len(counts)) * bin_days
+
+    def summary(self):
+        """Returns the earliest, latest and median first snow formatted as 'Month DD'."""
+        return tuple(format_day_of_season(day) for day in (self.earliest(), self.latest(), self.median()))
+
+def format_day_of_season(day):
+    """Formats a day-of-season as 'Month DD'."""
+    return pd.Timestamp(day_of_season_to_date(day)).strftime('%B %d')
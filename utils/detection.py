@@ -0,0 +1,294 @@
+from datetime import datetime, timedelta
+from itertools import chain
+
+import numpy as np
+
+from utils import metrics
+from utils.client import get_json_many
+from utils.hourly_archive import get_hourly_archive
+from utils.neighborhood import combine_series, distinct_cells, site_cells
+from utils.scoring import load_guess_index
+from utils.timezones import get_timezones, to_local, to_utc
+from utils.weather import ARCHIVE_CHUNK_DAYS, GAME_START_DATE, fetch_archive_days_many
+
+# Hourly snowfall (cm, as reported by Open-Meteo) that has to be exceeded to count as snow. The
+# daily rule it replaces counted a day once round(total / 25.4, 2) was above zero, i.e. a total
+# of about 0.127; an hour has to reach that on its own, so trace hours don't end the game
+DEFAULT_THRESHOLD = 0.125
+
+# The first archive chunk covers this many days; each following chunk doubles in size
+STREAM_FIRST_CHUNK_DAYS = 14
+
+# The forecast endpoint can replay at most this many past days
+FORECAST_MAX_PAST_DAYS = 92
+
+ONE_HOUR = np.timedelta64(60, 'm')
+
+def _archive_chunks(start_date, now, first_chunk_days):
+    """Yields the (start, end) datetimes of the doubling archive chunks between `start_date` and `now`."""
+    chunk_start = datetime(start_date.year, start_date.month, start_date.day)
+    chunk_days = first_chunk_days
+    while chunk_start <= now:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), now)
+        yield chunk_start, chunk_end
+        chunk_start = chunk_end.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        chunk_days = min(chunk_days * 2, ARCHIVE_CHUNK_DAYS)
+
+def _covered_hours(day_values, chunk_start, chunk_end, start, end):
+    """
+    Flattens one GMT archive chunk, keeps the hours between `start` and `end` and cuts them
+    where the archive runs out.
+
+    Returns:
+        tuple: (times, values, frontier) where frontier is the first hour the archive is missing
+        (to be filled from the forecast), or None if the chunk is complete.
+    """
+    times, values = _flatten_days(day_values)
+    in_range = (times >= start) & (times <= end)
+    times, values = times[in_range], values[in_range]
+
+    # The archive lags behind real time: once it runs out, the forecast takes over
+    available = np.flatnonzero(~np.isnan(values))
+    covered = available[-1] + 1 if available.size else 0
+    first_hour = max(np.datetime64(chunk_start, 'm'), start)
+    last_hour = min(end, np.datetime64(chunk_end.date(), 'm') + np.timedelta64(23 * 60, 'm'))
+    frontier = None
+    if first_hour + covered * ONE_HOUR <= last_hour:
+        frontier = first_hour + covered * ONE_HOUR
+    return times[:covered], values[:covered], frontier
+
+def _flatten_days(day_values):
+    """Turns per-day hourly value lists into flat time and value arrays."""
+    if not day_values:
+        return np.array([], dtype='datetime64[m]'), np.array([], dtype=float)
+    days = np.array(list(day_values.keys()), dtype='datetime64[D]')
+    lengths = np.array([len(values) for values in day_values.values()])
+    values = np.array(list(chain.from_iterable(day_values.values())), dtype=float)
+
+    # Entry i of a day is hour i of that (GMT) day
+    offsets = np.arange(len(values)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    times = np.repeat(days.astype('datetime64[m]'), lengths) + offsets * ONE_HOUR
+    return times, values
+
+def _forecast_hours_many(coordinates, starts, ends):
+    """
+    Fetches the GMT hours between each location's start and end from the forecast endpoint's
+    past days, with one multi-coordinate request covering the earliest start.
+    """
+    earliest = min(starts)
+    past_days = int((max(ends).astype('datetime64[D]') - earliest.astype('datetime64[D]')).astype(int)) + 1
+    responses = get_json_many("forecast", coordinates, {
+        "hourly": "snowfall",
+        "timezone": "GMT",
+        "past_days": min(past_days, FORECAST_MAX_PAST_DAYS),
+        "forecast_days": 1
+    })
+
+    hours = []
+    for data, start, end in zip(responses, starts, ends):
+        hourly = data.get("hourly", {})
+        times = np.array(hourly.get("time", []), dtype='datetime64[m]')
+        values = np.array(hourly.get("snowfall", []), dtype=float)
+        in_range = (times >= start) & (times <= end)
+        hours.append((times[in_range], values[in_range]))
+    return hours
+
+@metrics.timed("fetch")
+def detect_first_snow(latitude, longitude, start_date=GAME_START_DATE, threshold=DEFAULT_THRESHOLD, now=None,
+                      neighborhood=None):
+    """
+    Finds the first hour since `start_date` with snowfall above `threshold`.
+
+    Data is streamed in season order and fetching stops as soon as that hour shows up.
+
+    Parameters:
+        start_date (datetime): Start of the snowfall window.
+        threshold (float): Hourly snowfall (cm) that has to be exceeded.
+        now (datetime, optional): End of the window; defaults to the current time.
+        neighborhood (Neighborhood, optional): Grid around the location whose aggregated
+            snowfall is checked instead of the single point.
+
+    Returns:
+        datetime or None: Local timestamp of the first snowy hour, or None if it hasn't snowed.
+    """
+    return detect_first_snow_many([(latitude, longitude)], start_date, threshold, now, [neighborhood])[0]
+
+@metrics.timed("fetch")
+def detect_first_snow_many(coordinates, start_date=GAME_START_DATE, threshold=DEFAULT_THRESHOLD, now=None,
+                           neighborhoods=None):
+    """
+    detect_first_snow for many locations at once.
+
+    Locations with a backfilled hourly archive (utils.hourly_archive) are scanned straight from
+    its memory-mapped file first. Everything after that is streamed from the archive endpoint:
+    every chunk is requested for all locations still searching in one multi-coordinate call,
+    locations drop out as soon as their first snowy hour shows up, and the ones reaching the
+    archive's lag window share one forecast request for the remaining hours.
+
+    A location with a neighborhood adds all its grid cells to those same calls, and its hours
+    are aggregated over the cells before looking for snow. Points the responses show to share a
+    model cell are counted once, and only one of them is fetched after that.
+
+    Both sources are scanned in GMT hours and the snowy hour is converted to local time with
+    the location's time zone, so the result doesn't depend on which source it came from or on
+    daylight saving time.
+
+    Parameters:
+        neighborhoods (list, optional): A Neighborhood or None per coordinate.
+
+    Returns:
+        list: Local timestamp of the first snowy hour (or None) per coordinate.
+    """
+    now = now or datetime.now()
+    neighborhoods = neighborhoods or [None] * len(coordinates)
+    sites = site_cells(coordinates, neighborhoods)
+    # Each location's window in GMT; the hours found are turned back into its local time
+    zones = get_timezones(coordinates)
+    starts = [to_utc(start_date, zone) for zone in zones]
+    ends = [to_utc(now, zone) for zone in zones]
+    first_snows = [None] * len(coordinates)
+    # GMT hour each location's search through the archive endpoint starts from
+    stream_starts = {}
+    archive = get_hourly_archive()
+
+    for i, cells in enumerate(sites):
+        stream_starts[i] = starts[i]
+        hours = _stored_hours(archive, cells, neighborhoods[i], starts[i], ends[i]) if archive else None
+        if hours is None:
+            continue
+        first_hour, values = hours
+        snowy = _first_index_above(values, threshold)
+        if snowy is not None:
+            first_snows[i] = _local_datetime(first_hour + snowy * ONE_HOUR, zones[i])
+            del stream_starts[i]
+        else:
+            # Carry on from the hour the stored ones run out at
+            stream_starts[i] = first_hour + len(values) * ONE_HOUR
+
+    # Locations the archive endpoint ran out for, with the first hour it is missing
+    frontiers = {}
+    groups = {}
+    for i, stream_start in stream_starts.items():
+        groups.setdefault((stream_start, ends[i]), []).append(i)
+    for (stream_start, end), searching in groups.items():
+        for chunk_start, chunk_end in _archive_chunks(_datetime(stream_start), _datetime(end), STREAM_FIRST_CHUNK_DAYS):
+            if not searching:
+                break
+            chunk = iter(fetch_archive_days_many([cell for i in searching for cell in sites[i]], chunk_start, chunk_end))
+            still_searching = []
+            for i in searching:
+                covered = [_covered_hours(next(chunk), chunk_start, chunk_end, stream_start, end) for _ in sites[i]]
+                if neighborhoods[i] is not None:
+                    # The responses tell which points share a model cell; keep one of each
+                    distinct = distinct_cells(sites[i])
+                    sites[i] = [sites[i][k] for k in distinct]
+                    covered = [covered[k] for k in distinct]
+                times, values, frontier = _combine_covered(neighborhoods[i], covered)
+                first_snow = _first_above(times, values, threshold)
+                if first_snow is not None:
+                    first_snows[i] = _local_datetime(first_snow, zones[i])
+                    continue
+                if frontier is not None:
+                    frontiers[i] = frontier
+                else:
+                    still_searching.append(i)
+            searching = still_searching
+
+    tail = [i for i, frontier in frontiers.items() if frontier <= ends[i]]
+    if tail:
+        hours = iter(_forecast_hours_many([cell for i in tail for cell in sites[i]],
+                                          [frontiers[i] for i in tail for _ in sites[i]],
+                                          [ends[i] for i in tail for _ in sites[i]]))
+        for i in tail:
+            times, values = _align([next(hours) for _ in sites[i]])
+            first_snow = _first_above(times, combine_series(neighborhoods[i], values), threshold)
+            if first_snow is not None:
+                first_snows[i] = _local_datetime(first_snow, zones[i])
+    return first_snows
+
+def _stored_hours(archive, cells, neighborhood, start, end):
+    """
+    Reads a location's hours between GMT times `start` and `end` (aggregated over its cells)
+    from the hourly archive, if every cell is stored from the beginning of the window.
+
+    Returns:
+        tuple or None: (GMT time of the first hour, values)
+    """
+    stored = [archive.read(*cell, start, end) for cell in cells]
+    if any(hours is None or hours[0] > start for hours in stored):
+        return None
+    first_hour = stored[0][0]
+    if any(hours[0] != first_hour for hours in stored):
+        return None
+    length = min(len(values) for _, values in stored)
+    return first_hour, combine_series(neighborhood, [values[:length] for _, values in stored])
+
+def _combine_covered(neighborhood, covered):
+    """
+    Aggregates the _covered_hours of a location's cells: the hours every cell covers, and the
+    earliest hour any of them is missing as the frontier.
+    """
+    if neighborhood is None:
+        return covered[0]
+    times, values = _align([(times, values) for times, values, _ in covered])
+    frontiers = [frontier for _, _, frontier in covered if frontier is not None]
+    return times, neighborhood.combine(np.stack(values)), min(frontiers) if frontiers else None
+
+def _align(hours):
+    """Cuts the cells' (times, values) to the hours all of them have, which start together."""
+    length = min(len(times) for times, _ in hours)
+    return hours[0][0][:length], [values[:length] for _, values in hours]
+
+def _first_index_above(values, threshold):
+    """Returns the index of the first value above `threshold` (NaN never is), or None."""
+    if not len(values):
+        return None
+    above = values > threshold
+    index = int(above.argmax())
+    return index if above[index] else None
+
+def _first_above(times, values, threshold):
+    """Returns the first time whose value exceeds `threshold`, or None."""
+    index = _first_index_above(values, threshold)
+    if index is not None:
+        return times[index]
+    return None
+
+def _local_datetime(time, zone):
+    """Turns a GMT datetime64 into a naive local datetime in `zone`."""
+    return _datetime(to_local(time, zone))
+
+def _datetime(time):
+    return time.astype('datetime64[s]').item()
+
+def check_for_first_snow(latitude, longitude, guesses_file='config/guesses.jsonl', threshold=DEFAULT_THRESHOLD, now=None,
+                         neighborhood=None):
+    """
+    Detects the first snowy hour (over the neighborhood, if given) and determines the closest
+    guess to the exact timestamp.
+
+    Returns:
+        dict: Same keys as utils.weather.check_for_recent_snowfall, with "first_snow_date" a
+        datetime precise to the hour.
+    """
+    first_snow = detect_first_snow(latitude, longitude, threshold=threshold, now=now, neighborhood=neighborhood)
+    return first_snow_result(first_snow, guesses_file)
+
+def first_snow_result(first_snow, guesses_file='config/guesses.jsonl'):
+    """Scores a detected first snowy hour (or None) against a league's guesses."""
+    if first_snow is None:
+        return {
+            "snowfall_occurred": False,
+            "first_snow_date": None,
+            "winner": None,
+            "winners": []
+        }
+
+    # Guesses are stored to the hour, so compare full datetimes
+    winners = load_guess_index(guesses_file).winners_at(first_snow)
+    return {
+        "snowfall_occurred": True,
+        "first_snow_date": first_snow,
+        "winner": " & ".join(winners),
+        "winners": winners
+    }
@@ -0,0 +1,316 @@
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from utils import metrics
+from utils.client import get_json_many
+from utils.store import DEFAULT_MUTABLE_DAYS, coordinate_key
+from utils.timezones import get_timezones, to_local, to_utc
+
+# Where the memory-mapped hourly series live (empty disables them), overridable from the environment
+HOURLY_ARCHIVE_PATH = os.environ.get("FIRSTSNOW_HOURLY_ARCHIVE_PATH", ".cache/hourly")
+
+# Hour 0 of every series: the start of Open-Meteo's ERA5 archive, in GMT
+EPOCH = np.datetime64("1940-01-01T00:00", "m")
+BACKFILL_START = datetime(1940, 1, 1)
+
+# Days requested per backfill call and backfill calls in flight at once
+BACKFILL_CHUNK_DAYS = 366
+BACKFILL_CONCURRENCY = 4
+
+ONE_HOUR = np.timedelta64(60, "m")
+
+class HourlyArchive:
+    """
+    Hourly archive values kept as one float32 file per location and variable, indexed by hours
+    since EPOCH (GMT), next to a small JSON file with the covered hour range and the location's
+    IANA time zone. Missing hours are NaN. Hours stay in GMT; local days are found by converting
+    each hour with the zone, so daylight saving time is applied where it was in effect.
+
+    Reads memory-map the file and hand out views, so scanning decades of hours costs no parsing
+    and no copies. Each series covers one contiguous run of hours; backfills extend it at either
+    end and stop before the mutability horizon, like the archive store.
+
+    Parameters:
+        root (str): Directory holding one sub-directory per location.
+    """
+
+    def __init__(self, root=HOURLY_ARCHIVE_PATH):
+        self.root = root
+        self._lock = threading.Lock()
+        # Data file -> (size it was mapped at, read-only memmap)
+        self._maps = {}
+
+    def _paths(self, latitude, longitude, variable):
+        directory = os.path.join(self.root, f"{coordinate_key(latitude)},{coordinate_key(longitude)}")
+        return directory, os.path.join(directory, f"{variable}.f32"), os.path.join(directory, f"{variable}.json")
+
+    def coverage(self, latitude, longitude, variable="snowfall"):
+        """
+        Describes what is stored for a location.
+
+        Returns:
+            dict or None: {"first_hour", "end_hour"} (hour offsets since EPOCH, end exclusive)
+            and "timezone"; None when nothing is stored.
+        """
+        try:
+            with open(self._paths(latitude, longitude, variable)[2]) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def read(self, latitude, longitude, start, end, variable="snowfall"):
+        """
+        Returns the stored hours between GMT times `start` and `end` (inclusive), clipped to
+        what is covered, as a zero-copy view of the memory-mapped file.
+
+        Parameters:
+            start, end (datetime or datetime64): GMT times.
+
+        Returns:
+            tuple or None: (GMT time of the first hour as datetime64[m], float32 view), or None
+            when none of the range is stored. utils.timezones.to_local turns the hours into
+            local times with the zone from coverage().
+        """
+        coverage = self.coverage(latitude, longitude, variable)
+        if coverage is None:
+            return None
+        first = max(_hour_index(np.datetime64(start, "m"), ceil=True), coverage["first_hour"])
+        stop = min(_hour_index(np.datetime64(end, "m")) + 1, coverage["end_hour"])
+        if first >= stop:
+            return None
+
+        values = self._map(self._paths(latitude, longitude, variable)[1])
+        metrics.increment("hourly_archive_hours_read_total", stop - first)
+        return EPOCH + first * ONE_HOUR, values[first:stop]
+
+    def daily_sums(self, latitude, longitude, start_day, end_day, variable="snowfall"):
+        """
+        Sums whole local days of stored hours, e.g. daily snowfall totals from hourly snowfall.
+
+        Local days follow the location's time zone, so the days the clocks change on sum 23 or
+        25 hours.
+
+        Returns:
+            tuple or None: (days datetime64[D], float sums) for the complete local days between
+            `start_day` and `end_day` that are stored, or None. A day with a missing hour is NaN.
+        """
+        coverage = self.coverage(latitude, longitude, variable)
+        if coverage is None:
+            return None
+        zone = coverage["timezone"]
+        start = to_utc(np.datetime64(start_day, "D"), zone)
+        end = to_utc(np.datetime64(end_day, "D") + np.timedelta64(1, "D"), zone) - ONE_HOUR
+        hours = self.read(latitude, longitude, start, end, variable)
+        if hours is None:
+            return None
+        first_hour, values = hours
+
+        local_times = to_local(first_hour + np.arange(len(values)) * ONE_HOUR, zone)
+        days = local_times.astype("datetime64[D]")
+        # Only whole days, from local midnight to the last hour before the next one, count
+        whole = np.ones(len(values), dtype=bool)
+        if local_times[0] != days[0]:
+            whole &= days != days[0]
+        next_hour = to_local(first_hour + len(values) * ONE_HOUR, zone)
+        if next_hour != next_hour.astype("datetime64[D]"):
+            whole &= days != days[-1]
+        days, values = days[whole], values[whole]
+        if not len(days):
+            return None
+        unique_days, first_index = np.unique(days, return_index=True)
+        return unique_days, np.add.reduceat(values.astype(np.float64), first_index)
+
+    def _map(self, data_path):
+        """Returns a read-only memmap of the whole data file, remapped when the file has grown."""
+        size = os.path.getsize(data_path)
+        with self._lock:
+            mapped = self._maps.get(data_path)
+            if mapped is None or mapped[0] != size:
+                mapped = self._maps[data_path] = (size, np.memmap(data_path, dtype=np.float32, mode="r"))
+            return mapped[1]
+
+    def write(self, latitude, longitude, first_hour, values, timezone, variable="snowfall"):
+        """
+        Stores hourly GMT values starting `first_hour` hours after EPOCH. The run must touch or
+        overlap what is already covered, so every series stays contiguous.
+        """
+        directory, data_path, meta_path = self._paths(latitude, longitude, variable)
+        end_hour = first_hour + len(values)
+        with self._lock:
+            coverage = self.coverage(latitude, longitude, variable)
+            if coverage is not None and (end_hour < coverage["first_hour"] or first_hour > coverage["end_hour"]):
+                raise ValueError(f"Hours {first_hour}-{end_hour} would leave a gap in the stored "
+                                 f"{coverage['first_hour']}-{coverage['end_hour']}")
+            os.makedirs(directory, exist_ok=True)
+
+            # Grow the (sparse) file as needed, then write through a writable map of just this run
+            with open(data_path, "a+b") as f:
+                if os.fstat(f.fileno()).st_size < end_hour * 4:
+                    f.truncate(end_hour * 4)
+            target = np.memmap(data_path, dtype=np.float32, mode="r+", offset=first_hour * 4, shape=len(values))
+            target[:] = values
+            target.flush()
+            del target
+
+            if coverage is not None:
+                first_hour = min(first_hour, coverage["first_hour"])
+                end_hour = max(end_hour, coverage["end_hour"])
+            _write_json(meta_path, {
+                "latitude": latitude,
+                "longitude": longitude,
+                "variable": variable,
+                "epoch": str(EPOCH),
+                "first_hour": int(first_hour),
+                "end_hour": int(end_hour),
+                "timezone": timezone
+            })
+
+    def backfill(self, coordinates, start_date=BACKFILL_START, end_date=None, variable="snowfall", progress=None):
+        """
+        Fetches every hour between `start_date` and `end_date` (default: the mutability horizon)
+        that the locations don't have yet, with multi-coordinate archive requests of
+        BACKFILL_CHUNK_DAYS each, and writes them as they arrive.
+
+        Parameters:
+            coordinates (list): (latitude, longitude) tuples.
+            progress (callable, optional): Called with a message after every chunk.
+
+        Returns:
+            int: Number of hours written.
+        """
+        horizon = datetime.now() - timedelta(days=DEFAULT_MUTABLE_DAYS)
+        end_date = min(end_date or horizon, horizon)
+        start_hour = _hour_index(np.datetime64(start_date.strftime('%Y-%m-%d'), "m"))
+        end_hour = _hour_index(np.datetime64(end_date.strftime('%Y-%m-%d'), "m")) + 24
+        if start_hour >= end_hour:
+            return 0
+
+        # The time zone is only needed to read back local days
+        zones = get_timezones(coordinates)
+
+        # Locations needing the same hour runs are fetched together
+        groups = {}
+        for i, coordinate in enumerate(coordinates):
+            coverage = self.coverage(*coordinate, variable)
+            if coverage is None:
+                runs = ((start_hour, end_hour, False),)
+            else:
+                # Before the stored hours (written newest first, so each chunk touches them), and after
+                runs = tuple(run for run in (
+                    (start_hour, min(end_hour, coverage["first_hour"]), True),
+                    (max(start_hour, coverage["end_hour"]), end_hour, False)
+                ) if run[0] < run[1])
+            if runs:
+                groups.setdefault(runs, []).append(i)
+
+        written = 0
+        for runs, indices in groups.items():
+            group = [coordinates[i] for i in indices]
+            for run_start, run_end, newest_first in runs:
+                chunks = _day_chunks(run_start, run_end, newest_first)
+                # Locations the archive ran out for; their remaining chunks would leave a gap
+                ended = set()
+                with ThreadPoolExecutor(max_workers=BACKFILL_CONCURRENCY) as executor:
+                    # map() yields in submission order, so every write touches the stored run
+                    for (chunk_start, chunk_end), responses in zip(chunks, executor.map(
+                        lambda chunk: _fetch_chunk(group, chunk, variable), chunks
+                    )):
+                        for i, response in zip(indices, responses):
+                            if i in ended:
+                                continue
+                            first_hour, values = _chunk_hours(response, variable, chunk_start, chunk_end)
+                            if (chunk_start, chunk_end) == chunks[-1] and not newest_first:
+                                # The archive's lag leaves the newest hours empty; don't store them
+                                available = np.flatnonzero(~np.isnan(values))
+                                values = values[:available[-1] + 1 if available.size else 0]
+                            short_start = first_hour > chunk_start
+                            short_end = first_hour + values.size < chunk_end
+                            if short_start or short_end:
+                                # A short chunk is where the archive's data ends, not an error: keep
+                                # its hours if they still touch the stored run, and stop there
+                                ended.add(i)
+                                if short_end if newest_first else short_start:
+                                    continue
+                            if values.size:
+                                self.write(*coordinates[i], first_hour, values, zones[i], variable=variable)
+                                written += values.size
+                        if progress:
+                            progress(f"{len(group)} locations: {_hour_time(chunk_start)} to {_hour_time(chunk_end)}")
+        return written
+
+def _fetch_chunk(coordinates, chunk, variable):
+    first_hour, end_hour = chunk
+    return get_json_many("archive", coordinates, {
+        "start_date": str(_hour_time(first_hour).astype("datetime64[D]")),
+        "end_date": str(_hour_time(end_hour - 1).astype("datetime64[D]")),
+        "hourly": variable,
+        "timezone": "GMT"
+    })
+
+def _chunk_hours(response, variable, chunk_start, chunk_end):
+    """
+    The hours of one backfill response, placed by its first reported time (the archive can
+    return fewer hours than asked for at either end) and cut to the chunk.
+
+    Returns:
+        tuple: (first hour offset since EPOCH, float32 values)
+    """
+    hourly = response.get("hourly", {})
+    values = np.array(hourly.get(variable, []), dtype=np.float32)
+    times = hourly.get("time", [])
+    first_hour = _hour_index(np.datetime64(times[0], "m")) if times else chunk_start
+    if first_hour < chunk_start:
+        values, first_hour = values[chunk_start - first_hour:], chunk_start
+    return first_hour, values[:chunk_end - first_hour]
+
+def _day_chunks(start_hour, end_hour, newest_first):
+    """Splits an hour run (on day boundaries) into BACKFILL_CHUNK_DAYS chunks of (first, end) hours."""
+    step = BACKFILL_CHUNK_DAYS * 24
+    chunks = [(hour, min(hour + step, end_hour)) for hour in range(start_hour, end_hour, step)]
+    return chunks[::-1] if newest_first else chunks
+
+def _hour_index(time, ceil=False):
+    """Hours from EPOCH to a datetime64[m], rounded down (or up)."""
+    minutes = int((time - EPOCH) // np.timedelta64(1, "m"))
+    return -(-minutes // 60) if ceil else minutes // 60
+
+def _hour_time(hour):
+    return EPOCH + hour * ONE_HOUR
+
+def _write_json(path, data):
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".meta-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+_default_archive = None
+_archive_disabled = not HOURLY_ARCHIVE_PATH
+_default_archive_lock = threading.Lock()
+
+def get_hourly_archive():
+    """Returns the process-wide HourlyArchive, or None when it is disabled."""
+    global _default_archive
+    if _archive_disabled:
+        return None
+    with _default_archive_lock:
+        if _default_archive is None:
+            _default_archive = HourlyArchive()
+        return _default_archive
+
+def set_hourly_archive(archive):
+    """Replaces the process-wide HourlyArchive (pass None to disable it)."""
+    global _default_archive, _archive_disabled
+    with _default_archive_lock:
+        _default_archive = archive
+        _archive_disabled = archive is None
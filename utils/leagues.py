@@ -0,0 +1,120 @@
+import json
+import os
+
+from utils.neighborhood import Neighborhood
+
+# Registry of every league this deployment runs, overridable from the environment
+LEAGUES_PATH = os.environ.get("FIRSTSNOW_LEAGUES_PATH", "config/leagues.json")
+
+# League used when none is asked for, and the only one when there is no registry file
+DEFAULT_LEAGUE_ID = "default"
+
+class LeagueError(ValueError):
+    """Raised for an unknown league or a malformed league registry."""
+
+def load_location(location_file='config/location.json'):
+    """Reads the league location as (latitude, longitude)."""
+    with open(location_file) as f:
+        location = json.load(f)
+    return location["latitude"], location["longitude"]
+
+def load_neighborhood(location_file='config/location.json'):
+    """
+    Reads the optional "neighborhood" grid of a location file, e.g.
+    {"rows": 3, "columns": 3, "spacing_km": 11, "aggregate": "max"}.
+
+    Returns:
+        Neighborhood or None: None when the location is a single point.
+    """
+    with open(location_file) as f:
+        config = json.load(f).get("neighborhood")
+    return _neighborhood(config, location_file)
+
+def _neighborhood(config, source):
+    if config is None:
+        return None
+    try:
+        return Neighborhood.from_config(config)
+    except (TypeError, ValueError) as exc:
+        raise LeagueError(f"Invalid neighborhood in {source}: {exc}") from exc
+
+def load_leagues(path=LEAGUES_PATH):
+    """
+    Reads the league registry: a JSON list of leagues, each with an "id", a "name", its
+    location (inline "latitude"/"longitude", or a "location" file like config/location.json)
+    and its "guesses" file. An optional "neighborhood" (inline or in the location file) makes
+    first-snow detection and the recent-snowfall chart look at a grid around the location.
+
+    Without a registry file, the single default league is config/location.json with
+    config/guesses.jsonl.
+
+    Returns:
+        dict: League id mapped to {"id", "name", "latitude", "longitude", "neighborhood",
+        "guesses"}, in registry order; "neighborhood" is a Neighborhood or None.
+    """
+    if not os.path.exists(path):
+        entries = [{"id": DEFAULT_LEAGUE_ID, "name": "FirstSnow", "location": "config/location.json"}]
+    else:
+        with open(path) as f:
+            entries = json.load(f)
+
+    leagues = {}
+    for entry in entries:
+        league_id = entry.get("id")
+        if not league_id or league_id in leagues:
+            raise LeagueError(f"League ids must be present and unique, got {league_id!r} in {path}")
+        if "latitude" in entry and "longitude" in entry:
+            latitude, longitude = entry["latitude"], entry["longitude"]
+            neighborhood = _neighborhood(entry.get("neighborhood"), path)
+        else:
+            location_file = entry.get("location", "config/location.json")
+            latitude, longitude = load_location(location_file)
+            neighborhood = (_neighborhood(entry["neighborhood"], path) if "neighborhood" in entry
+                            else load_neighborhood(location_file))
+        leagues[league_id] = {
+            "id": league_id,
+            "name": entry.get("name", league_id),
+            "latitude": latitude,
+            "longitude": longitude,
+            "neighborhood": neighborhood,
+            "guesses": entry.get("guesses", "config/guesses.jsonl")
+        }
+    return leagues
+
+def get_league(league_id=None, path=LEAGUES_PATH):
+    """Returns one league from the registry; the first one if `league_id` is not given."""
+    leagues = load_leagues(path)
+    if league_id is None:
+        league_id = DEFAULT_LEAGUE_ID if DEFAULT_LEAGUE_ID in leagues else next(iter(leagues))
+    if league_id not in leagues:
+        raise LeagueError(f"Unknown league {league_id!r}; known leagues: {', '.join(leagues)}")
+    return leagues[league_id]
+
+def group_by_location(leagues):
+    """
+    Groups leagues that play at the same coordinates, so each location is loaded once.
+
+    Parameters:
+        leagues (iterable): League dicts from load_leagues.
+
+    Returns:
+        dict: (latitude, longitude) mapped to the list of leagues there, in first-seen order.
+    """
+    groups = {}
+    for league in leagues:
+        groups.setdefault((league["latitude"], league["longitude"]), []).append(league)
+    return groups
+
+def group_by_site(leagues):
+    """
+    Like group_by_location, but leagues at the same coordinates with different neighborhoods
+    are kept apart.
+
+    Returns:
+        dict: ((latitude, longitude), neighborhood or None) mapped to the list of leagues there.
+    """
+    groups = {}
+    for league in leagues:
+        key = ((league["latitude"], league["longitude"]), league.get("neighborhood"))
+        groups.setdefault(key, []).append(league)
+    return groups
@@ -0,0 +1,230 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+from utils.scoring import GuessIndex
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory file locks on this platform: writers are only serialized within the process
+    fcntl = None
+
+GUESS_FORMAT = '%Y-%m-%d %H:%M'
+
+class GuessError(ValueError):
+    """Raised when a ledger entry is rejected (unknown player, duplicate, bad guess, past the deadline, game over)."""
+
+class GuessLedger:
+    """
+    Append-only JSONL log of guess submissions, edits and withdrawals, with the deadline after
+    which guesses are frozen. Once the first snow has been detected the game is closed for good
+    (see close()): the answer is public, so nobody may guess, change a guess or withdraw.
+
+    Every process reading the file keeps its own GuessIndex and only applies the lines appended
+    since it last looked, so a page view costs one stat() while nothing changes. Writers take an
+    exclusive lock on the file, catch up on entries from other processes, validate, then append.
+
+    Parameters:
+        path (str): The .jsonl log (created on first write).
+        seed_file (str, optional): Guesses JSON dict imported as submissions if the log is empty.
+    """
+
+    def __init__(self, path, seed_file=None):
+        self.path = path
+        self.seed_file = seed_file
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._guesses = {}
+        self._offset = 0
+        self._inode = None
+        self.deadline = None
+        self.first_snow = None
+        self._index = GuessIndex({})
+
+    def index(self):
+        """Returns the current GuessIndex, applying whatever was appended since the last call."""
+        with self._lock:
+            if self._offset == 0 and self.seed_file and os.path.exists(self.seed_file):
+                # Nothing read yet: import the seed file if the log is still empty
+                self._locked_append(None, None)
+            self._catch_up()
+            return self._index
+
+    def guesses(self):
+        """Returns the current guesses as a name -> guess string dict."""
+        self.index()
+        with self._lock:
+            return dict(self._guesses)
+
+    def submit(self, name, guess, now=None):
+        """Adds a new player's guess."""
+        return self._append({"action": "submit", "name": name, "guess": guess}, now)
+
+    def edit(self, name, guess, now=None):
+        """Changes an existing player's guess."""
+        return self._append({"action": "edit", "name": name, "guess": guess}, now)
+
+    def withdraw(self, name, now=None):
+        """Removes a player from the game."""
+        return self._append({"action": "withdraw", "name": name}, now)
+
+    def set_deadline(self, deadline, now=None):
+        """Freezes guesses from `deadline` (a 'YYYY-MM-DD HH:MM' string, or None to lift it)."""
+        return self._append({"action": "deadline", "deadline": deadline}, now)
+
+    def close(self, first_snow, now=None):
+        """
+        Closes the game once the first snow (a datetime) has been detected. Unlike a deadline it
+        can't be lifted, and closing an already closed game appends nothing.
+
+        Returns:
+            dict or None: The appended entry, or None if the game was already closed.
+        """
+        return self._append({"action": "close", "first_snow": first_snow.strftime(GUESS_FORMAT)}, now)
+
+    def _append(self, entry, now):
+        """Validates an entry against the latest state and appends it under the file lock."""
+        now = now or datetime.now()
+        entry = dict(entry, at=now.isoformat(timespec='seconds'))
+        with self._lock:
+            return self._locked_append(entry, now)
+
+    def _locked_append(self, entry, now):
+        """
+        Holding the file lock: seeds an empty log, catches up, then validates and appends
+        `entry` (if given).
+
+        Returns:
+            dict or None: `entry` if it was appended.
+        """
+        with open(self.path, "a+b") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                if os.fstat(f.fileno()).st_size == 0 and self.seed_file and os.path.exists(self.seed_file):
+                    self._write(f, self._seed_entries())
+                self._catch_up()
+                if entry is None or (entry["action"] == "close" and self.first_snow is not None):
+                    return None
+                self._validate(entry, now)
+                self._write(f, [entry])
+                self._catch_up()
+                return entry
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _validate(self, entry, now):
+        action = entry["action"]
+        if action == "deadline":
+            if entry["deadline"] is not None:
+                _parse_guess(entry["deadline"])
+            return
+        if action == "close":
+            _parse_guess(entry["first_snow"])
+            return
+
+        name = entry["name"]
+        if not name:
+            raise GuessError("A name is required")
+        if self.first_snow is not None:
+            raise GuessError(f"The game is over: snow fell at {self.first_snow.strftime(GUESS_FORMAT)}")
+        if self.deadline is not None and now >= self.deadline:
+            raise GuessError(f"Guesses closed at {self.deadline.strftime(GUESS_FORMAT)}")
+        if action == "submit" and name in self._guesses:
+            raise GuessError(f"{name} has already guessed; edit the guess instead")
+        if action in ("edit", "withdraw") and name not in self._guesses:
+            raise GuessError(f"{name} has no guess to {action}")
+        if "guess" in entry:
+            _parse_guess(entry["guess"])
+
+    def _write(self, f, entries):
+        if not entries:
+            return
+        f.write(b"".join(json.dumps(entry).encode() + b"\n" for entry in entries))
+        f.flush()
+        os.fsync(f.fileno())
+
+    def _seed_entries(self):
+        """Turns the seed file into one batch of submissions."""
+        with open(self.seed_file) as f:
+            guesses = json.load(f)
+        at = datetime.now().isoformat(timespec='seconds')
+        return [
+            {"action": "submit", "name": name, "guess": guess, "at": at, "source": self.seed_file}
+            for name, guess in guesses.items()
+        ]
+
+    def _catch_up(self):
+        """Applies the complete lines appended since the last read."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            # The log was replaced or truncated: start over
+            self._reset()
+            self._inode = stat.st_ino
+        if stat.st_size == self._offset:
+            return
+
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read(stat.st_size - self._offset)
+        # A writer may be mid-line; leave the partial line for the next read
+        complete = data[:data.rfind(b"\n") + 1]
+        self._offset += len(complete)
+        self._apply([json.loads(line) for line in complete.splitlines() if line.strip()])
+
+    def _apply(self, entries):
+        """Folds entries into the guesses and updates the index with their net effect."""
+        upserts = {}
+        removals = set()
+        for entry in entries:
+            action = entry["action"]
+            if action == "deadline":
+                self.deadline = _parse_guess(entry["deadline"]) if entry["deadline"] else None
+            elif action == "close":
+                self.first_snow = _parse_guess(entry["first_snow"])
+            elif action == "withdraw":
+                self._guesses.pop(entry["name"], None)
+                upserts.pop(entry["name"], None)
+                removals.add(entry["name"])
+            else:
+                # An edit moves the player to the end, like a fresh submission
+                self._guesses.pop(entry["name"], None)
+                self._guesses[entry["name"]] = entry["guess"]
+                upserts.pop(entry["name"], None)
+                upserts[entry["name"]] = entry["guess"]
+                removals.discard(entry["name"])
+        if upserts or removals:
+            self._index = self._index.with_changes(upserts, removals)
+
+def _parse_guess(guess):
+    try:
+        return datetime.strptime(guess, GUESS_FORMAT)
+    except (TypeError, ValueError):
+        raise GuessError(f"Guesses must look like 'YYYY-MM-DD HH:MM', not {guess!r}")
+
+_ledgers = {}
+_ledgers_lock = threading.Lock()
+
+def get_guess_ledger(path='config/guesses.jsonl'):
+    """
+    Returns the process-wide GuessLedger for a log file. A missing log is seeded from the
+    guesses JSON file next to it (config/guesses.jsonl from config/guesses.json).
+    """
+    with _ledgers_lock:
+        ledger = _ledgers.get(path)
+        if ledger is None:
+            ledger = _ledgers[path] = GuessLedger(path, seed_file=os.path.splitext(path)[0] + ".json")
+        return ledger
+
+def clear_guess_ledgers():
+    """Forgets every process-wide GuessLedger; the next get_guess_ledger reads its log again."""
+    with _ledgers_lock:
+        _ledgers.clear()
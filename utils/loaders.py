@@ -0,0 +1,132 @@
+from datetime import datetime
+
+import numpy as np
+
+from utils.climatology import Climatology, season_of
+from utils.memo import ttl_cache
+from utils.weather import (
+    get_historical_snowfall,
+    get_historical_snowfall_many,
+    get_openmeteo_forecast,
+    get_openmeteo_forecast_many,
+    get_recent_snowfall_data,
+    get_recent_snowfall_data_many,
+    get_test_snowfall_data,
+    get_test_snowfall_data_many,
+    predict_first_snowfall_openmeteo,
+)
+
+# How long each dataset stays fresh, in seconds (None never expires)
+FORECAST_TTL = 30 * 60
+RECENT_TTL = 60 * 60
+HISTORICAL_TTL = 24 * 60 * 60
+STATIC_TTL = None
+
+# How long past expiry a dataset may still be served while one background refresh replaces it
+FORECAST_STALE_TTL = FORECAST_TTL
+RECENT_STALE_TTL = RECENT_TTL
+HISTORICAL_STALE_TTL = HISTORICAL_TTL
+
+HISTORY_YEARS = 20
+
+def current_season(now=None):
+    """Returns the season (start year) `now` (default: the current time) falls in."""
+    return int(season_of(np.datetime64(now or datetime.now(), 'D')))
+
+@ttl_cache(FORECAST_TTL, stale_ttl=FORECAST_STALE_TTL)
+def load_forecast(latitude, longitude):
+    """
+    Loads the Open-Meteo forecast and the first snowfall date it predicts.
+
+    Returns:
+        tuple: (forecast list, predicted first snowfall 'YYYY-MM-DD' or None)
+    """
+    forecast_data = get_openmeteo_forecast(latitude, longitude)
+    return forecast_data, predict_first_snowfall_openmeteo(forecast_data)
+
+@ttl_cache(FORECAST_TTL, stale_ttl=FORECAST_STALE_TTL)
+def load_forecast_many(coordinates):
+    """
+    load_forecast for a tuple of (latitude, longitude) tuples, fetched with one request.
+
+    Returns:
+        list: One (forecast list, predicted first snowfall or None) tuple per coordinate.
+    """
+    return [
+        (forecast_data, predict_first_snowfall_openmeteo(forecast_data))
+        for forecast_data in get_openmeteo_forecast_many(list(coordinates))
+    ]
+
+@ttl_cache(RECENT_TTL, stale_ttl=RECENT_STALE_TTL)
+def load_recent_snowfall(latitude, longitude, neighborhood=None):
+    """Loads the recent daily snowfall window (over the neighborhood, if given) as a DataFrame."""
+    return get_recent_snowfall_data(latitude, longitude, neighborhood)
+
+@ttl_cache(RECENT_TTL, stale_ttl=RECENT_STALE_TTL)
+def load_recent_snowfall_many(coordinates, neighborhoods=None):
+    """
+    load_recent_snowfall for a tuple of (latitude, longitude) tuples and an optional tuple of
+    their neighborhoods (a Neighborhood or None each).
+
+    Returns:
+        list: One DataFrame per coordinate.
+    """
+    return get_recent_snowfall_data_many(list(coordinates), list(neighborhoods) if neighborhoods else None)
+
+@ttl_cache(HISTORICAL_TTL, stale_ttl=HISTORICAL_STALE_TTL)
+def load_historical_snowfall(latitude, longitude, season=None):
+    """
+    Loads first snowfall dates for the HISTORY_YEARS seasons before `season` (default: the
+    season in progress, which is left out since its first snow may still be to come).
+    """
+    season = season or current_season()
+    return get_historical_snowfall(latitude, longitude, season - HISTORY_YEARS, season - 1)
+
+@ttl_cache(HISTORICAL_TTL, stale_ttl=HISTORICAL_STALE_TTL)
+def load_historical_snowfall_many(coordinates, season=None):
+    """
+    load_historical_snowfall for a tuple of (latitude, longitude) tuples, loaded together so
+    every league shares the same archive requests.
+
+    Returns:
+        list: One DataFrame per coordinate.
+    """
+    season = season or current_season()
+    return get_historical_snowfall_many(list(coordinates), season - HISTORY_YEARS, season - 1)
+
+@ttl_cache(HISTORICAL_TTL, stale_ttl=HISTORICAL_STALE_TTL)
+def load_climatologies(coordinates, season=None):
+    """
+    load_climatology for a tuple of (latitude, longitude) tuples.
+
+    Returns:
+        list: One Climatology (or None when there is no history) per coordinate.
+    """
+    return [
+        Climatology.from_dataframe(historical_df) if not historical_df.empty else None
+        for historical_df in load_historical_snowfall_many(coordinates, season)
+    ]
+
+@ttl_cache(HISTORICAL_TTL, stale_ttl=HISTORICAL_STALE_TTL)
+def load_climatology(latitude, longitude, season=None):
+    """
+    Builds the first-snow climatology of a location from its historical window, once per
+    location and day; every statistic is then a NumPy reduction over a handful of integers.
+
+    Returns:
+        Climatology or None: None when there is no history.
+    """
+    historical_df = load_historical_snowfall(latitude, longitude, season)
+    if historical_df.empty:
+        return None
+    return Climatology.from_dataframe(historical_df)
+
+@ttl_cache(STATIC_TTL)
+def load_test_snowfall(latitude, longitude):
+    """Loads the fixed January 2023 test window; it never changes, so it never expires."""
+    return get_test_snowfall_data(latitude, longitude)
+
+@ttl_cache(STATIC_TTL)
+def load_test_snowfall_many(coordinates):
+    """load_test_snowfall for a tuple of (latitude, longitude) tuples; one DataFrame per coordinate."""
+    return get_test_snowfall_data_many(list(coordinates))
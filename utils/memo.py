@@ -0,0 +1,128 @@
+import functools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from utils import metrics
+
+# Background refreshes of stale entries run here, never on the caller's thread
+REVALIDATE_WORKERS = 4
+_revalidate_executor = ThreadPoolExecutor(max_workers=REVALIDATE_WORKERS, thread_name_prefix="firstsnow-revalidate")
+
+# Seconds a key waits after a failed background refresh before the next one; doubles with
+# every further failure in a row, up to REVALIDATE_MAX_BACKOFF
+REVALIDATE_BACKOFF = 30
+REVALIDATE_MAX_BACKOFF = 15 * 60
+
+def ttl_cache(ttl, maxsize=128, stale_ttl=0):
+    """
+    Memoizes a function per argument tuple for `ttl` seconds.
+
+    The cache is process-wide, so it survives Streamlit reruns and is shared by every session.
+    Cached results are returned as-is; callers must not mutate them.
+
+    Concurrent calls for a key that isn't cached share one computation (single flight): the
+    first caller runs the function and the others wait for its result. For `stale_ttl` seconds
+    after an entry expires, callers get the stale value straight away while a single background
+    refresh replaces it (stale-while-revalidate), so a load spike never waits on upstream. A
+    failed refresh keeps the stale value and backs off (REVALIDATE_BACKOFF, doubling) before
+    the key is refreshed in the background again.
+
+    Parameters:
+        ttl (float or None): Seconds before an entry expires, or None to keep it forever.
+        maxsize (int): Entries kept before the least recently used one is dropped.
+        stale_ttl (float): Seconds after expiry during which the stale value may still be served.
+
+    Returns:
+        function: Decorator adding `cache_clear()` and `cache_info()` to the wrapped function.
+    """
+    def decorator(func):
+        entries = OrderedDict()
+        # Key -> Future of the computation currently running for it
+        in_flight = {}
+        # Key -> (failed background refreshes in a row, monotonic time the next one may start)
+        backoff = {}
+        lock = threading.Lock()
+        stats = {"hits": 0, "misses": 0, "stale": 0, "coalesced": 0}
+
+        def load(key, future, args, kwargs, background=False):
+            """Runs the function for `key`, stores the value and hands it to everyone waiting."""
+            try:
+                value = func(*args, **kwargs)
+            except BaseException as exc:
+                with lock:
+                    del in_flight[key]
+                    if background:
+                        # Hold off the next background refresh of this key
+                        failures = backoff.get(key, (0, 0))[0] + 1
+                        delay = min(REVALIDATE_BACKOFF * 2 ** (failures - 1), REVALIDATE_MAX_BACKOFF)
+                        backoff[key] = (failures, time.monotonic() + delay)
+                future.set_exception(exc)
+                raise
+            expires = None if ttl is None else time.monotonic() + ttl
+            with lock:
+                entries[key] = (expires, value)
+                entries.move_to_end(key)
+                while len(entries) > maxsize:
+                    entries.popitem(last=False)
+                del in_flight[key]
+                backoff.pop(key, None)
+            future.set_result(value)
+            return value
+
+        def revalidate(key, future, args, kwargs):
+            try:
+                load(key, future, args, kwargs, background=True)
+            except Exception:
+                # Keep serving the stale value until the backoff lets another refresh start
+                metrics.increment("cache_revalidate_failures_total", cache=func.__name__)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            now = time.monotonic()
+            with lock:
+                entry = entries.get(key)
+                if entry is not None and (entry[0] is None or entry[0] > now):
+                    entries.move_to_end(key)
+                    stats["hits"] += 1
+                    result = "hit"
+                elif entry is not None and entry[0] + stale_ttl > now:
+                    entries.move_to_end(key)
+                    stats["stale"] += 1
+                    result = "stale"
+                    if key not in in_flight and backoff.get(key, (0, 0))[1] <= now:
+                        refresh = in_flight[key] = Future()
+                        _revalidate_executor.submit(revalidate, key, refresh, args, kwargs)
+                else:
+                    future = in_flight.get(key)
+                    leader = future is None
+                    if leader:
+                        future = in_flight[key] = Future()
+                        stats["misses"] += 1
+                        result = "miss"
+                    else:
+                        stats["coalesced"] += 1
+                        result = "coalesced"
+            metrics.increment("cache_requests_total", cache=func.__name__, result=result)
+
+            if result in ("hit", "stale"):
+                return entry[1]
+            if result == "coalesced":
+                return future.result()
+            return load(key, future, args, kwargs)
+
+        def cache_clear():
+            with lock:
+                entries.clear()
+                backoff.clear()
+
+        def cache_info():
+            with lock:
+                return dict(stats, size=len(entries))
+
+        wrapper.cache_clear = cache_clear
+        wrapper.cache_info = cache_info
+        return wrapper
+    return decorator
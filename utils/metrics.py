@@ -0,0 +1,205 @@
+import functools
+import json
+import os
+import tempfile
+import threading
+import time
+
+# Metrics are off unless asked for; every recording call then returns straight away
+_enabled = os.environ.get("FIRSTSNOW_METRICS", "0") == "1"
+
+# Where the refresh worker and the app write their dumps (Prometheus textfile-collector style)
+METRICS_PATH = os.environ.get("FIRSTSNOW_METRICS_PATH", "")
+
+PREFIX = "firstsnow_"
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+
+def enabled():
+    return _enabled
+
+def set_enabled(flag):
+    """Turns recording on or off for the whole process."""
+    global _enabled
+    _enabled = bool(flag)
+
+def reset():
+    """Forgets everything recorded so far."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def increment(name, amount=1, **labels):
+    """Adds `amount` to a counter, e.g. increment("upstream_requests_total", endpoint="archive")."""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+def observe(name, value, **labels):
+    """Records a value (in seconds) into a latency histogram."""
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {"buckets": [0] * len(LATENCY_BUCKETS), "count": 0, "sum": 0.0, "max": 0.0}
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                histogram["buckets"][i] += 1
+                break
+        histogram["count"] += 1
+        histogram["sum"] += value
+        histogram["max"] = max(histogram["max"], value)
+
+class _Span:
+    __slots__ = ("name", "labels", "started")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        observe(f"{self.name}_seconds", time.perf_counter() - self.started, **self.labels)
+        return False
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NO_SPAN = _NoSpan()
+
+def span(name, **labels):
+    """
+    Times a block into the `<name>_seconds` histogram:
+
+        with metrics.span("section", section="historical"):
+            ...
+    """
+    if not _enabled:
+        return _NO_SPAN
+    return _Span(name, labels)
+
+def timed(name):
+    """Decorator timing every call into the `<name>_seconds` histogram, labelled with the function name."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(name, {"function": func.__name__}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def to_dict():
+    """
+    Returns everything recorded as JSON-serializable data, with the hit ratio of each cache
+    derived from the cache_requests_total counter (everything but misses counts as a hit).
+    """
+    with _lock:
+        counters = [
+            {"name": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in sorted(_counters.items())
+        ]
+        histograms = [
+            {"name": name, "labels": dict(labels), "count": h["count"], "sum": h["sum"], "max": h["max"],
+             "buckets": dict(zip([str(bound) for bound in LATENCY_BUCKETS], h["buckets"]))}
+            for (name, labels), h in sorted(_histograms.items())
+        ]
+
+    lookups = {}
+    for counter in counters:
+        if counter["name"] == "cache_requests_total":
+            cache = lookups.setdefault(counter["labels"]["cache"], {"hit": 0, "miss": 0})
+            # Stale and coalesced lookups are answered without a load of their own, so they count as hits
+            cache["miss" if counter["labels"]["result"] == "miss" else "hit"] += counter["value"]
+    cache_hit_ratios = {
+        cache: counts["hit"] / (counts["hit"] + counts["miss"])
+        for cache, counts in sorted(lookups.items()) if counts["hit"] + counts["miss"]
+    }
+    return {"counters": counters, "histograms": histograms, "cache_hit_ratios": cache_hit_ratios}
+
+def to_json():
+    return json.dumps(to_dict(), indent=2)
+
+def _format_labels(labels, extra=None):
+    items = list(labels.items()) + (list(extra.items()) if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{str(value)}"' for key, value in items) + "}"
+
+def to_prometheus():
+    """Renders everything recorded in the Prometheus text exposition format."""
+    data = to_dict()
+    lines = []
+    typed = set()
+
+    for counter in data["counters"]:
+        name = PREFIX + counter["name"]
+        if name not in typed:
+            lines.append(f"# TYPE {name} counter")
+            typed.add(name)
+        lines.append(f"{name}{_format_labels(counter['labels'])} {counter['value']}")
+
+    for histogram in data["histograms"]:
+        name = PREFIX + histogram["name"]
+        if name not in typed:
+            lines.append(f"# TYPE {name} histogram")
+            typed.add(name)
+        # Prometheus buckets are cumulative
+        cumulative = 0
+        for bound, count in histogram["buckets"].items():
+            cumulative += count
+            le = "+Inf" if bound == "inf" else bound
+            lines.append(f"{name}_bucket{_format_labels(histogram['labels'], {'le': le})} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(histogram['labels'])} {histogram['sum']}")
+        lines.append(f"{name}_count{_format_labels(histogram['labels'])} {histogram['count']}")
+
+    for cache, ratio in data["cache_hit_ratios"].items():
+        name = PREFIX + "cache_hit_ratio"
+        if name not in typed:
+            lines.append(f"# TYPE {name} gauge")
+            typed.add(name)
+        lines.append(f"{name}{_format_labels({'cache': cache})} {ratio}")
+
+    return "\n".join(lines) + "\n"
+
+def write_dump(path=METRICS_PATH):
+    """
+    Atomically writes the metrics to `path` (e.g. metrics.prom) in Prometheus text format, plus
+    a `.json` copy next to it. Does nothing when metrics are disabled or no path is configured.
+    """
+    if not _enabled or not path:
+        return
+    for target, content in ((path, to_prometheus()), (os.path.splitext(path)[0] + ".json", to_json())):
+        directory = os.path.dirname(target) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".metrics-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(content)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, target)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
@@ -0,0 +1,176 @@
+import numpy as np
+
+from utils.client import MAX_COORDINATES_PER_REQUEST, known_grid_cells
+
+# Ways of reducing the grid's snowfall to one value per hour or day
+AGGREGATES = ("max", "mean", "fraction")
+
+DEFAULT_ROWS = 3
+DEFAULT_COLUMNS = 3
+# A little over the archive's model resolution (ERA5-Land, 0.1 degrees or about 9-11 km), so
+# neighbouring points mostly land in different model cells
+DEFAULT_SPACING_KM = 11.0
+DEFAULT_AGGREGATE = "max"
+
+# With the "fraction" aggregate, share of the cells that must see snow for it to count
+DEFAULT_MIN_FRACTION = 0.5
+
+KM_PER_DEGREE_LATITUDE = 111.32
+
+class Neighborhood:
+    """
+    An N x M grid of points around a league's location whose snowfall is reduced to one value,
+    so snow falling a few kilometers from the exact point still counts.
+
+    The aggregates are:
+        "max": the snowiest cell.
+        "mean": the average over the cells.
+        "fraction": the average, but only where at least `min_fraction` of the cells saw snow
+            (0 elsewhere), so a single snowy cell doesn't decide the game.
+
+    Every cell is fetched in the same multi-coordinate request as the others, so a grid costs
+    the same number of round trips as a single point; it is therefore capped at
+    MAX_COORDINATES_PER_REQUEST cells. Points falling into the same model cell share one
+    series, so only one of them is kept (see distinct_cells) and no cell is counted twice. The
+    model cell of a point is only known once a response for it came back, so a grid seen for
+    the first time is fetched whole and deduplicated afterwards.
+
+    Parameters:
+        rows (int): Points north to south.
+        columns (int): Points west to east.
+        spacing_km (float): Distance between neighbouring points.
+        aggregate (str): One of AGGREGATES.
+        min_fraction (float): Share of snowy cells the "fraction" aggregate needs.
+    """
+
+    def __init__(self, rows=DEFAULT_ROWS, columns=DEFAULT_COLUMNS, spacing_km=DEFAULT_SPACING_KM,
+                 aggregate=DEFAULT_AGGREGATE, min_fraction=DEFAULT_MIN_FRACTION):
+        if rows < 1 or columns < 1 or rows * columns > MAX_COORDINATES_PER_REQUEST:
+            raise ValueError(f"A neighborhood needs 1 to {MAX_COORDINATES_PER_REQUEST} cells, got {rows}x{columns}")
+        if spacing_km <= 0:
+            raise ValueError(f"Neighborhood spacing must be positive, got {spacing_km}")
+        if aggregate not in AGGREGATES:
+            raise ValueError(f"Unknown neighborhood aggregate {aggregate!r}; use one of {', '.join(AGGREGATES)}")
+        if not 0 < min_fraction <= 1:
+            raise ValueError(f"min_fraction must be in (0, 1], got {min_fraction}")
+        self.rows = int(rows)
+        self.columns = int(columns)
+        self.spacing_km = float(spacing_km)
+        self.aggregate = aggregate
+        self.min_fraction = float(min_fraction)
+
+    @classmethod
+    def from_config(cls, config):
+        """Builds a neighborhood from its JSON config (the keys of to_dict, all optional)."""
+        return cls(**config)
+
+    def to_dict(self):
+        return {
+            "rows": self.rows,
+            "columns": self.columns,
+            "spacing_km": self.spacing_km,
+            "aggregate": self.aggregate,
+            "min_fraction": self.min_fraction
+        }
+
+    def describe(self):
+        """Short human-readable summary, e.g. 'maximum over a 3x3 grid of points 11 km apart'."""
+        grid = f"a {self.rows}x{self.columns} grid of points {self.spacing_km:g} km apart"
+        if self.aggregate == "fraction":
+            return f"average over {grid}, counted when at least {self.min_fraction:.0%} of them saw snow"
+        return f"{'maximum' if self.aggregate == 'max' else 'average'} over {grid}"
+
+    def _key(self):
+        return (self.rows, self.columns, self.spacing_km, self.aggregate, self.min_fraction)
+
+    def __eq__(self, other):
+        return isinstance(other, Neighborhood) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return f"Neighborhood({', '.join(f'{key}={value!r}' for key, value in self.to_dict().items())})"
+
+    def cells(self, latitude, longitude):
+        """
+        Returns the grid's points centred on a location, row by row from the south-west.
+
+        Returns:
+            list: rows * columns (latitude, longitude) tuples.
+        """
+        latitude_step = self.spacing_km / KM_PER_DEGREE_LATITUDE
+        longitude_step = latitude_step / max(np.cos(np.radians(latitude)), 1e-6)
+        latitudes = latitude + (np.arange(self.rows) - (self.rows - 1) / 2) * latitude_step
+        longitudes = longitude + (np.arange(self.columns) - (self.columns - 1) / 2) * longitude_step
+        return [(round(float(cell_latitude), 6), round(float(cell_longitude), 6))
+                for cell_latitude in latitudes for cell_longitude in longitudes]
+
+    def combine(self, values):
+        """
+        Reduces the cells' values (first axis) to one value per hour or day. Cells without data
+        (NaN) are left out; the result is NaN only where no cell has data.
+
+        Parameters:
+            values (array-like): (cells, ...) snowfall values.
+
+        Returns:
+            np.ndarray: The aggregate, shaped like one cell's values.
+        """
+        values = np.asarray(values, dtype=float)
+        if self.aggregate == "max":
+            # fmax skips NaN unless every cell is NaN
+            return np.fmax.reduce(values, axis=0)
+
+        reporting = (~np.isnan(values)).sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.nansum(values, axis=0) / reporting
+            if self.aggregate == "mean":
+                return mean
+            snowy_fraction = (values > 0).sum(axis=0) / reporting
+        return np.where(reporting > 0, np.where(snowy_fraction >= self.min_fraction, mean, 0.0), np.nan)
+
+def site_cells(coordinates, neighborhoods=None):
+    """
+    The points to fetch for each location: its neighborhood's points, keeping one per archive
+    model cell already known (see distinct_cells), or the location itself. No request is made.
+
+    Parameters:
+        coordinates (list): (latitude, longitude) tuples.
+        neighborhoods (list, optional): A Neighborhood or None per coordinate.
+
+    Returns:
+        list: One list of (latitude, longitude) tuples per coordinate.
+    """
+    neighborhoods = neighborhoods or [None] * len(coordinates)
+    sites = []
+    for coordinate, neighborhood in zip(coordinates, neighborhoods):
+        if neighborhood is None:
+            sites.append([tuple(coordinate)])
+        else:
+            cells = neighborhood.cells(*coordinate)
+            sites.append([cells[i] for i in distinct_cells(cells)])
+    return sites
+
+def distinct_cells(points):
+    """
+    Picks the points standing for distinct archive model cells, from the grid latitude and
+    longitude of the responses seen so far (utils.client.known_grid_cells): the first point in
+    every known cell, and every point whose cell isn't known yet.
+
+    Returns:
+        list: Indices into `points`, in order.
+    """
+    representatives = {}
+    for i, (point, cell) in enumerate(zip(points, known_grid_cells("archive", points))):
+        representatives.setdefault(cell or tuple(point), i)
+    return list(representatives.values())
+
+def combine_series(neighborhood, series):
+    """
+    Combines per-cell series of equal length into one; a plain location's single series is
+    returned untouched (no copy).
+    """
+    if neighborhood is None:
+        return series[0]
+    return neighborhood.combine(np.stack(series))
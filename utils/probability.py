@@ -0,0 +1,166 @@
+from datetime import datetime
+
+import numpy as np
+
+from utils.climatology import FEB_29_DAY_OF_SEASON, SEASON_LENGTH_DAYS, day_of_season, has_feb_29, season_dates, season_of
+
+DEFAULT_SAMPLES = 200_000
+
+# Chance that a forecast snow day really brings the first snow, decaying with lead time
+FORECAST_HIT_PROBABILITY = 0.8
+FORECAST_HIT_DECAY_PER_DAY = 0.95
+
+# Chance of snow on a day the forecast calls dry
+FORECAST_MISS_PROBABILITY = 0.03
+
+# Gaussian smoothing (in days) applied to the historical first-snow days
+CLIMATOLOGY_BANDWIDTH_DAYS = 7.0
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+def first_snow_distribution(climatology, forecast_data, now):
+    """
+    Blends the forecast with the historical climatology into a first-snow distribution over the
+    rest of the current season, assuming it hasn't snowed yet.
+
+    Forecast days snow with FORECAST_HIT_PROBABILITY (decaying with lead time) when snow is
+    forecast and FORECAST_MISS_PROBABILITY otherwise. Whatever probability is left after the
+    forecast window is spread over the later days of the season following the smoothed
+    historical first-snow days.
+
+    Parameters:
+        climatology (Climatology or None): Historical first snows; None spreads the rest evenly.
+        forecast_data (list): Daily forecast entries with "date" and "snow" keys.
+        now (datetime): Current time.
+
+    Returns:
+        tuple: (season, pmf) with pmf the probability of first snow on each day-of-season.
+    """
+    today = np.datetime64(now, 'D')
+    season = int(season_of(today))
+    today_number = int(day_of_season(today))
+    day_numbers = np.arange(SEASON_LENGTH_DAYS)
+
+    # Days still to come this season (Feb 29 only exists in some seasons)
+    remaining = day_numbers >= today_number
+    if not has_feb_29(season):
+        remaining &= day_numbers != FEB_29_DAY_OF_SEASON
+
+    # Chance the first snow falls on each forecast day, given none fell before it
+    forecast_dates = np.array([entry["date"] for entry in forecast_data], dtype='datetime64[D]')
+    forecast_snow = np.array([entry["snow"] for entry in forecast_data], dtype=float)
+    in_window = (forecast_dates >= today) & (season_of(forecast_dates) == season)
+    forecast_numbers = day_of_season(forecast_dates[in_window])
+    leads = forecast_numbers - today_number
+    daily_chance = np.where(forecast_snow[in_window] > 0,
+                            FORECAST_HIT_PROBABILITY * FORECAST_HIT_DECAY_PER_DAY ** leads,
+                            FORECAST_MISS_PROBABILITY)
+    no_snow_yet = np.cumprod(1 - daily_chance)
+
+    pmf = np.zeros(SEASON_LENGTH_DAYS)
+    pmf[forecast_numbers] = daily_chance * np.r_[1.0, no_snow_yet[:-1]]
+    left_over = no_snow_yet[-1] if no_snow_yet.size else 1.0
+
+    # The rest follows the smoothed climatology over the days after the forecast window
+    after = remaining & (day_numbers > (forecast_numbers.max() if forecast_numbers.size else today_number - 1))
+    if climatology is not None and len(climatology):
+        distances = (day_numbers[:, None] - climatology.days[None, :]) / CLIMATOLOGY_BANDWIDTH_DAYS
+        density = np.exp(-0.5 * distances ** 2).sum(axis=1) * after
+    else:
+        density = after.astype(float)
+    if density.sum() == 0:
+        # Later than any season on record: spread it evenly over what is left
+        density = after.astype(float)
+    if density.sum() > 0:
+        pmf += left_over * density / density.sum()
+
+    return season, pmf / pmf.sum()
+
+def sample_first_snow_times(season, pmf, now, samples=DEFAULT_SAMPLES, rng=None):
+    """
+    Draws first-snow timestamps from a day-of-season distribution, uniformly within each day
+    (and after `now` on today).
+
+    Returns:
+        np.ndarray: int64 local epoch seconds.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+
+    # Draw how many samples land on each day at once, then place them within their day
+    day_numbers = np.repeat(np.arange(len(pmf)), rng.multinomial(samples, pmf))
+    day_starts = season_dates(season, np.arange(len(pmf))).astype('datetime64[s]').astype(np.int64)
+
+    # Today's draws can only land in the hours that haven't passed yet
+    now_seconds = np.datetime64(now, 's').astype(np.int64)
+    earliest = np.clip(now_seconds - day_starts, 0, SECONDS_PER_DAY - 1)
+
+    offsets = earliest[day_numbers] + (rng.random(samples) * (SECONDS_PER_DAY - earliest[day_numbers])).astype(np.int64)
+    return day_starts[day_numbers] + offsets
+
+def score_samples(guess_index, sample_times):
+    """
+    Works out how often each player wins across sampled first-snow times.
+
+    Each distinct guess wins every sample closer to it than to its neighbours, so the samples
+    are sorted once and only the midpoints between neighbouring guesses are searched for.
+    Samples exactly on a midpoint are split between both sides, and players with the same
+    guess share its wins.
+
+    Returns:
+        np.ndarray: Win probability of each player, aligned with guess_index.names.
+    """
+    guesses, group_sizes = np.unique(guess_index.seconds, return_counts=True)
+
+    # Compare doubled times with summed neighbours to keep the midpoints in integers
+    doubled = np.sort(sample_times) * 2
+    midpoints = guesses[:-1] + guesses[1:]
+    below = np.searchsorted(doubled, midpoints, side='left')
+    through = np.searchsorted(doubled, midpoints, side='right')
+
+    # Samples strictly between the midpoints on either side, plus half of those on them
+    starts = np.r_[0, through]
+    ends = np.r_[below, len(doubled)]
+    on_midpoint = (through - below) / 2
+    wins = (ends - starts) + np.r_[0, on_midpoint] + np.r_[on_midpoint, 0]
+
+    # Split each distinct guess's wins evenly among the players who made it
+    group_probability = wins / len(sample_times) / group_sizes
+    return np.repeat(group_probability, group_sizes)
+
+def simulate_win_probabilities(guess_index, climatology, forecast_data, now=None, first_snow=None,
+                               samples=DEFAULT_SAMPLES, seed=None):
+    """
+    Estimates every player's chance of winning by Monte Carlo over first-snow timestamps.
+
+    Parameters:
+        guess_index (GuessIndex): Parsed guesses.
+        climatology (Climatology or None): Historical first snows of the location.
+        forecast_data (list): Daily forecast entries with "date" and "snow" keys.
+        now (datetime, optional): Current time; defaults to now.
+        first_snow (datetime, optional): The first snow, if it has already fallen.
+        samples (int): Number of simulated first-snow times.
+        seed (int, optional): Seed for reproducible results.
+
+    Returns:
+        list: Dicts with "name", "guess" and "probability", most likely winner first.
+    """
+    if not len(guess_index):
+        return []
+    now = now or datetime.now()
+
+    if first_snow is not None:
+        # Nothing left to simulate: the winners split the prize
+        winners = set(guess_index.winners_at(first_snow))
+        probabilities = np.array([1.0 / len(winners) if name in winners else 0.0 for name in guess_index.names])
+    else:
+        season, pmf = first_snow_distribution(climatology, forecast_data, now)
+        sample_times = sample_first_snow_times(season, pmf, now, samples, np.random.default_rng(seed))
+        probabilities = score_samples(guess_index, sample_times)
+
+    order = np.argsort(-probabilities, kind='stable')
+    return [
+        {"name": name, "guess": guess, "probability": probability}
+        for name, guess, probability in zip(
+            guess_index.names[order].tolist(), guess_index.guess_strings[order].tolist(), probabilities[order].tolist()
+        )
+    ]
@@ -0,0 +1,397 @@
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+
+from utils import metrics
+from utils.detection import check_for_first_snow, detect_first_snow_many, first_snow_result
+from utils.leagues import DEFAULT_LEAGUE_ID, LEAGUES_PATH, group_by_site, load_leagues
+from utils.ledger import get_guess_ledger
+from utils.loaders import (
+    current_season,
+    load_climatologies,
+    load_climatology,
+    load_forecast,
+    load_forecast_many,
+    load_historical_snowfall,
+    load_historical_snowfall_many,
+    load_recent_snowfall,
+    load_recent_snowfall_many,
+    load_test_snowfall,
+    load_test_snowfall_many,
+)
+from utils.probability import simulate_win_probabilities
+from utils.scoring import load_guess_index
+
+SNAPSHOT_PATH = os.environ.get("FIRSTSNOW_SNAPSHOT_PATH", ".cache/snapshot.json")
+REFRESH_INTERVAL = int(os.environ.get("FIRSTSNOW_REFRESH_INTERVAL", str(15 * 60)))
+
+# Process-wide cap on dataset loads running at once, shared by every session and the worker
+LOAD_CONCURRENCY = int(os.environ.get("FIRSTSNOW_LOAD_CONCURRENCY", "4"))
+_load_executor = ThreadPoolExecutor(max_workers=LOAD_CONCURRENCY, thread_name_prefix="firstsnow-load")
+
+# (latitude, longitude, guesses file, neighborhood) -> (start time, section futures) of the latest shared load
+_shared_loads = {}
+_shared_loads_lock = threading.Lock()
+
+def clear_shared_loads():
+    """Forgets every shared section load, so the next page view starts its own."""
+    with _shared_loads_lock:
+        _shared_loads.clear()
+
+def start_section_loads(latitude, longitude, guesses_file='config/guesses.jsonl', now=None, neighborhood=None):
+    """
+    Starts every independent dataset load at once on the shared load pool. Weather goes
+    through the memoized loaders (utils.loaders), so it is fetched again only once it expires,
+    and even then the stale value is used while one background refresh replaces it.
+
+    Each future resolves to the snapshot keys its dataset fills in, so callers can use
+    sections as soon as their own data arrives instead of waiting for the slowest fetch.
+    With a neighborhood, the first-snow status and the recent snowfall cover its grid.
+
+    Returns:
+        dict: Section name mapped to a Future of a partial snapshot dict.
+    """
+    now = now or datetime.now()
+    forecast = _load_executor.submit(_forecast_section, latitude, longitude, guesses_file, now)
+    first_snow = _load_executor.submit(_first_snow_section, latitude, longitude, guesses_file, now, neighborhood)
+    historical = _load_executor.submit(_historical_section, latitude, longitude, now)
+    return {
+        "forecast": forecast,
+        "first_snow": first_snow,
+        "recent_snowfall": _load_executor.submit(
+            lambda: {"recent_snowfall": _snowfall_records(load_recent_snowfall(latitude, longitude, neighborhood),
+                                                          neighborhood)}
+        ),
+        "test_snowfall": _load_executor.submit(
+            lambda: {"test_snowfall": _snowfall_records(load_test_snowfall(latitude, longitude))}
+        ),
+        "historical": historical,
+        # Simulated once the forecast, the first-snow status and the history are all in
+        "win_probabilities": _after(
+            (forecast, first_snow, historical),
+            lambda data: _win_probability_section(latitude, longitude, guesses_file, now, data)
+        )
+    }
+
+def shared_section_loads(latitude, longitude, guesses_file='config/guesses.jsonl', now=None, neighborhood=None):
+    """
+    start_section_loads shared by every session in the process: while a league's loads are
+    still running, other sessions asking for it get the same futures instead of starting their
+    own, so a crowd arriving before the first snapshot costs one set of upstream fetches.
+
+    Returns:
+        tuple: (start time of the loads, dict of section futures)
+    """
+    key = (latitude, longitude, guesses_file, neighborhood)
+    with _shared_loads_lock:
+        loads = _shared_loads.get(key)
+        if loads is None or all(future.done() for future in loads[1].values()):
+            now = now or datetime.now()
+            loads = _shared_loads[key] = (now, start_section_loads(latitude, longitude, guesses_file, now, neighborhood))
+        else:
+            metrics.increment("section_loads_shared_total")
+    return loads
+
+def _after(futures, function):
+    """
+    Runs `function` on the shared load pool with the merged results of `futures` once they have
+    all finished, without tying up a worker while it waits.
+
+    Returns:
+        Future: Resolves to the function's result, or fails with the first load's error.
+    """
+    result = Future()
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def run():
+        try:
+            data = {}
+            for future in futures:
+                data.update(future.result())
+            result.set_result(function(data))
+        except Exception as exc:
+            result.set_exception(exc)
+
+    def on_done(_):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        _load_executor.submit(run)
+
+    for future in futures:
+        future.add_done_callback(on_done)
+    return result
+
+def build_snapshot(latitude, longitude, guesses_file='config/guesses.jsonl', league=None, neighborhood=None):
+    """
+    Fetches and computes everything the page shows, as a JSON-serializable game-state snapshot.
+
+    Returns:
+        dict: Forecast, first-snow status, projected winners, win probabilities and the chart
+        datasets, stamped with "generated_at".
+    """
+    now = datetime.now()
+    sections = start_section_loads(latitude, longitude, guesses_file, now, neighborhood)
+    snapshot = {}
+    for future in sections.values():
+        snapshot.update(future.result())
+    return stamp_snapshot(snapshot, latitude, longitude, now, league, neighborhood)
+
+def build_league_snapshots(leagues, now=None):
+    """
+    Builds the snapshot of every league with one batched load per dataset.
+
+    Leagues are grouped by location, every location is fetched together through Open-Meteo's
+    multi-coordinate requests (which also share locations falling in the same grid cell), and
+    only the scoring runs per league. N leagues therefore cost about as many upstream requests
+    as one. Neighborhood grids join the same requests for first-snow detection and the recent
+    snowfall. As in start_section_loads, everything but the first-snow detection comes from the
+    memoized loaders.
+
+    Parameters:
+        leagues (iterable): League dicts from utils.leagues.load_leagues.
+
+    Returns:
+        dict: League id mapped to its snapshot.
+    """
+    now = now or datetime.now()
+    groups = group_by_site(leagues)
+    coordinates = tuple(coordinate for coordinate, _ in groups)
+    neighborhoods = [neighborhood for _, neighborhood in groups]
+
+    forecasts = _load_executor.submit(load_forecast_many, coordinates)
+    first_snows = _load_executor.submit(detect_first_snow_many, list(coordinates), now=now, neighborhoods=neighborhoods)
+    recent = _load_executor.submit(load_recent_snowfall_many, coordinates, tuple(neighborhoods))
+    test = _load_executor.submit(load_test_snowfall_many, coordinates)
+    historical = _load_executor.submit(load_historical_snowfall_many, coordinates, current_season(now))
+
+    # The climatologies are built from the (now memoized) history
+    historical_dfs = historical.result()
+    climatologies = load_climatologies(coordinates, current_season(now))
+    forecasts, first_snows, recent, test = forecasts.result(), first_snows.result(), recent.result(), test.result()
+
+    snapshots = {}
+    for i, ((coordinate, neighborhood), location_leagues) in enumerate(groups.items()):
+        # Weather is the same for every league at a location; only the scoring differs
+        shared = {"recent_snowfall": _snowfall_records(recent[i], neighborhood), "test_snowfall": _snowfall_records(test[i])}
+        shared.update(_historical_keys(historical_dfs[i], climatologies[i]))
+        for league in location_leagues:
+            data = dict(shared)
+            data.update(_forecast_keys(*forecasts[i], league["guesses"], now))
+            data.update(_first_snow_keys(first_snow_result(first_snows[i], league["guesses"])))
+            data.update(_win_probability_keys(league["guesses"], climatologies[i], data, now))
+            snapshots[league["id"]] = stamp_snapshot(data, *coordinate, now, league, neighborhood)
+    return snapshots
+
+def stamp_snapshot(sections, latitude, longitude, now, league=None, neighborhood=None):
+    """Completes a snapshot assembled from section results with its location, league and timestamp."""
+    snapshot = dict(sections, generated_at=now.isoformat(timespec='seconds'),
+                    location={"latitude": latitude, "longitude": longitude})
+    if neighborhood is not None:
+        snapshot["location"]["neighborhood"] = neighborhood.to_dict()
+    if league is not None:
+        snapshot["league"] = {"id": league["id"], "name": league["name"], "guesses": league["guesses"]}
+    return snapshot
+
+def project_winners(guess_index, predicted_date, now):
+    """
+    Finds who would win if it snowed today, and if the forecast's first snowfall is right.
+
+    Returns:
+        dict: "today" and "forecast" (None without a forecast date) lists of names, and the
+        "guesses" of everyone in them, so the page doesn't depend on who is still in the ledger.
+    """
+    today = guess_index.closest(now, use_full_datetime=False)
+    forecast = guess_index.closest(predicted_date, use_full_datetime=False) if predicted_date else None
+    return {
+        "today": today,
+        "forecast": forecast,
+        "guesses": {name: guess_index.guess_for(name) for name in today + (forecast or [])}
+    }
+
+def _forecast_section(latitude, longitude, guesses_file, now):
+    return _forecast_keys(*load_forecast(latitude, longitude), guesses_file, now)
+
+def _forecast_keys(forecast_data, predicted_date, guesses_file, now):
+    return {
+        "forecast": forecast_data,
+        "predicted_first_snowfall": predicted_date,
+        "projected": project_winners(load_guess_index(guesses_file), predicted_date, now)
+    }
+
+def _first_snow_section(latitude, longitude, guesses_file, now, neighborhood=None):
+    return _first_snow_keys(check_for_first_snow(latitude, longitude, guesses_file, now=now, neighborhood=neighborhood))
+
+def _first_snow_keys(result):
+    return {"first_snow": dict(result, first_snow_date=_isoformat(result["first_snow_date"]))}
+
+def _historical_section(latitude, longitude, now):
+    # History barely changes, so it comes from the day-long memoized loaders
+    return _historical_keys(load_historical_snowfall(latitude, longitude, current_season(now)),
+                            load_climatology(latitude, longitude, current_season(now)))
+
+def _historical_keys(historical_df, climatology):
+    return {
+        "historical": {
+            "years": historical_df["year"].tolist() if not historical_df.empty else [],
+            "first_snowfall_dates": (historical_df["first_snowfall_date"].dt.strftime('%Y-%m-%d').tolist()
+                                     if not historical_df.empty else [])
+        },
+        "statistics": list(climatology.summary()) if climatology else None
+    }
+
+def _win_probability_section(latitude, longitude, guesses_file, now, data):
+    return _win_probability_keys(guesses_file, load_climatology(latitude, longitude, current_season(now)), data, now)
+
+def _win_probability_keys(guesses_file, climatology, data, now):
+    first_snow_date = data["first_snow"]["first_snow_date"]
+    return {
+        "win_probabilities": simulate_win_probabilities(
+            load_guess_index(guesses_file),
+            climatology,
+            data["forecast"],
+            now=now,
+            first_snow=datetime.fromisoformat(first_snow_date) if first_snow_date else None
+        )
+    }
+
+def _snowfall_records(snowfall_df, neighborhood=None):
+    """Converts a daily snowfall DataFrame into date and inch lists, noting the neighborhood it covers."""
+    records = {
+        "dates": snowfall_df["Date"].dt.strftime('%Y-%m-%d').tolist(),
+        "inches": snowfall_df["Snowfall (inches)"].tolist()
+    }
+    if neighborhood is not None:
+        records["neighborhood"] = neighborhood.describe()
+    return records
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+def snapshot_path(league_id=DEFAULT_LEAGUE_ID, base_path=SNAPSHOT_PATH):
+    """
+    Returns where a league's snapshot lives: `base_path` for the default league, and
+    `.cache/snapshot-<league id>.json` (next to it) for the others.
+    """
+    if league_id == DEFAULT_LEAGUE_ID:
+        return base_path
+    root, extension = os.path.splitext(base_path)
+    return f"{root}-{league_id}{extension}"
+
+def write_snapshot(snapshot, path=SNAPSHOT_PATH):
+    """Writes a snapshot atomically: readers see either the old file or the new one, never a partial."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".snapshot-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(snapshot, f)
+        # mkstemp creates owner-only files; the app may run as a different user
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def read_snapshot(path=SNAPSHOT_PATH):
+    """Reads the latest snapshot, or returns None if none has been written yet."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def snapshot_age(snapshot, now=None):
+    """Returns how many seconds ago a snapshot was generated."""
+    now = now or datetime.now()
+    return (now - datetime.fromisoformat(snapshot["generated_at"])).total_seconds()
+
+def refresh_snapshots(path=SNAPSHOT_PATH, leagues_path=LEAGUES_PATH):
+    """Builds fresh snapshots for every league in the registry, writes them and returns them."""
+    leagues = load_leagues(leagues_path)
+    with metrics.span("snapshot_refresh"):
+        snapshots = build_league_snapshots(leagues.values())
+    for league_id, snapshot in snapshots.items():
+        write_snapshot(snapshot, snapshot_path(league_id, path))
+    close_finished_games(leagues.values(), snapshots)
+    return snapshots
+
+def close_finished_games(leagues, snapshots):
+    """
+    Closes the guess ledger of every league whose snapshot found the first snow, so nobody can
+    guess, edit or withdraw once the answer is known. Plain guesses JSON files are left alone.
+
+    Returns:
+        list: Ids of the leagues closed by this call.
+    """
+    closed = []
+    for league in leagues:
+        first_snow = snapshots[league["id"]]["first_snow"]
+        if not first_snow["snowfall_occurred"] or not league["guesses"].endswith(".jsonl"):
+            continue
+        if get_guess_ledger(league["guesses"]).close(datetime.fromisoformat(first_snow["first_snow_date"])):
+            closed.append(league["id"])
+    return closed
+
+def _oldest_snapshot_age(path, leagues_path, interval):
+    """Age of the stalest league snapshot in seconds, or `interval` if any is missing."""
+    ages = []
+    for league_id in load_leagues(leagues_path):
+        snapshot = read_snapshot(snapshot_path(league_id, path))
+        if snapshot is None:
+            return interval
+        ages.append(snapshot_age(snapshot))
+    return max(ages, default=interval)
+
+def run_forever(interval=REFRESH_INTERVAL, path=SNAPSHOT_PATH, leagues_path=LEAGUES_PATH):
+    """
+    Refreshes every league's snapshot every `interval` seconds. Failed refreshes keep the
+    previous snapshots in place (their age shows how stale they are) and are retried on the
+    next tick.
+    """
+    while True:
+        # Snapshots written recently (e.g. by the app on a cold start) don't need redoing yet
+        age = _oldest_snapshot_age(path, leagues_path, interval)
+        if age < interval:
+            time.sleep(interval - age)
+            continue
+
+        try:
+            refresh_snapshots(path, leagues_path)
+        except Exception as exc:
+            metrics.increment("snapshot_refresh_failures_total")
+            print(f"Snapshot refresh failed: {exc}")
+            time.sleep(interval)
+        metrics.write_dump()
+
+_worker = None
+_worker_lock = threading.Lock()
+
+def start_background_refresh(interval=REFRESH_INTERVAL, path=SNAPSHOT_PATH):
+    """Starts the refresh loop on a daemon thread, once per process."""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=run_forever, args=(interval, path), name="snapshot-refresh", daemon=True)
+            _worker.start()
+    return _worker
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the FirstSnow game-state snapshots of every league.")
+    parser.add_argument("--once", action="store_true", help="Write one snapshot per league and exit.")
+    parser.add_argument("--interval", type=int, default=REFRESH_INTERVAL, help="Seconds between refreshes.")
+    parser.add_argument("--path", default=SNAPSHOT_PATH, help="Snapshot file of the default league (the others go next to it).")
+    parser.add_argument("--leagues", default=LEAGUES_PATH, help="League registry JSON file.")
+    args = parser.parse_args()
+
+    if args.once:
+        refresh_snapshots(args.path, args.leagues)
+    else:
+        run_forever(args.interval, args.path, args.leagues)
@@ -0,0 +1,209 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+class GuessIndex:
+    """
+    Guesses parsed once into a sorted array of epoch seconds for fast scoring queries.
+
+    Every query works on the sorted array, so closest-guess lookups are a binary search
+    and leaderboards a single vectorized distance computation, whatever the player count.
+    An index is never modified; with_changes() derives an updated one without re-sorting.
+
+    Parameters:
+        guesses (dict): Player names mapped to 'YYYY-MM-DD HH:MM' guess strings.
+    """
+
+    def __init__(self, guesses):
+        names, guess_strings, seconds = _parse(guesses)
+
+        # A stable sort keeps players with the same guess in their original order
+        order = np.argsort(seconds, kind='stable')
+        self._assign(names[order], guess_strings[order], seconds[order])
+
+    def _assign(self, names, guess_strings, seconds, guesses=None):
+        self.names = names
+        self.guess_strings = guess_strings
+        self.seconds = seconds
+        self.days = self.seconds // SECONDS_PER_DAY
+        # Name -> (guess string, epoch seconds)
+        self._guesses = guesses if guesses is not None else dict(
+            zip(names.tolist(), zip(guess_strings.tolist(), seconds.tolist()))
+        )
+
+    def with_changes(self, upserts=None, removals=()):
+        """
+        Returns a new index with guesses added, changed or withdrawn.
+
+        Dropped rows are located by binary search and new guesses merged into the sorted arrays
+        in one pass, so an update costs a copy of the arrays rather than a re-parse and re-sort
+        of every guess. Changed and new guesses go after existing equal guesses.
+
+        Parameters:
+            upserts (dict, optional): Player names mapped to their new guess strings.
+            removals (iterable): Names of players who withdrew.
+
+        Returns:
+            GuessIndex: The updated index.
+        """
+        upserts = upserts or {}
+        dropped = [name for name in set(removals) | set(upserts) if name in self._guesses]
+
+        # Find each dropped player among the players sharing their guess
+        rows = []
+        for name in dropped:
+            point = self._guesses[name][1]
+            start = np.searchsorted(self.seconds, point, 'left')
+            end = np.searchsorted(self.seconds, point, 'right')
+            rows.append(start + self.names[start:end].tolist().index(name))
+        names = np.delete(self.names, rows)
+        guess_strings = np.delete(self.guess_strings, rows)
+        seconds = np.delete(self.seconds, rows)
+
+        guesses = dict(self._guesses)
+        for name in dropped:
+            del guesses[name]
+
+        if upserts:
+            new_names, new_strings, new_seconds = _parse(upserts)
+            order = np.argsort(new_seconds, kind='stable')
+            positions = np.searchsorted(seconds, new_seconds[order], 'right')
+            names = np.insert(names, positions, new_names[order])
+            guess_strings = np.insert(guess_strings, positions, new_strings[order])
+            seconds = np.insert(seconds, positions, new_seconds[order])
+            guesses.update(zip(new_names.tolist(), zip(new_strings.tolist(), new_seconds.tolist())))
+
+        index = GuessIndex.__new__(GuessIndex)
+        index._assign(names, guess_strings, seconds, guesses)
+        return index
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self._guesses
+
+    def guess_for(self, name):
+        """Returns the guess string a player submitted."""
+        return self._guesses[name][0]
+
+    def guess_time(self, name):
+        """Returns a player's guess as a numpy datetime64."""
+        return np.datetime64(self._guesses[name][1], 's')
+
+    def closest(self, target, use_full_datetime=True):
+        """
+        Finds the players whose guesses are closest to a target, allowing for ties.
+
+        Parameters:
+            target (datetime, date, pd.Timestamp or str): The time to compare guesses against.
+            use_full_datetime (bool): If True, compare to the second; if False, compare whole days.
+
+        Returns:
+            list: Names of the closest guessers, in guess order.
+        """
+        if not len(self):
+            return []
+        keys, point = self._keys_and_point(target, use_full_datetime)
+
+        # The nearest guesses sit on either side of the insertion point
+        i = np.searchsorted(keys, point)
+        neighbours = keys[max(i - 1, 0):i + 1]
+        distance = np.abs(neighbours - point).min()
+
+        # Collect every guess at that distance, before and after the target
+        below = slice(np.searchsorted(keys, point - distance, 'left'), np.searchsorted(keys, point - distance, 'right'))
+        above = slice(np.searchsorted(keys, point + distance, 'left'), np.searchsorted(keys, point + distance, 'right'))
+        names = self.names[below].tolist()
+        if distance:
+            names += self.names[above].tolist()
+        return names
+
+    def winners_at(self, target):
+        """Returns who would win (ties included) if the first snow fell at exactly `target`."""
+        return self.closest(target, use_full_datetime=True)
+
+    def leaderboard(self, target, use_full_datetime=True, top=None):
+        """
+        Ranks every player by distance from a target; tied players share a rank.
+
+        Parameters:
+            target (datetime, date, pd.Timestamp or str): The time to compare guesses against.
+            use_full_datetime (bool): If True, distances are in seconds; if False, in days.
+            top (int, optional): Only return players ranked within the first `top` places.
+
+        Returns:
+            list: Dicts with "rank", "name", "guess" and "distance", best first.
+        """
+        if not len(self):
+            return []
+        keys, point = self._keys_and_point(target, use_full_datetime)
+        distances = np.abs(keys - point)
+
+        if top is not None and top < len(distances):
+            # Only sort the players that can make the cut
+            cutoff = np.partition(distances, top - 1)[top - 1]
+            candidates = np.flatnonzero(distances <= cutoff)
+        else:
+            candidates = np.arange(len(distances))
+        order = candidates[np.argsort(distances[candidates], kind='stable')]
+
+        # Competition ranking: tied players share the best rank of their group
+        ranked = distances[order]
+        starts = np.r_[True, ranked[1:] != ranked[:-1]]
+        ranks = np.maximum.accumulate(np.where(starts, np.arange(len(ranked)), 0)) + 1
+
+        return [
+            {"rank": rank, "name": name, "guess": guess, "distance": distance}
+            for rank, name, guess, distance in zip(
+                ranks.tolist(), self.names[order].tolist(), self.guess_strings[order].tolist(), ranked.tolist()
+            )
+        ]
+
+    def _keys_and_point(self, target, use_full_datetime):
+        """Picks the seconds or days array and converts the target onto the same scale."""
+        point = int(np.datetime64(target, 's').astype(np.int64))
+        if use_full_datetime:
+            return self.seconds, point
+        return self.days, point // SECONDS_PER_DAY
+
+def _parse(guesses):
+    """Splits a name -> guess string dict into name, guess string and epoch-second arrays."""
+    names = np.array(list(guesses.keys()), dtype=object)
+    guess_strings = np.array(list(guesses.values()), dtype=object)
+    seconds = np.array(list(guesses.values()), dtype='datetime64[s]').astype(np.int64)
+    return names, guess_strings, seconds
+
+_index_cache = {}
+_index_lock = threading.Lock()
+
+def load_guess_index(guesses_file='config/guesses.jsonl'):
+    """
+    Returns the GuessIndex for a guess ledger (.jsonl), applying only the entries appended since
+    the last call, or for a plain guesses JSON file, parsing it again only when the file changes.
+    """
+    if guesses_file.endswith('.jsonl'):
+        # Imported here since the ledger itself builds on GuessIndex
+        from utils.ledger import get_guess_ledger
+        return get_guess_ledger(guesses_file).index()
+
+    mtime = os.path.getmtime(guesses_file)
+    with _index_lock:
+        cached = _index_cache.get(guesses_file)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+    with open(guesses_file) as f:
+        index = GuessIndex(json.load(f))
+    with _index_lock:
+        _index_cache[guesses_file] = (mtime, index)
+    return index
+
+def clear_guess_indexes():
+    """Forgets every GuessIndex parsed from a plain guesses JSON file."""
+    with _index_lock:
+        _index_cache.clear()
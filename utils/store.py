@@ -0,0 +1,238 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# Where the archive cache lives and how it behaves, overridable from the environment
+DEFAULT_CACHE_PATH = os.environ.get("FIRSTSNOW_CACHE_PATH", ".cache/openmeteo.sqlite")
+DEFAULT_MUTABLE_DAYS = int(os.environ.get("FIRSTSNOW_MUTABLE_DAYS", "7"))
+DEFAULT_MAX_ROWS = int(os.environ.get("FIRSTSNOW_CACHE_MAX_ROWS", "500000"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS archive_days (
+    latitude REAL NOT NULL,
+    longitude REAL NOT NULL,
+    variable TEXT NOT NULL,
+    timezone TEXT NOT NULL,
+    day TEXT NOT NULL,
+    vals TEXT NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (latitude, longitude, variable, timezone, day)
+)
+"""
+
+# Daily series are kept columnar: one row per calendar year, its values as float64 bytes
+YEARS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS archive_years (
+    latitude REAL NOT NULL,
+    longitude REAL NOT NULL,
+    variable TEXT NOT NULL,
+    timezone TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    vals BLOB NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (latitude, longitude, variable, timezone, year)
+)
+"""
+
+class ArchiveStore:
+    """
+    On-disk SQLite cache of Open-Meteo archive values, one row per location, variable and day,
+    plus whole calendar years of daily series stored as one columnar row each.
+
+    Only days older than the mutability horizon are stored, since the archive keeps revising
+    the most recent days. Once the table grows past `max_rows`, the least recently read rows
+    are evicted (each table is bounded separately).
+
+    Parameters:
+        path (str): SQLite file to use (created if missing).
+        mutable_days (int): Days before today that are still refetched instead of cached.
+        max_rows (int): Row count above which eviction kicks in.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, mutable_days=DEFAULT_MUTABLE_DAYS, max_rows=DEFAULT_MAX_ROWS):
+        self.path = path
+        self.mutable_days = mutable_days
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(SCHEMA)
+        self._conn.execute(YEARS_SCHEMA)
+        self._conn.commit()
+
+    def first_mutable_day(self, today=None):
+        """Returns the first 'YYYY-MM-DD' day that is still inside the mutability horizon."""
+        today = today or datetime.now()
+        return (today - timedelta(days=self.mutable_days)).strftime('%Y-%m-%d')
+
+    def get_days(self, latitude, longitude, variable, timezone, start_day, end_day):
+        """
+        Returns cached values for the days between `start_day` and `end_day` (inclusive).
+
+        Returns:
+            dict: Mapping of 'YYYY-MM-DD' day strings to lists of values.
+        """
+        key = (coordinate_key(latitude), coordinate_key(longitude), variable, timezone)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT day, vals FROM archive_days "
+                "WHERE latitude = ? AND longitude = ? AND variable = ? AND timezone = ? AND day BETWEEN ? AND ?",
+                key + (start_day, end_day)
+            ).fetchall()
+            if rows:
+                self._conn.execute(
+                    "UPDATE archive_days SET accessed_at = ? "
+                    "WHERE latitude = ? AND longitude = ? AND variable = ? AND timezone = ? AND day BETWEEN ? AND ?",
+                    (time.time(),) + key + (start_day, end_day)
+                )
+                self._conn.commit()
+        return {day: json.loads(vals) for day, vals in rows}
+
+    def put_days(self, latitude, longitude, variable, timezone, day_values, today=None):
+        """
+        Stores values for each day that is already outside the mutability horizon.
+
+        Parameters:
+            day_values (dict): Mapping of 'YYYY-MM-DD' day strings to lists of values.
+        """
+        first_mutable = self.first_mutable_day(today)
+        key = (coordinate_key(latitude), coordinate_key(longitude), variable, timezone)
+        now = time.time()
+        rows = [key + (day, json.dumps(vals), now) for day, vals in day_values.items() if day < first_mutable]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO archive_days VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+            self._evict("archive_days")
+
+    def get_years(self, latitude, longitude, variable, timezone, first_year, last_year):
+        """
+        Returns the cached daily series of every calendar year between `first_year` and
+        `last_year` (inclusive).
+
+        Returns:
+            dict: Mapping of year to a float array with one value per day of that year.
+        """
+        key = (coordinate_key(latitude), coordinate_key(longitude), variable, timezone)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT year, vals FROM archive_years "
+                "WHERE latitude = ? AND longitude = ? AND variable = ? AND timezone = ? AND year BETWEEN ? AND ?",
+                key + (first_year, last_year)
+            ).fetchall()
+            if rows:
+                self._conn.execute(
+                    "UPDATE archive_years SET accessed_at = ? "
+                    "WHERE latitude = ? AND longitude = ? AND variable = ? AND timezone = ? AND year BETWEEN ? AND ?",
+                    (time.time(),) + key + (first_year, last_year)
+                )
+                self._conn.commit()
+        return {year: np.frombuffer(vals, dtype=np.float64) for year, vals in rows}
+
+    def put_years(self, latitude, longitude, variable, timezone, days, values, today=None):
+        """
+        Stores every calendar year of a daily series that is complete and already outside the
+        mutability horizon.
+
+        Parameters:
+            days (np.ndarray): Consecutive datetime64[D] days.
+            values (np.ndarray): Value of each day (NaN where missing).
+        """
+        if not len(days):
+            return
+        first_mutable = np.datetime64(self.first_mutable_day(today), 'D')
+        key = (coordinate_key(latitude), coordinate_key(longitude), variable, timezone)
+        now = time.time()
+        years, first_index, counts = np.unique(days.astype('datetime64[Y]'), return_index=True, return_counts=True)
+        year_lengths = (years + 1).astype('datetime64[D]') - years.astype('datetime64[D]')
+        complete = (counts == year_lengths.astype(int)) & ((years + 1).astype('datetime64[D]') <= first_mutable)
+        values = np.asarray(values, dtype=np.float64)
+        rows = [
+            key + (int(year) + 1970, values[start:start + count].tobytes(), now)
+            for year, start, count in zip(years[complete].astype(int), first_index[complete], counts[complete])
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO archive_years VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+            self._evict("archive_years")
+
+    def _evict(self, table):
+        """Drops the least recently read rows once a table is over its size bound."""
+        count = self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        if count <= self.max_rows:
+            return
+        # Trim to 90% of the bound so eviction doesn't run on every insert
+        excess = count - int(self.max_rows * 0.9)
+        self._conn.execute(
+            f"DELETE FROM {table} WHERE rowid IN "
+            f"(SELECT rowid FROM {table} ORDER BY accessed_at LIMIT ?)",
+            (excess,)
+        )
+        self._conn.commit()
+
+    def clear(self):
+        """Removes every cached row."""
+        with self._lock:
+            self._conn.execute("DELETE FROM archive_days")
+            self._conn.execute("DELETE FROM archive_years")
+            self._conn.commit()
+
+def missing_runs(days, cached_days):
+    """
+    Groups the days that aren't cached into contiguous (first_day, last_day) runs.
+
+    Parameters:
+        days (list): Ordered 'YYYY-MM-DD' day strings that are needed.
+        cached_days (collection): Day strings already available.
+
+    Returns:
+        list: (first_day, last_day) tuples, in order.
+    """
+    runs = []
+    in_run = False
+    for day in days:
+        if day in cached_days:
+            in_run = False
+        elif in_run:
+            runs[-1] = (runs[-1][0], day)
+        else:
+            runs.append((day, day))
+            in_run = True
+    return runs
+
+def coordinate_key(value):
+    """Rounds a latitude or longitude so equal locations map to the same cache key."""
+    return round(float(value), 6)
+
+_default_store = None
+_store_disabled = not DEFAULT_CACHE_PATH
+_default_store_lock = threading.Lock()
+
+def get_archive_store():
+    """Returns the process-wide ArchiveStore, or None when caching is disabled."""
+    global _default_store
+    if _store_disabled:
+        return None
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = ArchiveStore()
+        return _default_store
+
+def set_archive_store(store):
+    """Replaces the process-wide ArchiveStore (pass None to disable caching)."""
+    global _default_store, _store_disabled
+    with _default_store_lock:
+        _default_store = store
+        _store_disabled = store is None
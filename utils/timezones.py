@@ -0,0 +1,79 @@
+import threading
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+from utils.client import get_json_many
+
+# Day asked for when looking up a location's time zone (any archived day will do)
+PROBE_DAY = "2000-01-01"
+
+# (latitude, longitude) -> IANA time zone Open-Meteo resolved the location to
+_zones = {}
+_zones_lock = threading.Lock()
+
+def get_timezones(coordinates):
+    """
+    Returns the IANA time zone (e.g. "America/Denver") of every location, as Open-Meteo's
+    timezone=auto resolves it. Locations not seen before are looked up together with one small
+    archive request; zones never change, so they are kept for the life of the process.
+
+    Parameters:
+        coordinates (list): (latitude, longitude) tuples.
+
+    Returns:
+        list: One zone name per coordinate.
+    """
+    with _zones_lock:
+        missing = list(dict.fromkeys(tuple(coordinate) for coordinate in coordinates if tuple(coordinate) not in _zones))
+    if missing:
+        probes = get_json_many("archive", missing, {
+            "start_date": PROBE_DAY,
+            "end_date": PROBE_DAY,
+            "daily": "snowfall_sum",
+            "timezone": "auto"
+        })
+        with _zones_lock:
+            for coordinate, probe in zip(missing, probes):
+                _zones[coordinate] = probe.get("timezone", "GMT")
+    with _zones_lock:
+        return [_zones[tuple(coordinate)] for coordinate in coordinates]
+
+def clear_timezones():
+    """Forgets every looked-up time zone."""
+    with _zones_lock:
+        _zones.clear()
+
+def to_local(times, zone):
+    """
+    Converts GMT times to wall-clock time in `zone`, hour by hour, so daylight saving time is
+    applied wherever it was in effect.
+
+    Parameters:
+        times (np.datetime64 or np.ndarray): GMT times.
+        zone (str): IANA time zone name.
+
+    Returns:
+        np.datetime64 or np.ndarray: Local datetime64[m] time(s), shaped like `times`.
+    """
+    utc = pd.DatetimeIndex(np.atleast_1d(times).astype('datetime64[ns]')).tz_localize("UTC")
+    local = utc.tz_convert(ZoneInfo(zone)).tz_localize(None).to_numpy().astype('datetime64[m]')
+    return local if np.ndim(times) else local[0]
+
+def to_utc(time, zone):
+    """
+    Converts a wall-clock time in `zone` to GMT. A time repeated when the clocks go back maps to
+    its first occurrence, one skipped when they go forward to the hour after.
+
+    Parameters:
+        time (datetime or np.datetime64): Local time.
+
+    Returns:
+        np.datetime64: GMT time as datetime64[m].
+    """
+    if isinstance(time, np.datetime64):
+        time = time.astype('datetime64[s]').item()
+    local = datetime(time.year, time.month, time.day, time.hour, time.minute, tzinfo=ZoneInfo(zone))
+    return np.datetime64(local.astimezone(timezone.utc).replace(tzinfo=None), 'm')
@@ -1,95 +1,197 @@
+import io
+import json
+import threading
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import matplotlib.ticker as ticker
-import streamlit as st
+from matplotlib.figure import Figure
 import plotly.express as px
 import plotly.graph_objects as go
+from plotly.subplots import make_subplots
 from datetime import datetime, timedelta
-import json
+from utils import metrics
+from utils.climatology import Climatology, day_of_season_to_date
+from utils.scoring import SECONDS_PER_DAY, load_guess_index
+
+# Above this many distinct guess times the timeline switches to WebGL with a density strip
+TIMELINE_WEBGL_THRESHOLD = 300
+
+# In the WebGL mode only the most popular guess times get a label
+TIMELINE_LABEL_COUNT = 8
+
+# Serialized timelines kept, keyed on the guess set and the snowfall state
+TIMELINE_CACHE_SIZE = 16
 
-def plot_snowfall_timeline(first_snow_date=None, winner=None, predicted_snowfall_date_openmeteo=None):
+_timeline_cache = OrderedDict()
+_timeline_lock = threading.Lock()
+
+@metrics.timed("plot")
+def plot_snowfall_timeline(first_snow_date=None, winner=None, predicted_snowfall_date_openmeteo=None,
+                           guesses_file='config/guesses.jsonl'):
     """
     Creates a Plotly timeline for snowfall guesses and the actual snowfall date if available.
 
+    Up to TIMELINE_WEBGL_THRESHOLD distinct guess times, every point is drawn with the players'
+    initials; past that, points are drawn with WebGL above a per-day density strip and only
+    the most popular times are labelled. Figures are cached serialized, keyed on the guess set,
+    the snowfall state and the current hour (for the "Today" line).
+
     Parameters:
-        guesses (dict): Dictionary of guesses with player names as keys and guess dates as values.
         first_snow_date (datetime.date, optional): The first snowfall date, if snowfall has occurred.
-        winner (str, optional): The name of the person with the closest guess, if snowfall has occurred.
+        winner (str or list, optional): The name(s) of the closest guessers, if snowfall has occurred.
+        predicted_snowfall_date_openmeteo (str, optional): Forecast first snowfall as 'YYYY-MM-DD'.
+        guesses_file (str): Guess ledger (or guesses JSON file) to plot.
 
     Returns:
         fig (plotly.graph_objects.Figure): The Plotly figure object for the timeline.
     """
-    # Prepare data for Plotly
-    with open('config/guesses.json') as f:
-        guesses = json.load(f)
-    
-    guess_data = [{"Name": name, "Date": pd.to_datetime(date)} for name, date in guesses.items()]
-    df = pd.DataFrame(guess_data)
-
-    # Group by Date and aggregate names for duplicate guesses
-    df = df.groupby("Date").agg({
-        "Name": lambda names: ', '.join(names)  # Combine names with the same date
-    }).reset_index()
+    guess_index = load_guess_index(guesses_file)
+    winners = (winner,) if isinstance(winner, str) else tuple(winner or ())
+    current_hour = datetime.now().replace(minute=0, second=0, microsecond=0)
+    key = (guesses_file, pd.Timestamp(first_snow_date) if first_snow_date else None, winners,
+           predicted_snowfall_date_openmeteo, current_hour)
+
+    with _timeline_lock:
+        cached = _timeline_cache.get(key)
+        # Guess indexes are never modified, so the same object means the same guesses
+        if cached is not None and cached[0] is guess_index:
+            _timeline_cache.move_to_end(key)
+            metrics.increment("cache_requests_total", cache="timeline_figure", result="hit")
+            # The JSON came from a validated figure, so rebuilding it can skip validation
+            return go.Figure(json.loads(cached[1]), _validate=False)
+    metrics.increment("cache_requests_total", cache="timeline_figure", result="miss")
+
+    fig = _build_timeline(guess_index, first_snow_date, winners, predicted_snowfall_date_openmeteo, current_hour)
+    with _timeline_lock:
+        _timeline_cache[key] = (guess_index, fig.to_json())
+        while len(_timeline_cache) > TIMELINE_CACHE_SIZE:
+            _timeline_cache.popitem(last=False)
+    return fig
 
-    # Set all points to the same y-axis value (e.g., "Guesses")
-    df["Category"] = "Guesses"
+def _timeline_points(guess_index):
+    """
+    Groups the (already sorted) guesses by identical time.
 
-    # Sort the data by date to connect points in chronological order
-    df = df.sort_values(by="Date")
+    Returns:
+        tuple: (starts, counts, times) with each group's first row in the index, its size and
+        its time as datetime64[s]; all empty when nobody has guessed yet.
+    """
+    seconds = guess_index.seconds
+    if not len(seconds):
+        return np.array([], dtype=int), np.array([], dtype=int), np.array([], dtype='datetime64[s]')
+    starts = np.flatnonzero(np.r_[True, seconds[1:] != seconds[:-1]])
+    counts = np.diff(np.r_[starts, len(seconds)])
+    return starts, counts, seconds[starts].astype('datetime64[s]')
+
+def _short_times(times):
+    """Formats datetime64 times as 'MM/DD HH:MM'."""
+    return [f"{t[5:7]}/{t[8:10]} {t[11:16]}" for t in np.datetime_as_string(times, unit='m').tolist()]
+
+def _build_timeline(guess_index, first_snow_date, winners, predicted_snowfall_date_openmeteo, current_hour):
+    starts, counts, times = _timeline_points(guess_index)
+    names = guess_index.names.tolist()
+    large = len(times) > TIMELINE_WEBGL_THRESHOLD
+
+    if not len(times):
+        # Nobody has guessed yet: only the snowfall markers and lines go on the axis
+        fig = go.Figure()
+        trace_position = {}
+    elif large:
+        # Guesses on top, guesses per day underneath
+        fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.6, 0.4], vertical_spacing=0.04)
+        hover = [
+            f"{count} player{'s' if count > 1 else ''}: {', '.join(names[start:start + min(count, 3)])}"
+            f"{'…' if count > 3 else ''}<br>{time}"
+            for start, count, time in zip(starts.tolist(), counts.tolist(), _short_times(times))
+        ]
+        fig.add_trace(go.Scattergl(
+            x=times,
+            y=["Guesses"] * len(times),
+            mode="markers",
+            marker=dict(size=np.clip(4 + 2 * np.sqrt(counts), 4, 18), color="blue", opacity=0.5),
+            hovertext=hover,
+            hoverinfo="text",
+            name="Guesses"
+        ), row=1, col=1)
+
+        # Label only the most popular guess times
+        popular = np.sort(np.argsort(-counts, kind='stable')[:TIMELINE_LABEL_COUNT])
+        fig.add_trace(go.Scatter(
+            x=times[popular],
+            y=["Guesses"] * len(popular),
+            mode="text",
+            text=[f"{count}" for count in counts[popular].tolist()],
+            textposition="top center",
+            hoverinfo="skip",
+            name="Most popular"
+        ), row=1, col=1)
+
+        days, per_day = np.unique(guess_index.days, return_counts=True)
+        fig.add_trace(go.Bar(
+            x=(days * SECONDS_PER_DAY + SECONDS_PER_DAY // 2).astype('datetime64[s]'),
+            y=per_day,
+            marker_color="lightsteelblue",
+            hovertemplate="%{y} guesses on %{x|%m/%d}<extra></extra>",
+            name="Guesses per day"
+        ), row=2, col=1)
+        trace_position = dict(row=1, col=1)
+    else:
+        # Initials per player, joined per guess time like the names
+        initials = [_initials(name) for name in names]
+        groups = [slice(start, start + count) for start, count in zip(starts.tolist(), counts.tolist())]
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(
+            x=times,
+            y=["Guesses"] * len(times),
+            mode="lines+markers+text",
+            marker=dict(size=10),
+            line=dict(color="blue"),
+            text=[', '.join(initials[group]) for group in groups],     # Display initials as always-visible text
+            textposition="top center",                                  # Position initials text above points
+            hovertext=[f"{', '.join(names[group])}<br>{time}"           # Full name and date/time on hover
+                       for group, time in zip(groups, _short_times(times))],
+            hoverinfo="text",
+            name="Guesses"
+        ))
+        trace_position = {}
 
-    # Add the first snowfall date as a separate entry if available, converting it to datetime
+    # Add the first snowfall on its own row if available
     if first_snow_date:
-        df = df.append({
-            "Name": "First Snowfall",
-            "Date": pd.to_datetime(first_snow_date).to_pydatetime(),
-            "Category": "First Snowfall"
-        }, ignore_index=True)
-
-    # Create custom hover text with full name and date/time
-    df["HoverText"] = df.apply(lambda row: f"{row['Name']}<br>{row['Date'].strftime('%m/%d %H:%M')}", axis=1)
-
-    # Create visible text with only initials
-    df["Initials"] = df["Name"].apply(get_initials)
-
-    # Create the Plotly figure with points and lines connecting them
-    fig = go.Figure()
-
-    # Add line trace connecting all points in chronological order with custom hover and initials for visible text
-    fig.add_trace(go.Scatter(
-        x=df["Date"],
-        y=df["Category"],
-        mode="lines+markers+text",
-        marker=dict(size=10),
-        line=dict(color="blue"),
-        text=df["Initials"],             # Display initials as always-visible text
-        textposition="top center",       # Position initials text above points
-        hovertext=df["HoverText"],       # Full name and date/time on hover
-        hoverinfo="text",
-        name="Guesses"
-    ))
-
-    # Convert current date to milliseconds since epoch
-    current_date = datetime.now().timestamp() * 1000
+        fig.add_trace(go.Scatter(
+            x=[pd.Timestamp(first_snow_date)],
+            y=["First Snowfall"],
+            mode="markers+text",
+            text=["First Snowfall"],
+            textposition="top center",
+            marker=dict(size=10, color="blue"),
+            hovertext=[f"First Snowfall<br>{pd.Timestamp(first_snow_date).strftime('%m/%d %H:%M')}"],
+            hoverinfo="text",
+            name="First Snowfall"
+        ), **trace_position)
+
     fig.add_vline(
-        x=current_date,
+        x=current_hour.timestamp() * 1000,
         line_dash="dash",
         line_color="red",
         annotation_text="Today",
         annotation_position="top"
     )
 
-    # Highlight the winner if available by adjusting marker color and size
-    if winner:
+    # Highlight the winner if available
+    if winners:
+        # The winners come from a cached result; skip anyone since removed from the guesses
+        winner_dates = sorted({guess_index.guess_time(name) for name in winners if name in guess_index})
         fig.add_trace(go.Scatter(
-            x=[df.loc[df["Name"].str.contains(winner), "Date"].values[0]],
-            y=["Guesses"],
+            x=winner_dates,
+            y=["Guesses"] * len(winner_dates),
             mode="markers+text",
-            text=["Winner"],
+            text=["Winner"] * len(winner_dates),
             textposition="top center",
             marker=dict(size=12, color="gold", symbol="star"),
             name="Winner"
-        ))
+        ), **trace_position)
 
     # Add Open-Meteo forecasted snowfall date vline if available
     if predicted_snowfall_date_openmeteo:
@@ -111,42 +213,47 @@ def plot_snowfall_timeline(first_snow_date=None, winner=None, predicted_snowfall
 
     return fig
 
+# Rendered historical charts kept, and the resolution they are rasterized at
+HISTORICAL_CHART_CACHE_SIZE = 32
+HISTORICAL_CHART_DPI = 100
+
+_historical_chart_cache = OrderedDict()
+_historical_chart_lock = threading.Lock()
+
+@metrics.timed("plot")
 def plot_historical_snowfall(historical_df):
     """
     Create a Matplotlib bar chart showing the frequency of first snowfall dates.
-    """
-    # Convert to datetime if not already
-    historical_df['first_snowfall_date'] = pd.to_datetime(historical_df['first_snowfall_date'])
-
-    # Extract month and day, ignore the year
-    historical_df['month_day'] = historical_df['first_snowfall_date'].apply(lambda x: x.strftime('%m-%d'))
-
-    # Count the occurrences of each month_day
-    snowfall_counts = historical_df['month_day'].value_counts().sort_index()
+    Dates are placed by day of the July-June season, and the DataFrame is not modified.
 
-    # Convert month_day back to datetime for plotting, assuming a common year (e.g., 2023)
-    snowfall_counts.index = pd.to_datetime(snowfall_counts.index, format='%m-%d').map(lambda x: x.replace(year=2023))
+    The figure is not registered with pyplot, so it is freed as soon as the caller drops it.
+    """
+    # Count first snowfalls per day of the season
+    counts, day_numbers = Climatology.from_dataframe(historical_df).histogram()
+    observed = counts > 0
+    snowfall_counts = pd.Series(
+        counts[observed],
+        index=pd.to_datetime(day_of_season_to_date(day_numbers[observed]))
+    )
 
     # Determine the x-axis limits based on the data with a 2-day buffer
     start_date = snowfall_counts.index.min() - pd.DateOffset(days=2)
     end_date = snowfall_counts.index.max() + pd.DateOffset(days=2)
 
     # Create the plot
-    fig, ax = plt.subplots(figsize=(10, 5))
+    fig = Figure(figsize=(10, 5))
+    ax = fig.subplots()
     bars = ax.bar(snowfall_counts.index, snowfall_counts.values, color='skyblue', edgecolor='black')
 
     # Set x-axis limits to show the 2-day buffer
     ax.set_xlim(start_date, end_date)
 
     # Set x-axis to show only months
-    ax.xaxis.set_major_formatter(plt.matplotlib.dates.DateFormatter('%b'))
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%b'))
     ax.set_xticks(pd.date_range(start=start_date, end=end_date, freq='MS'))
 
     # Annotate each bar with the corresponding day of the month
-    for bar, date in zip(bars, snowfall_counts.index):
-        height = bar.get_height()
-        day = date.strftime('%d')
-        ax.text(bar.get_x() + bar.get_width() / 2, height, day, ha='center', va='bottom')
+    ax.bar_label(bars, labels=snowfall_counts.index.strftime('%d'))
 
     # Set y-axis to only show whole numbers
     ax.yaxis.set_major_locator(ticker.MaxNLocator(integer=True))
@@ -156,9 +263,59 @@ def plot_historical_snowfall(historical_df):
     ax.set_ylabel('Number of Occurrences')
     ax.set_title('First Snowfall Frequency by Calendar Day')
 
-    plt.tight_layout()
+    fig.tight_layout()
     return fig
 
+def render_historical_chart(historical_df, image_format="png"):
+    """
+    Renders the historical chart to image bytes, once per distinct history.
+
+    Charts are kept in an LRU of HISTORICAL_CHART_CACHE_SIZE entries keyed on the seasons and
+    first snow dates, so reruns and other sessions for the same data never build a figure.
+
+    Parameters:
+        historical_df (pd.DataFrame): get_historical_snowfall output.
+        image_format (str): "png" or "svg".
+
+    Returns:
+        bytes: The encoded image.
+    """
+    key = (
+        image_format,
+        tuple(historical_df['year'].tolist()),
+        tuple(historical_df['first_snowfall_date'].dt.strftime('%Y-%m-%d').tolist())
+    )
+    with _historical_chart_lock:
+        image = _historical_chart_cache.get(key)
+        if image is not None:
+            _historical_chart_cache.move_to_end(key)
+            metrics.increment("cache_requests_total", cache="historical_chart", result="hit")
+            return image
+    metrics.increment("cache_requests_total", cache="historical_chart", result="miss")
+
+    fig = plot_historical_snowfall(historical_df)
+    buffer = io.BytesIO()
+    try:
+        fig.savefig(buffer, format=image_format, dpi=HISTORICAL_CHART_DPI)
+    finally:
+        # Drop the artists right away instead of waiting for garbage collection
+        fig.clear()
+    image = buffer.getvalue()
+
+    with _historical_chart_lock:
+        _historical_chart_cache[key] = image
+        while len(_historical_chart_cache) > HISTORICAL_CHART_CACHE_SIZE:
+            _historical_chart_cache.popitem(last=False)
+    return image
+
+def clear_caches():
+    """Forgets every cached timeline and historical chart."""
+    with _timeline_lock:
+        _timeline_cache.clear()
+    with _historical_chart_lock:
+        _historical_chart_cache.clear()
+
+@metrics.timed("plot")
 def plot_snowfall_data(snowfall_df):
     """
     Creates a Plotly line chart of snowfall data over a specified period.
@@ -188,6 +345,9 @@ def plot_snowfall_data(snowfall_df):
 
 def get_initials(names):
     """Helper function to get initials from one or multiple names."""
-    initials_list = [f"{name.split()[0][0]}{name.split()[1][0]}" if len(name.split()) > 1 else name[0]
-                     for name in names.split(', ')]
-    return ', '.join(initials_list)
\ No newline at end of file
+    return ', '.join(_initials(name) for name in names.split(', '))
+
+def _initials(name):
+    """First letters of a player's first two names (or just the first letter of a single name)."""
+    parts = name.split()
+    return f"{parts[0][0]}{parts[1][0]}" if len(parts) > 1 else name[:1]
@@ -1,78 +1,178 @@
+import numpy as np
 import pandas as pd
-import requests
-import json
-from datetime import datetime, timedelta
-
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import chain
+from utils import metrics
+from utils.client import get_json, get_json_many
+from utils.climatology import Climatology, first_snow_by_season
+from utils.hourly_archive import get_hourly_archive
+from utils.neighborhood import distinct_cells, site_cells
+from utils.scoring import load_guess_index
+from utils.store import get_archive_store, missing_runs
+
+# Longest window requested from the archive endpoint in a single call, per resolution
+ARCHIVE_CHUNK_DAYS = 366
+ARCHIVE_DAILY_CHUNK_DAYS = 20 * 366
+
+# Upper bound on archive chunks one call requests at the same time (all upstream requests of
+# the process are further capped by utils.client.MAX_CONCURRENT_REQUESTS)
+ARCHIVE_MAX_CONCURRENCY = 4
+
+# Daily archive variables that can be summed from a backfilled hourly series instead
+HOURLY_SOURCES = {"snowfall_sum": "snowfall"}
+
+# Start of the current game's snowfall window
+GAME_START_DATE = datetime(2024, 9, 1)
+
+@metrics.timed("fetch")
 def get_historical_snowfall(latitude, longitude, start_year, end_year):
     """
-    Fetch historical snowfall data from the Open-Meteo API for the specified location and years.
-    Filters data to include only dates after July 1st and returns the first snowfall after summer each year.
-    """
-    all_snowfall_data = []
-
-    for year in range(start_year, end_year + 1):
-        url = (
-            f"https://archive-api.open-meteo.com/v1/archive?latitude={latitude}&longitude={longitude}&"
-            f"start_date={year}-07-01&end_date={year}-12-31&daily=snowfall_sum&timezone=auto"
-        )
+    Fetch historical snowfall data from the Open-Meteo API for the specified location and seasons.
+    Seasons run from July 1st to June 30th, and the first snowfall of each season is returned
+    with the season's starting year, so a first snow in January still counts.
 
-        response = requests.get(url)
-        data = response.json()
+    The whole span is loaded with fetch_daily_archive_arrays (one archive request per 20 years,
+    run in parallel) and reduced with NumPy, so longer histories cost almost nothing extra.
+    """
+    return get_historical_snowfall_many([(latitude, longitude)], start_year, end_year)[0]
 
-        if 'daily' in data and 'snowfall_sum' in data['daily']:
-            for i, date in enumerate(data['daily']['time']):
-                snowfall_amount = data['daily']['snowfall_sum'][i]
-                if snowfall_amount > 0:
-                    all_snowfall_data.append({
-                        'date': date,
-                        'snowfall': snowfall_amount
-                    })
+@metrics.timed("fetch")
+def get_historical_snowfall_many(coordinates, start_year, end_year):
+    """
+    get_historical_snowfall for many locations, sharing each archive request between them.
 
-    # Convert to DataFrame
-    snowfall_df = pd.DataFrame(all_snowfall_data)
-    if snowfall_df.empty:
-        print("No snowfall data was retrieved from the API.")  # Replace st.error with print for backend debugging
-        return pd.DataFrame()  # Return an empty DataFrame
+    Returns:
+        list: One DataFrame per coordinate.
+    """
+    frames = []
+    for days, snowfall in fetch_daily_archive_arrays_many(
+        coordinates, datetime(start_year, 7, 1), datetime(end_year + 1, 6, 30), "snowfall_sum"
+    ):
+        # NaN compares as False, so missing days never count as snow
+        seasons, first_days = first_snow_by_season(days, snowfall)
+        if seasons.size == 0:
+            print("No snowfall data was retrieved from the API.")  # Replace st.error with print for backend debugging
+            frames.append(pd.DataFrame())  # Return an empty DataFrame
+            continue
+
+        frames.append(pd.DataFrame({
+            'year': seasons,
+            'first_snowfall_date': pd.to_datetime(first_days)
+        }))
+    return frames
+
+@metrics.timed("fetch")
+def fetch_daily_archive_arrays(latitude, longitude, start_date, end_date, variable):
+    """
+    Fetches a daily archive variable as columnar NumPy arrays.
 
-    # print("Snowfall DataFrame:", snowfall_df)  # Debugging output to inspect the DataFrame
+    Parameters:
+        start_date (datetime): First date of the range (inclusive).
+        end_date (datetime): Last date of the range (inclusive).
+        variable (str): Daily Open-Meteo variable name, e.g. "snowfall_sum".
 
-    snowfall_df['date'] = pd.to_datetime(snowfall_df['date'])
+    Returns:
+        tuple: (days, values) where days is a datetime64[D] array and values a float array
+        with NaN for missing data.
+    """
+    return fetch_daily_archive_arrays_many([(latitude, longitude)], start_date, end_date, variable)[0]
 
-    # Extract the year from the date to avoid inserting a duplicate column
-    snowfall_df['year'] = snowfall_df['date'].dt.year
+def fetch_daily_archive_arrays_many(coordinates, start_date, end_date, variable):
+    """
+    fetch_daily_archive_arrays for many locations; returns one (days, values) tuple per coordinate.
 
-    # Group by year and find the first snowfall after July 1st for each year
-    first_snowfall = snowfall_df.groupby('year')['date'].min().reset_index()
-    first_snowfall.columns = ['year', 'first_snowfall_date']
+    Where a backfilled hourly series (utils.hourly_archive) covers the start of the range, its
+    days are summed straight from the memory-mapped file and only the days after it are fetched.
+    """
+    archive = get_hourly_archive() if variable in HOURLY_SOURCES else None
+    stored = [None] * len(coordinates)
+    # First day each location still needs from the archive endpoint
+    fetch_from = {}
+    for i, coordinate in enumerate(coordinates):
+        fetch_from[i] = start_date
+        sums = archive.daily_sums(*coordinate, start_date, end_date, HOURLY_SOURCES[variable]) if archive else None
+        if sums is not None and sums[0][0] == np.datetime64(start_date.strftime('%Y-%m-%d'), 'D'):
+            stored[i] = sums
+            fetch_from[i] = (sums[0][-1] + 1).astype('datetime64[s]').item()
+
+    groups = {}
+    for i, first_day in fetch_from.items():
+        groups.setdefault(first_day, []).append(i)
+    arrays = [None] * len(coordinates)
+    for first_day, indices in groups.items():
+        for i, (days, values) in zip(indices, _daily_archive_arrays_many([coordinates[i] for i in indices],
+                                                                         first_day, end_date, variable)):
+            if stored[i] is not None:
+                days = np.concatenate([stored[i][0], days])
+                values = np.concatenate([stored[i][1], values])
+            arrays[i] = (days, values)
+    return arrays
+
+def _daily_archive_arrays_many(coordinates, start_date, end_date, variable, timezone="auto"):
+    """
+    Loads a daily archive variable for many locations without going through per-day values.
 
-    # print("First Snowfall DataFrame:", first_snowfall)  # Debugging output to inspect the DataFrame
+    Complete calendar years are served from the archive store, one columnar row per year. The
+    years a location is missing are requested whole (so they can be stored in turn), and the
+    JSON arrays go straight into NumPy. Days after today are left out.
 
-    return first_snowfall
+    Returns:
+        list: One (days datetime64[D], values float) tuple per coordinate.
+    """
+    start_day = np.datetime64(start_date.strftime('%Y-%m-%d'), 'D')
+    today = np.datetime64(datetime.now().strftime('%Y-%m-%d'), 'D')
+    last_day = min(np.datetime64(end_date.strftime('%Y-%m-%d'), 'D'), today)
+    if start_day > last_day:
+        return [(np.array([], dtype='datetime64[D]'), np.array([], dtype=float)) for _ in coordinates]
+    years = (np.arange(start_day.astype('datetime64[Y]'), last_day.astype('datetime64[Y]') + 1).astype(int) + 1970).tolist()
+
+    store = get_archive_store()
+    series = f"daily:{variable}"
+    # Per location, (days, values) pieces that together cover its years
+    pieces = []
+    # Locations grouped by the runs of years they still need
+    needs = {}
+    for i, (latitude, longitude) in enumerate(coordinates):
+        cached = store.get_years(latitude, longitude, series, timezone, years[0], years[-1]) if store else {}
+        if store:
+            metrics.increment("cache_requests_total", len(cached), cache="archive_years", result="hit")
+            metrics.increment("cache_requests_total", len(years) - len(cached), cache="archive_years", result="miss")
+        pieces.append([
+            (np.datetime64(f"{year}-01-01", 'D') + np.arange(len(values)).astype('timedelta64[D]'), values)
+            for year, values in cached.items()
+        ])
+        runs = tuple(missing_runs(years, cached))
+        if runs:
+            needs.setdefault(runs, []).append(i)
+
+    for runs, indices in needs.items():
+        for first_year, last_year in runs:
+            run_arrays = _request_archive_arrays(
+                [coordinates[i] for i in indices], np.datetime64(f"{first_year}-01-01", 'D'),
+                min(np.datetime64(f"{last_year}-12-31", 'D'), today), variable, "daily", timezone, ARCHIVE_DAILY_CHUNK_DAYS
+            )
+            for i, (days, values) in zip(indices, run_arrays):
+                if store:
+                    store.put_years(*coordinates[i], series, timezone, days, values)
+                pieces[i].append((days, values))
+
+    arrays = []
+    for location_pieces in pieces:
+        days = np.concatenate([np.array([], dtype='datetime64[D]')] + [days for days, _ in location_pieces])
+        values = np.concatenate([np.array([], dtype=float)] + [values for _, values in location_pieces])
+        order = np.argsort(days, kind='stable')
+        days, values = days[order], values[order]
+        in_range = (days >= start_day) & (days <= last_day)
+        arrays.append((days[in_range], values[in_range]))
+    return arrays
 
 def calculate_snowfall_statistics(historical_df):
     """
-    Calculate the earliest, latest, and average first snowfall day after summer for the given historical data.
-    Ensure correct handling of dates by focusing only on month and day.
+    Calculate the earliest, latest, and median first snowfall day of the season for the given historical data.
+    Days are compared by their position in the July-June season, and the DataFrame is not modified.
     """
-    # Convert to datetime if not already
-    historical_df['first_snowfall_date'] = pd.to_datetime(historical_df['first_snowfall_date'])
-
-    # Extract month and day (ignore the year)
-    historical_df['month_day'] = historical_df['first_snowfall_date'].apply(lambda x: x.strftime('%m-%d'))
-
-    # Calculate earliest and latest snowfall dates based on month and day, ignoring year
-    earliest_day_date = historical_df['month_day'].min()
-    latest_day_date = historical_df['month_day'].max()
-
-    # Convert back to a readable format (just add a placeholder year for formatting)
-    earliest_day = pd.to_datetime(earliest_day_date, format='%m-%d').strftime('%B %d')
-    latest_day = pd.to_datetime(latest_day_date, format='%m-%d').strftime('%B %d')
-
-    # Calculate average day of the year and convert back to a date
-    average_day_of_year = historical_df['first_snowfall_date'].dt.dayofyear.mean()
-    average_day = pd.to_datetime(average_day_of_year, format='%j').strftime('%B %d')
-
-    return earliest_day, latest_day, average_day
+    return Climatology.from_dataframe(historical_df).summary()
 
 def predict_first_snowfall_openmeteo(forecast_data):
     """
@@ -91,118 +191,371 @@ def predict_first_snowfall_openmeteo(forecast_data):
     else:
         return None  # No snowfall predicted
 
+@metrics.timed("fetch")
 def get_openmeteo_forecast(latitude, longitude):
     """
     Fetch weather forecast data from the Open-Meteo API for the given location.
     """
-    url = f"https://api.open-meteo.com/v1/forecast?latitude={latitude}&longitude={longitude}&daily=snowfall_sum&timezone=auto"
-
-    response = requests.get(url)
-    forecast_data = response.json()
+    return get_openmeteo_forecast_many([(latitude, longitude)])[0]
 
-    parsed_data = []
-    for i, date in enumerate(forecast_data['daily']['time']):
-        parsed_data.append({
-            "date": date,
-            "snow": forecast_data['daily']['snowfall_sum'][i]
-        })
+@metrics.timed("fetch")
+def get_openmeteo_forecast_many(coordinates):
+    """
+    Fetches the daily snowfall forecast of many locations with one multi-coordinate request.
 
-    return parsed_data
+    Parameters:
+        coordinates (list): (latitude, longitude) tuples.
 
+    Returns:
+        list: One get_openmeteo_forecast-style list of {"date", "snow"} dicts per coordinate.
+    """
+    responses = get_json_many("forecast", coordinates, {
+        "daily": "snowfall_sum",
+        "timezone": "auto"
+    })
+
+    forecasts = []
+    for forecast_data in responses:
+        parsed_data = []
+        for i, date in enumerate(forecast_data['daily']['time']):
+            parsed_data.append({
+                "date": date,
+                "snow": forecast_data['daily']['snowfall_sum'][i]
+            })
+        forecasts.append(parsed_data)
+
+    return forecasts
+
+@metrics.timed("fetch")
 def fetch_daily_snowfall_openmeteo(latitude, longitude, date):
-    """Fetches daily total snowfall in inches for a specific date from Open-Meteo."""
+    """
+    Fetches daily total snowfall in inches for a specific date from Open-Meteo.
+
+    Raises utils.client.OpenMeteoError if the archive could not be reached.
+    """
     formatted_date = date.strftime('%Y-%m-%d')
-    response = requests.get(
-        "https://archive-api.open-meteo.com/v1/archive",
-        params={
-            "latitude": latitude,
-            "longitude": longitude,
-            "start_date": formatted_date,
-            "end_date": formatted_date,
-            "hourly": "snowfall"
-        }
-    )
-    if response.status_code == 200:
-        data = response.json()
-        hourly_snowfall = data.get("hourly", {}).get("snowfall", [])
-        total_snowfall_mm = sum(val for val in hourly_snowfall if val is not None)
-        # Convert from mm to inches and round to 2 decimal places
-        return round(total_snowfall_mm / 25.4, 2)
-    return 0.0  # Default to zero if no data
+    data = get_json("archive", {
+        "latitude": latitude,
+        "longitude": longitude,
+        "start_date": formatted_date,
+        "end_date": formatted_date,
+        "hourly": "snowfall"
+    })
+    hourly_snowfall = data.get("hourly", {}).get("snowfall", [])
+    total_snowfall_mm = sum(val for val in hourly_snowfall if val is not None)
+    # Convert from mm to inches and round to 2 decimal places
+    return round(total_snowfall_mm / 25.4, 2)
+
+@metrics.timed("fetch")
+def fetch_archive_days(latitude, longitude, start_date, end_date, variable="snowfall", resolution="hourly",
+                       timezone="GMT", chunk_days=None):
+    """
+    Fetches one archive variable for every day in a range, grouped by day.
 
+    Days already held in the on-disk archive store are served from it; only the missing
+    (or still mutable) runs of days are requested, chunked into at most `chunk_days` per call
+    with up to ARCHIVE_MAX_CONCURRENCY chunks in flight. Days after today are left out since
+    the archive has no data for them yet. Raises utils.client.OpenMeteoError if a chunk could
+    not be fetched.
+
+    Parameters:
+        start_date (datetime): First date of the range (inclusive).
+        end_date (datetime): Last date of the range (inclusive).
+        variable (str): Open-Meteo variable name, e.g. "snowfall" or "snowfall_sum".
+        resolution (str): "hourly" or "daily".
+        timezone (str): Timezone the days are aligned to ("GMT" or "auto").
+        chunk_days (int, optional): Maximum number of days requested per archive call. Defaults to
+            ARCHIVE_CHUNK_DAYS for hourly data and ARCHIVE_DAILY_CHUNK_DAYS for daily data.
+
+    Returns:
+        dict: Mapping of 'YYYY-MM-DD' day strings to the list of values for that day.
+    """
+    return fetch_archive_days_many([(latitude, longitude)], start_date, end_date, variable, resolution,
+                                   timezone, chunk_days)[0]
+
+@metrics.timed("fetch")
+def fetch_archive_days_many(coordinates, start_date, end_date, variable="snowfall", resolution="hourly",
+                            timezone="GMT", chunk_days=None):
+    """
+    fetch_archive_days for many locations at once.
+
+    Each location is served from the archive store as far as possible; locations missing the
+    same runs of days (the usual case) are then requested together, one multi-coordinate call
+    per chunk instead of one call per location and chunk.
+
+    Parameters:
+        coordinates (list): (latitude, longitude) tuples.
+
+    Returns:
+        list: One fetch_archive_days-style dict per coordinate.
+    """
+    start_day = np.datetime64(start_date.strftime('%Y-%m-%d'), 'D')
+    last_day = min(np.datetime64(end_date.strftime('%Y-%m-%d'), 'D'),
+                   np.datetime64(datetime.now().strftime('%Y-%m-%d'), 'D'))
+    if start_day > last_day:
+        return [{} for _ in coordinates]
+    days = np.arange(start_day, last_day + 1).astype(str).tolist()
+    if chunk_days is None:
+        chunk_days = ARCHIVE_DAILY_CHUNK_DAYS if resolution == "daily" else ARCHIVE_CHUNK_DAYS
+
+    store = get_archive_store()
+    series_key = (f"{resolution}:{variable}", timezone)
+    results = []
+    # Locations grouped by the runs of days they still need
+    needs = {}
+    for i, (latitude, longitude) in enumerate(coordinates):
+        cached = store.get_days(latitude, longitude, *series_key, days[0], days[-1]) if store else {}
+        if store:
+            metrics.increment("cache_requests_total", len(cached), cache="archive_store", result="hit")
+            metrics.increment("cache_requests_total", len(days) - len(cached), cache="archive_store", result="miss")
+        results.append(cached)
+        runs = tuple(missing_runs(days, cached))
+        if runs:
+            needs.setdefault(runs, []).append(i)
+
+    for runs, indices in needs.items():
+        fetched = [{} for _ in indices]
+        for run_start, run_end in runs:
+            run_values = _request_archive_days(
+                [coordinates[i] for i in indices], run_start, run_end, variable, resolution, timezone, chunk_days
+            )
+            for location_fetched, location_values in zip(fetched, run_values):
+                location_fetched.update(location_values)
+        for i, location_fetched in zip(indices, fetched):
+            if store and location_fetched:
+                store.put_days(*coordinates[i], *series_key, location_fetched)
+            results[i].update(location_fetched)
+
+    return [{day: cached[day] for day in days if day in cached} for cached in results]
+
+def _request_archive_days(coordinates, first_day, last_day, variable, resolution, timezone, chunk_days):
+    """
+    Requests a run of days for a group of locations from the archive endpoint, in parallel
+    chunks, and groups each location's values by day.
+
+    Returns:
+        list: One dict of day -> values per coordinate.
+    """
+    def request_chunk(chunk):
+        responses = get_json_many("archive", coordinates, _archive_params(chunk, variable, resolution, timezone))
+        return [
+            _group_by_day(data.get(resolution, {}).get("time", []), data.get(resolution, {}).get(variable, []))
+            for data in responses
+        ]
+
+    chunks = _archive_chunk_ranges(first_day, last_day, chunk_days)
+    if len(chunks) == 1:
+        return request_chunk(chunks[0])
+
+    day_values = [{} for _ in coordinates]
+    with ThreadPoolExecutor(max_workers=min(ARCHIVE_MAX_CONCURRENCY, len(chunks))) as executor:
+        for chunk_values in executor.map(request_chunk, chunks):
+            for location_values, location_chunk in zip(day_values, chunk_values):
+                location_values.update(location_chunk)
+    return day_values
+
+def _request_archive_arrays(coordinates, first_day, last_day, variable, resolution, timezone, chunk_days):
+    """
+    _request_archive_days without the grouping: each location's times and values go straight
+    from the JSON arrays into NumPy and the chunks are concatenated.
+
+    Returns:
+        list: One (times, values) tuple per coordinate, times datetime64[D] for daily data and
+        datetime64[m] for hourly data, values float with NaN where missing.
+    """
+    unit = 'datetime64[D]' if resolution == "daily" else 'datetime64[m]'
+
+    def request_chunk(chunk):
+        responses = get_json_many("archive", coordinates, _archive_params(chunk, variable, resolution, timezone))
+        return [
+            (np.array(data.get(resolution, {}).get("time", []), dtype=unit),
+             np.array(data.get(resolution, {}).get(variable, []), dtype=float))
+            for data in responses
+        ]
+
+    chunks = _archive_chunk_ranges(first_day, last_day, chunk_days)
+    if len(chunks) == 1:
+        return request_chunk(chunks[0])
+
+    with ThreadPoolExecutor(max_workers=min(ARCHIVE_MAX_CONCURRENCY, len(chunks))) as executor:
+        chunk_arrays = list(executor.map(request_chunk, chunks))
+    return [
+        (np.concatenate([arrays[i][0] for arrays in chunk_arrays]), np.concatenate([arrays[i][1] for arrays in chunk_arrays]))
+        for i in range(len(coordinates))
+    ]
+
+def _archive_chunk_ranges(first_day, last_day, chunk_days):
+    """Splits a run of days into (start, end) 'YYYY-MM-DD' chunks of at most `chunk_days` days."""
+    chunks = []
+    chunk_start = np.datetime64(first_day, 'D')
+    last_day = np.datetime64(last_day, 'D')
+    while chunk_start <= last_day:
+        chunk_end = min(chunk_start + chunk_days - 1, last_day)
+        chunks.append((str(chunk_start), str(chunk_end)))
+        chunk_start = chunk_end + 1
+    return chunks
+
+def _archive_params(chunk, variable, resolution, timezone):
+    return {
+        "start_date": chunk[0],
+        "end_date": chunk[1],
+        resolution: variable,
+        "timezone": timezone
+    }
+
+def _group_by_day(times, values):
+    """Splits a flat time series into per-day value lists keyed by 'YYYY-MM-DD'."""
+    if not times:
+        return {}
+    days = np.array(times, dtype='datetime64[m]').astype('datetime64[D]')
+    unique_days, first_index = np.unique(days, return_index=True)
+    bounds = first_index.tolist() + [len(values)]
+    return {day: values[bounds[i]:bounds[i + 1]] for i, day in enumerate(unique_days.astype(str).tolist())}
+
+@metrics.timed("fetch")
+def fetch_snowfall_range_openmeteo(latitude, longitude, start_date, end_date, chunk_days=None):
+    """
+    Fetches daily total snowfall in inches for every date in a range from Open-Meteo.
+
+    The hourly values come from fetch_archive_days, so the whole window costs a handful of
+    archive requests at most, and are summed per day to the same totals as calling
+    fetch_daily_snowfall_openmeteo for each date.
+
+    Parameters:
+        start_date (datetime): First date of the range (inclusive).
+        end_date (datetime): Last date of the range (inclusive).
+        chunk_days (int, optional): Maximum number of days requested per archive call.
+
+    Returns:
+        dict: Mapping of 'YYYY-MM-DD' date strings to snowfall in inches.
+    """
+    return fetch_snowfall_range_many([(latitude, longitude)], start_date, end_date, chunk_days)[0]
+
+def fetch_snowfall_range_many(coordinates, start_date, end_date, chunk_days=None):
+    """fetch_snowfall_range_openmeteo for many locations; returns one dict per coordinate."""
+    # Default every day to zero; days after today have no archive data yet
+    all_days = np.arange(np.datetime64(start_date.strftime('%Y-%m-%d'), 'D'),
+                         np.datetime64(end_date.strftime('%Y-%m-%d'), 'D') + 1).astype(str).tolist()
+
+    ranges = []
+    for hourly_snowfall in fetch_archive_days_many(coordinates, start_date, end_date, chunk_days=chunk_days):
+        totals = dict.fromkeys(all_days, 0.0)
+        totals.update(_sum_by_day(hourly_snowfall))
+        ranges.append(totals)
+    return ranges
+
+def _sum_by_day(day_values):
+    """Sums per-day hourly snowfall lists (mm) into daily totals in inches, in one array reduction."""
+    if not day_values:
+        return {}
+    lengths = np.array([len(values) for values in day_values.values()])
+    # Missing hours come back as None and count as no snowfall
+    amounts = np.nan_to_num(np.array(list(chain.from_iterable(day_values.values())), dtype=float))
+    daily_mm = np.bincount(np.repeat(np.arange(len(lengths)), lengths), weights=amounts, minlength=len(lengths))
+    # Convert from mm to inches and round to 2 decimal places
+    daily_inches = [round(total_mm / 25.4, 2) for total_mm in daily_mm.tolist()]
+    return dict(zip(day_values.keys(), daily_inches))
+
+@metrics.timed("fetch")
 def get_snowfall_data_df(latitude, longitude, start_date, end_date):
     """
     Retrieves daily snowfall data for a specified date range and returns it as a DataFrame.
     """
-    snowfall_data = []
+    return get_snowfall_data_df_many([(latitude, longitude)], start_date, end_date)[0]
 
-    # Loop through each date in the range and fetch snowfall data
-    for date in (start_date + timedelta(n) for n in range((end_date - start_date).days + 1)):
-        daily_snowfall = fetch_daily_snowfall_openmeteo(latitude, longitude, date)
-        snowfall_data.append({"Date": date.strftime('%Y-%m-%d'), "Snowfall (inches)": daily_snowfall})
+def get_snowfall_data_df_many(coordinates, start_date, end_date, neighborhoods=None):
+    """
+    get_snowfall_data_df for many locations; returns one DataFrame per coordinate.
 
-    # Convert to DataFrame and ensure the Date column is in datetime format
-    snowfall_df = pd.DataFrame(snowfall_data)
-    snowfall_df["Date"] = pd.to_datetime(snowfall_df["Date"])
-    return snowfall_df
+    A location with a neighborhood (utils.neighborhood) gets its cells' daily snowfall
+    aggregated over its distinct model cells; the cells are fetched in the same requests as
+    every other location.
+    """
+    neighborhoods = neighborhoods or [None] * len(coordinates)
+    sites = site_cells(coordinates, neighborhoods)
+    # Fetch the whole range in as few archive requests as possible
+    ranges = iter(fetch_snowfall_range_many([cell for cells in sites for cell in cells], start_date, end_date))
+
+    frames = []
+    for cells, neighborhood in zip(sites, neighborhoods):
+        cell_ranges = [next(ranges) for _ in cells]
+        daily_snowfall = cell_ranges[0]
+        if neighborhood is not None:
+            # Points the responses put in the same model cell are counted once
+            cell_ranges = [cell_ranges[k] for k in distinct_cells(cells)]
+            values = neighborhood.combine([list(cell_range.values()) for cell_range in cell_ranges])
+            daily_snowfall = dict(zip(daily_snowfall.keys(), np.round(values, 2).tolist()))
+        # Convert to DataFrame and ensure the Date column is in datetime format
+        snowfall_df = pd.DataFrame({
+            "Date": list(daily_snowfall.keys()),
+            "Snowfall (inches)": list(daily_snowfall.values())
+        })
+        snowfall_df["Date"] = pd.to_datetime(snowfall_df["Date"])
+        frames.append(snowfall_df)
+    return frames
 
-def get_recent_snowfall_data(latitude, longitude):
+@metrics.timed("fetch")
+def get_recent_snowfall_data(latitude, longitude, neighborhood=None):
     """
-    Fetches recent snowfall data from September 1, 2024, to the current date.
+    Fetches recent snowfall data from GAME_START_DATE (September 1, 2024) to the current date,
+    aggregated over the neighborhood if one is given.
     """
-    start_date = datetime(2024, 9, 1)
+    return get_recent_snowfall_data_many([(latitude, longitude)], [neighborhood])[0]
+
+@metrics.timed("fetch")
+def get_recent_snowfall_data_many(coordinates, neighborhoods=None):
+    """get_recent_snowfall_data for many locations; returns one DataFrame per coordinate."""
+    start_date = GAME_START_DATE
     end_date = datetime.now()
-    return get_snowfall_data_df(latitude, longitude, start_date, end_date)
+    return get_snowfall_data_df_many(coordinates, start_date, end_date, neighborhoods)
 
+@metrics.timed("fetch")
 def get_test_snowfall_data(latitude, longitude):
     """
     Fetches test snowfall data for January 2023.
     """
+    return get_test_snowfall_data_many([(latitude, longitude)])[0]
+
+@metrics.timed("fetch")
+def get_test_snowfall_data_many(coordinates):
+    """get_test_snowfall_data for many locations; returns one DataFrame per coordinate."""
     start_date = datetime(2023, 1, 1)
     end_date = datetime(2023, 1, 31)
-    return get_snowfall_data_df(latitude, longitude, start_date, end_date)
+    return get_snowfall_data_df_many(coordinates, start_date, end_date)
 
-def check_for_recent_snowfall(snowfall_df, guesses_file='config/guesses.json'):
+def check_for_recent_snowfall(snowfall_df, guesses_file='config/guesses.jsonl'):
     """
     Checks if recent snowfall has occurred and determines the closest guess if snow has fallen.
 
     Parameters:
         snowfall_df (pd.DataFrame): DataFrame containing recent snowfall data.
-        guesses_file (str): Path to the JSON file with guesses.
+        guesses_file (str): Path to the guess ledger (or a guesses JSON file).
 
     Returns:
-        dict: A dictionary with keys "snowfall_occurred", "first_snow_date", and "winner" (if snowfall occurred).
+        dict: A dictionary with keys "snowfall_occurred", "first_snow_date", "winner" (if snowfall
+        occurred, tied names joined with " & ") and "winners" (list of the tied names).
     """
-    # Load guesses from JSON file
-    with open(guesses_file) as f:
-        guesses = json.load(f)
-
     # Check if any snowfall has been recorded
     snowfall_occurred = snowfall_df[snowfall_df["Snowfall (inches)"] > 0]
     if not snowfall_occurred.empty:
         # Find the first date it snowed
         first_snow_date = snowfall_occurred["Date"].min()
 
-        # Determine the closest guess
-        closest_guess = None
-        min_diff = float('inf')
-        for person, guess_date_str in guesses.items():
-            guess_date = datetime.strptime(guess_date_str, '%Y-%m-%d').date()
-            diff = abs((first_snow_date - guess_date).days)
-            if diff < min_diff:
-                min_diff = diff
-                closest_guess = person
+        # Determine the closest guess (by day, since the data is daily)
+        winners = load_guess_index(guesses_file).closest(first_snow_date, use_full_datetime=False)
 
         # Return snowfall occurrence with the first snow date and winner
         return {
             "snowfall_occurred": True,
             "first_snow_date": first_snow_date,
-            "winner": closest_guess
+            "winner": " & ".join(winners),
+            "winners": winners
         }
 
     # If no snowfall occurred, return indicating that
     return {
         "snowfall_occurred": False,
         "first_snow_date": None,
-        "winner": None
-    }
\ No newline at end of file
+        "winner": None,
+        "winners": []
+    }